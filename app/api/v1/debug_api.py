@@ -0,0 +1,87 @@
+from typing import Optional
+
+from fastapi import APIRouter, Query
+from app.core.startup import startup_timer
+from app.core.tracing import tracer
+from app.llm_client.retry_policy import llm_retry_policy
+from app.llm_client.routing_client import routing_snapshot
+from app.llm_client.scheduler import scheduler_snapshot
+from app.llm_client.token_budget import token_budget
+from app.schemas.api_response import APIResponse
+from app.services.exercise_bank import exercise_bank
+from app.services.exercise_pool import exercise_pool
+from app.services.near_duplicates import near_duplicates
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+
+@router.get("/llm")
+def llm_status():
+    """
+    LLM 调用的重试 / 熔断统计、各 provider 的调度队列、各 prompt 的 max_tokens 预算，
+    配置了多个 endpoint 时附带各 endpoint 的延迟 / 错误率
+    """
+    return APIResponse.success({
+        "retry": llm_retry_policy.snapshot(),
+        "scheduler": scheduler_snapshot(),
+        "token_budget": token_budget.snapshot(),
+        "routing": routing_snapshot(),
+    })
+
+
+@router.get("/traces")
+def recent_traces(limit: int = 50, task_type: str = None):
+    """
+    最近完成的 trace（新的在前），每条包含各阶段 span 的耗时
+    """
+    return APIResponse.success(tracer.recent(limit, task_type))
+
+
+@router.get("/traces/summary")
+def traces_summary():
+    """
+    按任务类型汇总各阶段耗时的 p50 / p95 / p99（ms）
+    """
+    return APIResponse.success(tracer.summary())
+
+
+@router.get("/startup")
+def startup_report():
+    """
+    启动耗时：按 import / 初始化阶段拆分（ms），phases 为其中配置加载等子阶段
+    """
+    return APIResponse.success(startup_timer.report())
+
+
+@router.get("/bank")
+def exercise_bank_search(q: Optional[str] = None, type: Optional[str] = None, language: Optional[str] = None,
+                         domain: Optional[str] = None, dimension: list[str] = Query(default=[]), limit: int = 20):
+    """
+    本地题库：各任务类型的题量 / 复用次数，以及按条件检索的题目
+    q 为全文检索词；dimension 可重复，格式为 名称:取值（如 tones:critical）
+    """
+    dimensions = dict(item.split(":", 1) for item in dimension if ":" in item)
+    return APIResponse.success({
+        "stats": exercise_bank.snapshot(),
+        "results": exercise_bank.search(q, type, language, domain, dimensions, limit),
+    })
+
+
+@router.get("/pool")
+def exercise_pool_status():
+    """
+    出题预生成池：各 key 的现有题目数、正在补充的数量、最近一次 refill lag、多久没人取题（s）
+    """
+    return APIResponse.success(exercise_pool.snapshot())
+
+
+@router.get("/duplicates")
+def near_duplicate_status():
+    """
+    近重复检测：各客户端（client_id，未传为 local）已记录的题目数
+    """
+    return APIResponse.success({
+        "enabled": near_duplicates.config.enabled,
+        "threshold": near_duplicates.config.threshold,
+        "clients": near_duplicates.snapshot(),
+    })
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.metrics import metrics
+
+router = APIRouter(tags=["metrics"])
+
+# Prometheus 文本格式版本
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
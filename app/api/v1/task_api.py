@@ -1,26 +1,288 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from app.config import settings
+from app.core import metrics
+from app.core.deadline import deadline_scope, DeadlineExceededError
+from app.core.tracing import tracer
+from app.llm_client.errors import LLMOverloadedError, LLMUnavailableError
 from app.schemas.api_response import APIResponse
 from app.schemas.task_req import TaskReq
+from app.schemas.task_result import AnyTaskResult
 from  app.services.task_service_factory import get_prompt_service
-import json
+from app.utils import json_codec
+from app.utils.json_codec import JSONText
+from app.utils.sse import format_sse, SSE_HEADERS
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/task", tags=["task"])
 
-@router.post("/start", response_model=APIResponse)
-def start(data: TaskReq):
+
+# ======================================================
+#        ⭐ 请求级超时 + 客户端断开检测 ⭐
+# ======================================================
+class ClientDisconnected(Exception):
+    pass
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    """请求体已被读完，之后 receive() 只会在客户端断开时返回 http.disconnect"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+def record_task(data: TaskReq, started: float, outcome: str) -> None:
+    """请求级指标：outcome 为 ok / error / rejected / timeout / disconnected"""
+    labels = {"task_type": data.type, "subtype": data.subtype}
+    metrics.task_requests_total.inc(outcome=outcome, **labels)
+    metrics.task_duration_seconds.observe(time.perf_counter() - started, **labels)
+
+
+async def run_cancellable(request: Request, data: TaskReq, coro):
+    """
+    在任务类型对应的超时时间内执行 coro：
+    - 超时：取消 coro（连同上游 LLM 流），抛 DeadlineExceededError
+    - 客户端断开：取消 coro，抛 ClientDisconnected
+    """
+    task_type = data.type
+    started = time.perf_counter()
+    timeout = settings.llm.timeouts.for_task(task_type)
+    with deadline_scope(timeout):
+        task = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait(
+            {task, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            # 等取消真正完成（上游流已关闭）再返回，资源释放是确定的
+            await asyncio.wait({task})
+
+    if task in done:
+        error = task.exception()
+        outcome = "ok" if error is None else "rejected" if isinstance(error, LLMOverloadedError) else "error"
+        record_task(data, started, outcome)
+        return task.result()
+    if watcher in done:
+        record_task(data, started, "disconnected")
+        logger.info(f"client disconnected, {task_type} task cancelled")
+        raise ClientDisconnected()
+    record_task(data, started, "timeout")
+    raise DeadlineExceededError(f"任务超时（{timeout}s）: {task_type}")
+
+
+def encode_result(result) -> str:
+    """
+    成功响应编码为 JSON 文本：LLM 输出（JSONText）已由流式解析器校验过，直接拼进信封，
+    不再 json.loads → APIResponse → response_model 校验 → 再编码；post_process 改写过的结果走 json_codec
+    """
+    with tracer.span("encode_result", passthrough=isinstance(result, JSONText)):
+        if isinstance(result, str) and not isinstance(result, JSONText):
+            result = json_codec.loads(result)
+        return APIResponse.success_json(result)
+
+
+def success_response(result) -> Response:
+    # 直接返回 Response：FastAPI 不再按 response_model 校验 / 序列化（response_model 只用于接口文档）
+    return Response(content=encode_result(result), media_type="application/json")
+
+
+@router.post("/start", response_model=APIResponse[AnyTaskResult])
+async def start(data: TaskReq, request: Request):
     prompt_service =get_prompt_service(data.type)
-    result = prompt_service.start(data)
-    if isinstance(result, str):
-        result = json.loads(result)
-    return APIResponse.success(result)
+    with tracer.span("task.start", task_type=data.type, subtype=data.subtype) as span:
+        try:
+            result = await run_cancellable(request, data, prompt_service.start(data))
+        except ClientDisconnected:
+            span.set(disconnected=True)
+            return Response(status_code=499)
+        return success_response(result)
+
+
+@router.post("/correct", response_model=APIResponse[AnyTaskResult])
+async def start(data: TaskReq, request: Request):
+    prompt_service = get_prompt_service(data.type)
+    with tracer.span("task.correct", task_type=data.type, subtype=data.subtype) as span:
+        try:
+            result = await run_cancellable(request, data, prompt_service.correct(data))
+        except ClientDisconnected:
+            span.set(disconnected=True)
+            return Response(status_code=499)
+        return success_response(result)
+
+
+# ======================================================
+#            ⭐ SSE 流式接口（/start、/correct 的流式版本）⭐
+# ======================================================
+async def sse_events(events, data: TaskReq):
+    """
+    把 service 产出的 (event, payload) 转成 SSE：
+      event: delta  data: {"content": "..."}
+      event: reset  data: {"attempt": 1}
+      event: done   data: APIResponse（与非流式接口的返回一致）
+      event: error  data: APIResponse.server_error / 504 超时
+    客户端断开时 StreamingResponse 会取消本协程，events 随之关闭上游 LLM 流
+    """
+    task_type = data.type
+    started = time.perf_counter()
+    outcome = "disconnected"
+    timeout = settings.llm.timeouts.for_task(task_type)
+    with tracer.span("task.stream", task_type=data.type, subtype=data.subtype) as span:
+        try:
+            with deadline_scope(timeout) as deadline_at:
+                while True:
+                    # 超时只包住 anext，避免跨 yield 取消到发送端
+                    async with asyncio.timeout_at(deadline_at):
+                        try:
+                            event, payload = await anext(events)
+                        except StopAsyncIteration:
+                            break
+                    if event == "delta":
+                        yield format_sse("delta", {"content": payload})
+                    elif event == "done":
+                        outcome = "ok"
+                        yield format_sse("done", encode_result(payload))
+                    else:
+                        yield format_sse(event, payload)
+        except TimeoutError:
+            outcome = "timeout"
+            logger.warning(f"流式任务超时（{timeout}s）: {task_type}")
+            yield format_sse("error", APIResponse.error("504", f"任务超时（{timeout}s）: {task_type}").model_dump_json())
+        except LLMOverloadedError as e:
+            outcome = "rejected"
+            yield format_sse("error", APIResponse.error("429", str(e)).model_dump_json())
+        except Exception as e:
+            outcome = "error"
+            logger.exception("流式任务失败详情：")
+            yield format_sse("error", APIResponse.server_error(str(e)).model_dump_json())
+        finally:
+            span.set(outcome=outcome)
+            record_task(data, started, outcome)
+            await events.aclose()
 
 
-@router.post("/correct", response_model=APIResponse)
-def start(data: TaskReq):
+@router.post("/start/stream")
+async def start_stream(data: TaskReq):
     prompt_service = get_prompt_service(data.type)
-    result = prompt_service.correct(data)
-    if isinstance(result, str):
-        result = json.loads(result)
-    return APIResponse.success(result)
+    return StreamingResponse(
+        sse_events(prompt_service.start_stream(data), data),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@router.post("/correct/stream")
+async def correct_stream(data: TaskReq):
+    prompt_service = get_prompt_service(data.type)
+    return StreamingResponse(
+        sse_events(prompt_service.correct_stream(data), data),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+# ======================================================
+#        ⭐ 批量接口：有界并发，完成一个推送一个（SSE）⭐
+# ======================================================
+BATCH_SUBTYPES = ("start", "correct", "hint")
+
+
+def batch_handler(data: TaskReq):
+    """批量中每一项按 subtype 分发到 service.start / correct / hint；类型不支持时抛 ValueError"""
+    if data.subtype not in BATCH_SUBTYPES:
+        raise ValueError(f"不支持的任务子类型: {data.subtype}")
+    return getattr(get_prompt_service(data.type), data.subtype)
+
+
+def batch_item_json(index: int, data: TaskReq, response: str) -> str:
+    """item 事件的 data：response 为已编码的 APIResponse 文本，直接拼接"""
+    head = json_codec.dumps({"index": index, "type": data.type, "subtype": data.subtype})
+    return f'{head[:-1]},"response":{response}}}'
+
+
+async def run_batch_item(index: int, data: TaskReq, semaphore: asyncio.Semaphore) -> tuple[bool, str]:
+    """执行批量中的一个任务，返回 (是否成功, item 事件的 data)；失败只体现在这一项的 response 里，不影响其他任务"""
+    try:
+        handler = batch_handler(data)
+    except ValueError as e:
+        return False, batch_item_json(index, data, APIResponse.error("400", str(e)).model_dump_json())
+
+    async with semaphore:
+        # 超时从拿到并发名额开始计算，排队时间不算
+        started = time.perf_counter()
+        timeout = settings.llm.timeouts.for_task(data.type)
+        outcome = "disconnected"
+        try:
+            with tracer.span("task.batch_item", index=index, task_type=data.type, subtype=data.subtype):
+                with deadline_scope(timeout):
+                    async with asyncio.timeout(timeout):
+                        result = await handler(data)
+                response = encode_result(result)
+            outcome = "ok"
+        except TimeoutError:
+            outcome = "timeout"
+            response = APIResponse.error("504", f"任务超时（{timeout}s）: {data.type}").model_dump_json()
+        except LLMOverloadedError as e:
+            outcome = "rejected"
+            response = APIResponse.error("429", str(e)).model_dump_json()
+        except LLMUnavailableError as e:
+            outcome = "error"
+            response = APIResponse.error("503", str(e)).model_dump_json()
+        except Exception as e:
+            outcome = "error"
+            logger.exception(f"批量任务失败 #{index} {data.type}：")
+            response = APIResponse.server_error(str(e)).model_dump_json()
+        finally:
+            # 被取消（客户端断开）时 outcome 保持 disconnected
+            record_task(data, started, outcome)
+    return outcome == "ok", batch_item_json(index, data, response)
+
+
+async def batch_events(items: list[TaskReq]):
+    """
+    所有任务立即提交，由 semaphore 限制同时执行的数量，按完成顺序推送：
+      event: item  data: {"index": 请求中的下标, "type", "subtype", "response": APIResponse}
+      event: done  data: {"total", "ok", "failed", "elapsed_ms"}
+    同 domain 的子主题生成由 subtopic_cache 合并，只调用一次 LLM
+    客户端断开时取消所有未完成的任务
+    """
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(settings.batch.max_concurrency)
+    ok = 0
+    with tracer.span("task.batch", size=len(items)) as span:
+        # 在 span 内创建 task：各任务的 span 挂在 task.batch 之下
+        tasks = [asyncio.ensure_future(run_batch_item(i, item, semaphore)) for i, item in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item_ok, item = await next_done
+                ok += item_ok
+                yield format_sse("item", item)
+            yield format_sse("done", {
+                "total": len(items),
+                "ok": ok,
+                "failed": len(items) - ok,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            span.set(ok=ok, failed=len(items) - ok)
 
 
+@router.post("/batch")
+async def batch(items: list[TaskReq]):
+    if len(items) > settings.batch.max_items:
+        return JSONResponse(
+            status_code=400,
+            content=APIResponse.error("400", f"批量任务数超过上限 {settings.batch.max_items}").model_dump(),
+        )
+    return StreamingResponse(batch_events(items), media_type="text/event-stream", headers=SSE_HEADERS)
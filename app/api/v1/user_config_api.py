@@ -5,6 +5,7 @@ from app.core.user_config import (
     save_user_config,
 )
 from app.schemas.api_response import APIResponse
+from app.services.task_service_factory import prompt_service_registry
 
 router = APIRouter(prefix="/settings",tags=["config"])
 
@@ -37,5 +38,10 @@ def get_settings():
 
 @router.post("/save")
 def save_settings(cfg: UserConfig):
+    existing = load_user_config()
+    if "endpoints" not in cfg.model_fields_set and existing is not None:
+        # 设置页只提交主 key，保留手动配置的额外 endpoint
+        cfg.endpoints = existing.endpoints
     save_user_config(cfg)
+    prompt_service_registry.reload()
     return APIResponse.success({"ok": True})
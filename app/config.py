@@ -1,18 +1,227 @@
 import yaml
 from pydantic import BaseModel
+import hashlib
+import logging
+import os
+import pickle
 import sys
 from pathlib import Path
+from app.core.paths import cache_dir
+from app.core.startup import startup_timer
+
+logger = logging.getLogger(__name__)
 
 class AppConfig(BaseModel):
     name: str
     debug: bool
     version: str
 
+class HttpPoolConfig(BaseModel):
+    max_connections: int = 64
+    max_keepalive_connections: int = 16
+    keepalive_expiry: float = 60
+    http2: bool = True
+    connect_timeout: float = 10
+    read_timeout: float = 120
+    write_timeout: float = 30
+    pool_timeout: float = 30
+    # 按 (api_key, base_url) 缓存的连接池个数，超出按 LRU 淘汰
+    max_clients: int = 4
+
+
+class RetryPolicyConfig(BaseModel):
+    max_delay: float = 30
+    budget_ratio: float = 0.2
+    budget_min_retries: int = 5
+    budget_window: float = 60
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30
+
+
+class RoutingConfig(BaseModel):
+    # 多个 endpoint 时（user_config.json 的 endpoints）按滑动平均延迟 / 错误率选路
+    ewma_alpha: float = 0.3
+    # 错误率（滑动平均）超过该值视为不健康，只在没有健康 endpoint 时才使用
+    max_error_rate: float = 0.5
+    # 失败后暂停使用的秒数，连续失败时翻倍，最多 max_cooldown_seconds
+    cooldown_seconds: float = 5
+    max_cooldown_seconds: float = 120
+
+
+class TokenBudgetConfig(BaseModel):
+    # 按 (prompt 名, 语言) 学习最近的输出 token 数，max_tokens = 分位数 × (1 + margin)
+    enabled: bool = True
+    percentile: float = 0.99
+    margin: float = 0.25
+    # 样本数不足 min_samples 时用 max_tokens
+    min_samples: int = 20
+    window: int = 200
+    min_tokens: int = 256
+    max_tokens: int = 8000
+
+
+class ProviderRateConfig(BaseModel):
+    # 令牌桶：每秒发起的 LLM 请求数（0 不限速），burst 为允许的突发请求数
+    requests_per_second: float = 0
+    burst: int = 8
+
+
+class SchedulerConfig(BaseModel):
+    # 排队等待的 LLM 调用上限，超出时直接拒绝（429）；队列满时高优先级会挤掉排在最后的低优先级
+    max_queue: int = 64
+    rate: ProviderRateConfig = ProviderRateConfig()
+    # 按 provider 覆盖 rate
+    per_provider: dict[str, ProviderRateConfig] = {}
+
+    def rate_for(self, provider: str) -> ProviderRateConfig:
+        return self.per_provider.get(provider, self.rate)
+
+
+class TaskTimeoutConfig(BaseModel):
+    default: float = 120
+    per_task: dict[str, float] = {}
+
+    def for_task(self, task_type: str) -> float:
+        return self.per_task.get(task_type, self.default)
+
+
+class CassetteConfig(BaseModel):
+    # off：直连；record：调用真实 LLM 并录制；replay：只从录制文件回放，不需要 API 秘钥
+    mode: str = "off"
+    # 相对路径基于运行目录
+    path: str = "cache/llm_cassette.jsonl.gz"
+    # 回放时 chunk 间隔的缩放：1 = 原始时序，0 = 不等待
+    time_scale: float = 1.0
+
+
 class LLMConfig(BaseModel):
     provider:str
     model:str
     retries:int
     retry_delay:int
+    max_concurrency: int = 16
+    # split：模板作为 system（跨调用不变，命中 provider 前缀缓存），占位符取值作为 user；inline：整段作为一条 user
+    prompt_layout: str = "split"
+    http: HttpPoolConfig = HttpPoolConfig()
+    retry: RetryPolicyConfig = RetryPolicyConfig()
+    timeouts: TaskTimeoutConfig = TaskTimeoutConfig()
+    routing: RoutingConfig = RoutingConfig()
+    scheduler: SchedulerConfig = SchedulerConfig()
+    token_budget: TokenBudgetConfig = TokenBudgetConfig()
+    cassette: CassetteConfig = CassetteConfig()
+
+
+class SubtopicCacheConfig(BaseModel):
+    enabled: bool = True
+    memory_entries: int = 128
+    disk_entries: int = 1024
+    ttl_seconds: int = 7 * 24 * 3600
+    refresh_after_seconds: int = 24 * 3600
+
+
+class CacheConfig(BaseModel):
+    subtopics: SubtopicCacheConfig = SubtopicCacheConfig()
+
+
+class ExerciseReuseConfig(BaseModel):
+    # provider 不可用（熔断 / 连接失败 / 限流 / 排队已满）时从题库取题
+    on_failure: bool = True
+    # 非流式出题超过该时间仍未完成时从题库取题，生成在后台继续完成并入库；0 关闭
+    slow_seconds: float = 0
+    # 离请求截止时间只剩这么多秒仍未完成时从题库取题，而不是直接超时；0 关闭
+    deadline_margin_seconds: float = 3
+    # 同一道题最多被复用几次
+    max_serves: int = 3
+    # 最宽的匹配范围：subtopic（同子主题）/ domain（同主题）/ type（同任务类型 + 语言）
+    match: str = "domain"
+
+
+class ExerciseBankConfig(BaseModel):
+    enabled: bool = True
+    # 超过后删除最早入库的题目
+    max_entries: int = 5000
+    reuse: ExerciseReuseConfig = ExerciseReuseConfig()
+
+
+class ExercisePoolConfig(BaseModel):
+    # 预生成会额外消耗 API 额度，默认关闭
+    enabled: bool = False
+    # 每个 (任务类型, 语言, 主题, 题型) 保持的预生成题目数
+    watermark: int = 2
+    # 同时进行的预生成数（后台优先级，不和用户请求抢调用名额）
+    concurrency: int = 2
+    # 最多维护多少个 key，超过时淘汰最久没人取题的
+    max_keys: int = 32
+    # 超过该时间没人取题的 key 不再补充
+    idle_seconds: float = 6 * 3600
+    # 预生成超过该时间的题不再使用
+    max_age_seconds: float = 24 * 3600
+    # 预生成失败后等待多久再继续
+    failure_backoff_seconds: float = 10
+
+
+class NearDuplicateConfig(BaseModel):
+    enabled: bool = True
+    # 估计的 Jaccard 相似度（单词 3-gram）≥ 该值视为该用户看过的重复题目
+    threshold: float = 0.5
+    # 参与比较的结果字段（文章 / 篇章 / 题目 / 范文）
+    fields: list[str] = ["passage", "article", "paragraph", "question", "band8plus_example"]
+    # 文字少于这么多单词的不比较（如句子类任务）
+    min_words: int = 30
+    # 每个客户端最多记住多少篇，超过淘汰最早的
+    max_entries_per_client: int = 2000
+    # 最多记住多少个客户端（client_id 由请求传入），超过淘汰最久没出过题的
+    max_clients: int = 200
+    # 重复时从题库换一道不重复的
+    swap_from_bank: bool = True
+    # 题库里最多试几道
+    swap_attempts: int = 5
+    # 题库里没有合适的时重新生成一次（额外一次 LLM 调用）
+    regenerate: bool = False
+
+
+class OutputValidationConfig(BaseModel):
+    """出题结果的本地校验（app/services/output_validators.py）"""
+    enabled: bool = True
+    # 字数范围上下各放宽的比例（LLM 数词不准，差几个词不值得一次修复调用）
+    word_count_tolerance: float = 0.1
+    # 不合格时定向修复：只让 LLM 重新生成不合格的字段；关闭时只记录
+    repair: bool = True
+    # 最多修复几轮（每轮一次 LLM 调用）
+    max_repairs: int = 1
+
+
+class LoggingConfig(BaseModel):
+    level: str = "INFO"
+    # 日志经队列交给后台线程写出；队列满时丢弃（不阻塞请求）
+    queue_size: int = 10000
+    # 单条日志最大字符数，超出截断
+    max_message_chars: int = 2000
+    # 追加写入 logs/app.log（运行目录下），按大小轮转
+    file: bool = False
+    file_max_bytes: int = 10 * 1024 * 1024
+    file_backups: int = 3
+    # prompt / completion 日志的采样率，per_task 按任务类型覆盖
+    sample_rate: float = 1.0
+    sample_rates: dict[str, float] = {}
+    # DEBUG 级别额外输出 prompt / completion 原文（截断后）
+    log_llm_text: bool = False
+
+
+class BatchConfig(BaseModel):
+    # /api/v1/task/batch：单个批量请求内同时执行的任务数（所有 LLM 调用另受 llm.max_concurrency 限制）
+    max_concurrency: int = 8
+    # 单个批量请求最多包含的任务数
+    max_items: int = 100
+
+
+class TracingConfig(BaseModel):
+    enabled: bool = True
+    # 内存中保留的最近完成的 trace 数
+    buffer_size: int = 500
+    # 追加写入 cache/traces.jsonl（OTLP JSON，每行一个 trace）
+    export: bool = False
+    export_max_bytes: int = 20 * 1024 * 1024
 
 
 class Prompts(BaseModel):
@@ -38,6 +247,8 @@ class Prompts(BaseModel):
     sentence_upgrade_correct: str
     sentence_translation_start: str
     speaking_start: str
+    # 出题结果校验不合格时的定向修复（[1] 问题列表，[2] 当前结果 JSON，[3] 需要重新生成的字段）
+    repair_start: str
 
 class PromptConfig(BaseModel):
     en:Prompts
@@ -47,6 +258,14 @@ class PromptConfig(BaseModel):
 class Settings(BaseModel):
     app: AppConfig
     llm: LLMConfig
+    cache: CacheConfig = CacheConfig()
+    exercise_bank: ExerciseBankConfig = ExerciseBankConfig()
+    exercise_pool: ExercisePoolConfig = ExercisePoolConfig()
+    near_duplicates: NearDuplicateConfig = NearDuplicateConfig()
+    validation: OutputValidationConfig = OutputValidationConfig()
+    batch: BatchConfig = BatchConfig()
+    tracing: TracingConfig = TracingConfig()
+    logging: LoggingConfig = LoggingConfig()
     prompt: PromptConfig
 
 
@@ -56,11 +275,79 @@ def resource_path(relative_path: str) -> Path:
     return Path(__file__).resolve().parents[0] / relative_path
     #              ↑ 回到 app/
 
+# ======================================================
+#        ⭐ 配置快照：跳过 YAML 解析和 pydantic 校验 ⭐
+# ======================================================
+# 快照是本机运行目录下自己生成的文件，用 pickle 直接还原已校验的 Settings
+SNAPSHOT_PREFIX = "settings."
+# 优先用 libyaml 的 C 实现，没有时退回纯 Python
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _code_fingerprint() -> bytes:
+    """配置模型定义变化时快照也要失效：源码运行取本文件内容，打包 exe 取可执行文件的大小和修改时间"""
+    if getattr(sys, "frozen", False):
+        stat = os.stat(sys.executable)
+        return f"{stat.st_size}:{stat.st_mtime_ns}".encode()
+    try:
+        return Path(__file__).read_bytes()
+    except OSError:
+        return b""
+
+
+def _snapshot_path(raw: bytes) -> Path:
+    digest = hashlib.sha256(raw + _code_fingerprint()).hexdigest()[:16]
+    return cache_dir() / f"{SNAPSHOT_PREFIX}{digest}.pickle"
+
+
+def _load_snapshot(path: Path):
+    if not path.exists():
+        return None
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+        return snapshot if isinstance(snapshot, Settings) else None
+    except Exception as e:
+        logger.warning(f"配置快照损坏，重新生成: {path} {e}")
+        return None
+
+
+def _save_snapshot(path: Path, loaded: Settings) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(loaded, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        # 旧快照对应的是旧配置，直接删除
+        for old in path.parent.glob(f"{SNAPSHOT_PREFIX}*.pickle"):
+            if old != path:
+                old.unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"配置快照写入失败: {e}")
+
+
 def load_settings(path: str = "config/settings.yml") -> Settings:
+    """
+    读取 settings.yml；内容（和配置模型）没变时直接加载 cache/ 下的快照，
+    变了才重新解析 YAML + 校验，并写入新快照
+    """
     config_path = resource_path(path)
-    with open(config_path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
-    return Settings(**data)
+    with startup_timer.phase("config.read"):
+        raw = config_path.read_bytes()
+        snapshot_path = _snapshot_path(raw)
+
+    with startup_timer.phase("config.snapshot_load"):
+        loaded = _load_snapshot(snapshot_path)
+    if loaded is not None:
+        return loaded
+
+    with startup_timer.phase("config.yaml_parse"):
+        data = yaml.load(raw.decode("utf-8"), Loader=_YAML_LOADER)
+    with startup_timer.phase("config.validate"):
+        loaded = Settings(**data)
+    with startup_timer.phase("config.snapshot_write"):
+        _save_snapshot(snapshot_path, loaded)
+    return loaded
 
 # 单例配置对象（全局可用）
 settings = load_settings()
@@ -0,0 +1,45 @@
+# app/core/deadline.py
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# 当前请求的截止时间（event loop 时间），由接口层设置，service / LLM client 读取
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceededError(TimeoutError):
+    """请求超过了所属任务类型的超时时间"""
+    pass
+
+
+@contextmanager
+def deadline_scope(timeout: Optional[float]):
+    """
+    在当前上下文设置截止时间；嵌套时取更早的那个
+    asyncio.create_task 会复制上下文，所以在 scope 内创建的 task 也能读到
+    """
+    if timeout is None:
+        yield None
+        return
+    at = asyncio.get_running_loop().time() + timeout
+    outer = _deadline.get()
+    if outer is not None:
+        at = min(at, outer)
+    token = _deadline.set(at)
+    try:
+        yield at
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """距离截止时间还剩多少秒；没有设置截止时间返回 None"""
+    at = _deadline.get()
+    if at is None:
+        return None
+    return max(0.0, at - asyncio.get_running_loop().time())
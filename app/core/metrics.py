@@ -0,0 +1,249 @@
+# app/core/metrics.py
+import math
+import threading
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+
+# 延迟类直方图的默认分桶（秒）：覆盖子主题小请求到 8000 token 的长生成
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 240)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组 label：[各桶计数..., +Inf 计数], sum
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            items = [(k, list(v[0]), v[1]) for k, v in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    进程内指标注册表，/metrics 以 Prometheus 文本格式输出
+    collector：渲染时才调用的回调，用于导出其他模块已有的统计（如重试 / 熔断）
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], Iterable[str]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        self._collectors.append(collector)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+# 单例（全局可用）
+metrics = MetricsRegistry()
+
+# ======================================================
+#                  ⭐ 任务 / LLM 指标 ⭐
+# ======================================================
+TASK_LABELS = ("task_type", "subtype")
+LLM_LABELS = ("task_type", "prompt")
+
+task_requests_total = metrics.counter(
+    "ielts_task_requests_total", "Task requests by outcome", TASK_LABELS + ("outcome",))
+task_duration_seconds = metrics.histogram(
+    "ielts_task_duration_seconds", "End-to-end task request latency", TASK_LABELS)
+
+llm_calls_total = metrics.counter(
+    "ielts_llm_calls_total", "LLM call attempts by outcome", LLM_LABELS + ("outcome",))
+llm_duration_seconds = metrics.histogram(
+    "ielts_llm_duration_seconds", "LLM call latency (one attempt)", LLM_LABELS)
+llm_ttft_seconds = metrics.histogram(
+    "ielts_llm_time_to_first_token_seconds", "Time to first streamed token", LLM_LABELS)
+llm_tokens_per_second = metrics.histogram(
+    "ielts_llm_tokens_per_second", "Completion tokens per second after the first token", LLM_LABELS,
+    buckets=(5, 10, 20, 30, 40, 60, 80, 120, 200))
+llm_prompt_tokens_total = metrics.counter(
+    "ielts_llm_prompt_tokens_total", "Prompt tokens reported by the provider", LLM_LABELS)
+llm_prompt_cache_hit_tokens_total = metrics.counter(
+    "ielts_llm_prompt_cache_hit_tokens_total", "Prompt tokens served from the provider's prefix cache", LLM_LABELS)
+llm_completion_tokens_total = metrics.counter(
+    "ielts_llm_completion_tokens_total", "Completion tokens reported by the provider", LLM_LABELS)
+llm_retries_total = metrics.counter(
+    "ielts_llm_retries_total", "LLM retries", LLM_LABELS)
+llm_truncations_total = metrics.counter(
+    "ielts_llm_truncations_total", "Completions cut off by max_tokens (finish_reason=length)", LLM_LABELS)
+llm_json_failures_total = metrics.counter(
+    "ielts_llm_json_parse_failures_total", "Streamed outputs rejected by the JSON parser", LLM_LABELS)
+
+# 多 endpoint 路由（RoutingLLMClient）
+llm_endpoint_calls_total = metrics.counter(
+    "ielts_llm_endpoint_calls_total", "Routed LLM calls per endpoint by outcome", ("endpoint", "outcome"))
+llm_endpoint_latency_seconds = metrics.gauge(
+    "ielts_llm_endpoint_latency_seconds", "EWMA time to first token per endpoint", ("endpoint",))
+llm_endpoint_error_rate = metrics.gauge(
+    "ielts_llm_endpoint_error_rate", "EWMA error rate per endpoint", ("endpoint",))
+llm_endpoint_inflight = metrics.gauge(
+    "ielts_llm_endpoint_inflight", "In-flight calls per endpoint", ("endpoint",))
+
+# LLM 调度（LLMScheduler）：排队时间与 LLM 耗时分开统计
+llm_queue_wait_seconds = metrics.histogram(
+    "ielts_llm_queue_wait_seconds", "Time an LLM call waited for a scheduler slot", LLM_LABELS + ("priority",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60))
+llm_queue_depth = metrics.gauge(
+    "ielts_llm_queue_depth", "LLM calls waiting for a scheduler slot", ("provider", "priority"))
+llm_inflight = metrics.gauge(
+    "ielts_llm_inflight", "LLM calls holding a scheduler slot", ("provider",))
+llm_rejected_total = metrics.counter(
+    "ielts_llm_rejected_total", "LLM calls rejected because the queue was full", ("provider", "priority"))
+
+# 本地题库（exercise_bank）：reason 为 failure（provider 失败）/ slow（生成太慢）/ duplicate（近重复换题）
+exercise_bank_stored_total = metrics.counter(
+    "ielts_exercise_bank_stored_total", "Generated exercises stored in the local bank", ("task_type",))
+exercise_bank_served_total = metrics.counter(
+    "ielts_exercise_bank_served_total", "Start requests served from the local bank", ("task_type", "reason"))
+exercise_bank_misses_total = metrics.counter(
+    "ielts_exercise_bank_misses_total", "Bank fallbacks with no reusable exercise", ("task_type", "reason"))
+
+# 出题结果本地校验（output_validators）：outcome 为 ok / repaired（定向修复后合格）/ invalid（仍不合格，原样返回）
+output_validation_total = metrics.counter(
+    "ielts_output_validation_total", "Start results checked by the local validators by outcome", ("task_type", "outcome"))
+
+# 近重复检测（near_duplicates）：action 为 swapped（从题库换题）/ regenerated（重新生成）/ kept（没换成，返回原题）
+near_duplicates_total = metrics.counter(
+    "ielts_near_duplicates_total", "Start results that repeated a passage the client had already seen",
+    ("task_type", "action"))
+
+# 预生成池（exercise_pool）：depth 按任务类型 + 语言汇总各主题；refill lag 为取走一道题到补回一道题的时间
+exercise_pool_requests_total = metrics.counter(
+    "ielts_exercise_pool_requests_total", "Start requests checked against the pre-generation pool by outcome",
+    ("task_type", "outcome"))
+exercise_pool_depth = metrics.gauge(
+    "ielts_exercise_pool_depth", "Pre-generated exercises ready to serve", ("task_type", "language"))
+exercise_pool_refill_lag_seconds = metrics.histogram(
+    "ielts_exercise_pool_refill_lag_seconds", "Time from a pool slot opening until it is refilled", ("task_type",),
+    buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300, 600))
+exercise_pool_refill_failures_total = metrics.counter(
+    "ielts_exercise_pool_refill_failures_total", "Failed background pre-generations", ("task_type",))
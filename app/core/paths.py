@@ -1,13 +1,21 @@
+import os
 import sys
 from pathlib import Path
 
+# 覆盖运行目录（user_config.json、cache/ 都在其下），压测 / 调试时用来隔离真实配置
+RUNTIME_DIR_ENV = "IELTS_RUNTIME_DIR"
+
 
 def runtime_dir() -> Path:
     """
     用户可写运行目录：
+    - 设置了 IELTS_RUNTIME_DIR：该目录
     - EXE：ai_server.exe 所在目录
     - 源码：项目根目录
     """
+    override = os.environ.get(RUNTIME_DIR_ENV)
+    if override:
+        return Path(override)
     if getattr(sys, "frozen", False):
         return Path(sys.executable).parent
     return Path(__file__).resolve().parents[2]
@@ -22,3 +30,12 @@ def resource_dir() -> Path:
     if getattr(sys, "frozen", False):
         return Path(sys._MEIPASS)
     return Path(__file__).resolve().parents[2]
+
+
+def cache_dir() -> Path:
+    """
+    本地缓存目录（运行目录下的 cache/），不存在则自动创建
+    """
+    path = runtime_dir() / "cache"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,50 @@
+# app/core/startup.py
+import time
+from contextlib import contextmanager
+
+# 不依赖 app 内其他模块：app.config 最先被 import，也要能用
+
+
+class StartupTimer:
+    """
+    启动耗时记录
+    - mark(name)：距上一个 mark 的耗时（按顺序切分 import / 初始化阶段）
+    - phase(name)：某段代码自身的耗时（如配置加载），会被包含在所在的 mark 阶段里
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last_mark = self.started
+        self.marks: list[tuple[str, float]] = []
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, name: str) -> None:
+        now = time.perf_counter()
+        self.marks.append((name, now - self._last_mark))
+        self._last_mark = now
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def report(self) -> dict:
+        return {
+            "total_ms": round((self._last_mark - self.started) * 1000, 1),
+            "marks": {name: round(seconds * 1000, 1) for name, seconds in self.marks},
+            "phases": {name: round(seconds * 1000, 1) for name, seconds in self.phases},
+        }
+
+    def format_report(self) -> str:
+        report = self.report()
+        lines = [f"startup {report['total_ms']}ms"]
+        lines += [f"  {name:<28}{ms:>8}ms" for name, ms in report["marks"].items()]
+        lines += [f"    ({name}){'':<{max(0, 24 - len(name))}}{ms:>8}ms" for name, ms in report["phases"].items()]
+        return "\n".join(lines)
+
+
+# 单例（全局可用）
+startup_timer = StartupTimer()
@@ -0,0 +1,48 @@
+# app/core/task_context.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# 当前请求所属的任务（type, subtype），供指标 / 日志打标签，嵌套的子主题调用也归到外层任务
+_task: ContextVar[Optional[tuple[str, str]]] = ContextVar("task", default=None)
+# 当前请求的语言（en / zh），token 预算按语言区分
+_language: ContextVar[Optional[str]] = ContextVar("language", default=None)
+# 当前 LLM 调用使用的 prompt 名（如 synonym_start / subtopics_start）
+_prompt: ContextVar[Optional[str]] = ContextVar("prompt", default=None)
+
+
+@contextmanager
+def task_scope(task_type: str, subtype: str, language: Optional[str] = None):
+    token = _task.set((task_type or "unknown", subtype or "start"))
+    language_token = _language.set(language)
+    try:
+        yield
+    finally:
+        _language.reset(language_token)
+        _task.reset(token)
+
+
+@contextmanager
+def prompt_scope(prompt_key: Optional[str]):
+    token = _prompt.set(prompt_key)
+    try:
+        yield
+    finally:
+        _prompt.reset(token)
+
+
+def current_task() -> tuple[str, str]:
+    return _task.get() or ("unknown", "unknown")
+
+
+def current_language() -> str:
+    return _language.get() or "zh"
+
+
+def current_prompt() -> Optional[str]:
+    return _prompt.get()
+
+
+def llm_labels() -> dict:
+    """LLM 调用级指标的 label：外层任务类型 + prompt 名"""
+    return {"task_type": current_task()[0], "prompt": _prompt.get() or "default"}
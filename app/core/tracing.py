@@ -0,0 +1,222 @@
+# app/core/tracing.py
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings, TracingConfig
+from app.core.paths import cache_dir
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "english-ielts-assistant"
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """一个计时阶段；根 span 结束时，整条 trace 进入 ring buffer"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes",
+                 "start_ns", "end_ns", "status", "_t0", "_trace")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: dict):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self._trace: list[Span] = parent._trace if parent else []
+        self._trace.append(self)
+        self.attributes = attributes
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._t0 = time.perf_counter_ns()
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self) -> None:
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._t0)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            # OTLP StatusCode：1 = OK，2 = ERROR
+            "status": {"code": 1 if self.status == "ok" else 2, "message": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    def set(self, **attributes) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return round(sorted_values[index], 3)
+
+
+class Tracer:
+    """
+    进程内 tracing：
+    - span() 包住一个阶段，父子关系由 contextvar 传递（跨 await / 子任务都能正确挂到父 span 下）
+    - 根 span 结束后整条 trace 存入 ring buffer（最多 buffer_size 条）
+    - export 打开时追加写入 OTLP JSON（每行一个 ExportTraceServiceRequest），可直接交给 collector
+    """
+
+    def __init__(self, config: TracingConfig, export_path: Optional[Path] = None):
+        self.config = config
+        self.export_path = export_path
+        self._traces: deque[dict] = deque(maxlen=config.buffer_size)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        if not self.config.enabled:
+            yield _NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        span = Span(name, parent, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except (asyncio.CancelledError, GeneratorExit):
+            span.status = "cancelled"
+            raise
+        except BaseException as e:
+            span.status = "error"
+            span.attributes["error"] = f"{type(e).__name__}: {e}"[:200]
+            raise
+        finally:
+            span.finish()
+            _current_span.reset(token)
+            if parent is None:
+                self._record(span)
+
+    # ======================================================
+    #                  ⭐ 收集 / 导出 ⭐
+    # ======================================================
+    def _record(self, root: Span) -> None:
+        trace = {
+            "trace_id": root.trace_id,
+            "name": root.name,
+            "task_type": root.attributes.get("task_type"),
+            "subtype": root.attributes.get("subtype"),
+            "status": root.status,
+            "duration_ms": root.duration_ms,
+            "spans": [span.to_dict() for span in root._trace],
+        }
+        with self._lock:
+            self._traces.append(trace)
+        if self.config.export and self.export_path:
+            self._export(root._trace)
+
+    def _export(self, spans: list[Span]) -> None:
+        line = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }]
+        }, ensure_ascii=False)
+        try:
+            with self._lock:
+                if self.export_path.exists() and self.export_path.stat().st_size > self.config.export_max_bytes:
+                    os.replace(self.export_path, self.export_path.with_suffix(".jsonl.1"))
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"trace 导出失败: {e}")
+
+    # ======================================================
+    #                  ⭐ 查询 ⭐
+    # ======================================================
+    def recent(self, limit: int = 50, task_type: str = None) -> list[dict]:
+        with self._lock:
+            traces = list(self._traces)
+        if task_type:
+            traces = [t for t in traces if t["task_type"] == task_type]
+        return traces[-limit:][::-1]
+
+    def summary(self) -> dict:
+        """
+        按任务类型汇总各阶段耗时分位数（ms），用于定位 p99 主要耗在哪个阶段
+        同一 trace 内同名 span（如多次重试）先求和再统计
+        """
+        with self._lock:
+            traces = list(self._traces)
+
+        grouped: dict[str, dict[str, list[float]]] = {}
+        for trace in traces:
+            stages = grouped.setdefault(trace["task_type"] or "unknown", {})
+            per_trace: dict[str, float] = {}
+            for span in trace["spans"]:
+                if span["duration_ms"] is not None:
+                    per_trace[span["name"]] = per_trace.get(span["name"], 0) + span["duration_ms"]
+            for name, duration in per_trace.items():
+                stages.setdefault(name, []).append(duration)
+
+        result = {}
+        for task_type, stages in grouped.items():
+            result[task_type] = {}
+            for name, durations in stages.items():
+                durations.sort()
+                result[task_type][name] = {
+                    "count": len(durations),
+                    "p50": _percentile(durations, 0.50),
+                    "p95": _percentile(durations, 0.95),
+                    "p99": _percentile(durations, 0.99),
+                }
+        return result
+
+
+# 单例（全局可用）
+tracer = Tracer(settings.tracing, cache_dir() / "traces.jsonl")
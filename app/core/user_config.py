@@ -1,18 +1,46 @@
 import json
+import threading
 from pathlib import Path
 from pydantic import BaseModel
 from app.core.paths import runtime_dir
 
 
+class LLMEndpoint(BaseModel):
+    """额外的 OpenAI 兼容 endpoint（多个 key / 网关分摊限流），与主 key 一起参与路由"""
+    api_key: str
+    base_url: str | None = None
+    # 不填时使用 settings.llm.model
+    model: str | None = None
+    # 指标 / 调试接口里显示的名字
+    name: str | None = None
+
+
 class UserConfig(BaseModel):
     openai_api_key: str
     base_url: str | None = None
+    endpoints: list[LLMEndpoint] = []
 
 
 CONFIG_PATH: Path = runtime_dir() / "user_config.json"
 
+# 进程内缓存：只在首次读取和保存时访问磁盘
+_cache_lock = threading.Lock()
+_cached_config: UserConfig | None = None
+_cache_loaded = False
+
 
 def load_user_config() -> UserConfig | None:
+    global _cached_config, _cache_loaded
+    if _cache_loaded:
+        return _cached_config
+    with _cache_lock:
+        if not _cache_loaded:
+            _cached_config = _read_user_config()
+            _cache_loaded = True
+        return _cached_config
+
+
+def _read_user_config() -> UserConfig | None:
     if not CONFIG_PATH.exists():
         return None
     return UserConfig.model_validate_json(
@@ -21,7 +49,11 @@ def load_user_config() -> UserConfig | None:
 
 
 def save_user_config(cfg: UserConfig) -> None:
-    CONFIG_PATH.write_text(
-        cfg.model_dump_json(indent=2),
-        encoding="utf-8"
-    )
+    global _cached_config, _cache_loaded
+    with _cache_lock:
+        CONFIG_PATH.write_text(
+            cfg.model_dump_json(indent=2),
+            encoding="utf-8"
+        )
+        _cached_config = cfg
+        _cache_loaded = True
@@ -1,9 +1,18 @@
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
 
 class BaseLLMClient(ABC):
 
     @abstractmethod
-    def prompt(self, prompt:str ) -> str:
+    async def prompt(self, prompt:str, system: Optional[str] = None, max_tokens: Optional[int] = None) -> str:
         """翻译文本到目标语言"""
         pass
 
+    async def stream(self, prompt: str, system: Optional[str] = None,
+                     max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        流式返回增量文本；默认退化为一次性返回完整结果
+        system：跨调用不变的 system 前缀（见 app.services.prompt_layout），prompt 为可变部分
+        max_tokens：输出上限（见 token_budget），被截断时抛 LLMTruncatedError
+        """
+        yield await self.prompt(prompt, system, max_tokens)
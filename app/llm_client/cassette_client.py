@@ -0,0 +1,135 @@
+# app/llm_client/cassette_client.py
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import aclosing
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from .base_client import BaseLLMClient
+from .errors import CassetteMissError
+from app.core.task_context import current_prompt
+
+logger = logging.getLogger(__name__)
+
+
+class Cassette:
+    """
+    LLM 录制文件：gzip 压缩的 JSON Lines，每行一次完整调用
+      {"hash": (system +) prompt 的 sha256 前 16 位, "prompt_key": "synonym_start", "model": "...",
+       "recorded_at": 时间戳, "chunks": [[距调用开始的毫秒数, 文本], ...]}
+    不保存 prompt 原文，文件小且不含用户输入
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._by_hash: dict[str, dict] = {}
+        self._by_prompt_key: dict[str, list[dict]] = defaultdict(list)
+        self._cursor: dict[str, int] = defaultdict(int)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def prompt_hash(prompt: str, system: Optional[str] = None) -> str:
+        text = prompt if system is None else f"{system}\x00{prompt}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def append(self, entry: dict) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # gzip 支持多 member 追加，读取时自动拼接
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+            if self._loaded:
+                self._index(entry)
+
+    def find(self, prompt: str, prompt_key: Optional[str], system: Optional[str] = None) -> dict:
+        """
+        先按 prompt 原文精确匹配；prompt 里有随机维度 / 子主题时通常匹配不上，
+        再在同一 prompt 名的录制中轮流取一条
+        """
+        with self._lock:
+            self._load()
+            entry = self._by_hash.get(self.prompt_hash(prompt, system))
+            if entry is not None:
+                return entry
+            candidates = self._by_prompt_key.get(prompt_key or "")
+            if not candidates:
+                raise CassetteMissError(f"录制文件中没有 {prompt_key or 'default'} 的响应: {self.path}")
+            index = self._cursor[prompt_key] % len(candidates)
+            self._cursor[prompt_key] += 1
+            return candidates[index]
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path.exists():
+            return
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._index(json.loads(line))
+        logger.info(f"cassette loaded: {len(self._by_hash)} entries from {self.path}")
+
+    def _index(self, entry: dict) -> None:
+        self._by_hash[entry["hash"]] = entry
+        self._by_prompt_key[entry.get("prompt_key") or ""].append(entry)
+
+
+class RecordingLLMClient(BaseLLMClient):
+    """包装真实 client，透传流式输出，同时把每个 chunk 及其到达时间录进 cassette"""
+
+    def __init__(self, inner: BaseLLMClient, cassette: Cassette, model_name: str = None):
+        self.inner = inner
+        self.cassette = cassette
+        self.model_name = model_name
+
+    async def prompt(self, prompt: str, system: Optional[str] = None, max_tokens: Optional[int] = None) -> str:
+        return "".join([delta async for delta in self.stream(prompt, system, max_tokens)])
+
+    async def stream(self, prompt: str, system: Optional[str] = None,
+                     max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        chunks = []
+        started = time.perf_counter()
+        async with aclosing(self.inner.stream(prompt, system, max_tokens)) as deltas:
+            async for delta in deltas:
+                # 记录相对开始的偏移而不是间隔，取整误差不会累积
+                chunks.append([round((time.perf_counter() - started) * 1000, 1), delta])
+                yield delta
+        # 只录完整结束的调用；中途取消 / 出错的不录
+        self.cassette.append({
+            "hash": Cassette.prompt_hash(prompt, system),
+            "prompt_key": current_prompt(),
+            "model": self.model_name,
+            "recorded_at": int(time.time()),
+            "chunks": chunks,
+        })
+
+
+class ReplayLLMClient(BaseLLMClient):
+    """从 cassette 回放，按录制时的 chunk 间隔（乘以 time_scale）逐块产出，不访问网络"""
+
+    def __init__(self, cassette: Cassette, time_scale: float = 1.0):
+        self.cassette = cassette
+        self.time_scale = time_scale
+
+    async def prompt(self, prompt: str, system: Optional[str] = None, max_tokens: Optional[int] = None) -> str:
+        return "".join([delta async for delta in self.stream(prompt, system, max_tokens)])
+
+    async def stream(self, prompt: str, system: Optional[str] = None,
+                     max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        entry = self.cassette.find(prompt, current_prompt(), system)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for offset_ms, delta in entry["chunks"]:
+            if self.time_scale > 0:
+                delay = started + offset_ms / 1000 * self.time_scale - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield delta
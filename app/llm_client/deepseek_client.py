@@ -1,43 +1,198 @@
-from openai import OpenAI
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+from openai import AsyncOpenAI
+from typing import AsyncIterator, Optional
 from .base_client import BaseLLMClient
+from app.config import settings, HttpPoolConfig
+from app.core import deadline
+from app.core import metrics
+from app.core.task_context import current_language, current_prompt, llm_labels
+from app.llm_client.errors import LLMTruncatedError
+from app.llm_client.token_budget import token_budget
+from app.utils.logger import log_prompt, log_completion
 import logging
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+
+DEFAULT_BASE_URL = "https://api.deepseek.com"
+
+
+class OpenAIClientPool:
+    """
+    AsyncOpenAI 实例缓存，key 为 (api_key, base_url)，LRU 淘汰
+    每个实例持有一个显式配置的 httpx 连接池（keepalive / 最大连接数 / HTTP2 / 超时）
+    """
+
+    def __init__(self, config: HttpPoolConfig):
+        self.config = config
+        self._clients: "OrderedDict[tuple[str, str], AsyncOpenAI]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str, base_url: str) -> AsyncOpenAI:
+        key = (api_key, base_url)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._create(api_key, base_url)
+                self._clients[key] = client
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.config.max_clients:
+                _, evicted = self._clients.popitem(last=False)
+                self._close_later(evicted)
+            return client
+
+    def _create(self, api_key: str, base_url: str) -> AsyncOpenAI:
+        cfg = self.config
+        timeout = httpx.Timeout(
+            connect=cfg.connect_timeout,
+            read=cfg.read_timeout,
+            write=cfg.write_timeout,
+            pool=cfg.pool_timeout,
+        )
+        http2 = cfg.http2 and _h2_available()
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=cfg.max_connections,
+                max_keepalive_connections=cfg.max_keepalive_connections,
+                keepalive_expiry=cfg.keepalive_expiry,
+            ),
+            timeout=timeout,
+            http2=http2,
+            follow_redirects=True,
+        )
+        logger.info(f"create LLM http pool for {base_url}, http2={http2}")
+        # openai SDK 会用自身的 timeout 覆盖 httpx 的，这里保持一致；
+        # 重试统一由 llm_retry_policy 负责，关闭 SDK 内置重试，避免次数相乘
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=timeout,
+                           max_retries=0, http_client=http_client)
+
+    def _close_later(self, client: AsyncOpenAI) -> None:
+        """被淘汰的连接池可能还有进行中的请求，等一个读超时后再关闭"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        loop.call_later(self.config.read_timeout, lambda: loop.create_task(client.close()))
+
+
+def _cache_hit_tokens(usage) -> Optional[int]:
+    """命中前缀缓存的 prompt token 数：DeepSeek 为 prompt_cache_hit_tokens，OpenAI 为 prompt_tokens_details.cached_tokens"""
+    hit = getattr(usage, "prompt_cache_hit_tokens", None)
+    if hit is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        hit = getattr(details, "cached_tokens", None)
+    return hit
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("h2 未安装，LLM 连接退回 HTTP/1.1")
+        return False
+
+
+# 单例（全局可用）
+openai_client_pool = OpenAIClientPool(settings.llm.http)
+
 
 class DeepSeekClient(BaseLLMClient):
-    # singleton is fine
-    _shared_client = None
+    # 实例由 factory 按 (provider, model, api_key, base_url) 缓存共用
 
-    def __init__(self, model_name: str = None,api_key: str = None):
-        if not DeepSeekClient._shared_client:
-            DeepSeekClient._shared_client = OpenAI(api_key=api_key,base_url="https://api.deepseek.com")
-        self.client = DeepSeekClient._shared_client
+    def __init__(self, model_name: str = None,api_key: str = None, base_url: str = None):
+        self.client = openai_client_pool.get(api_key, base_url or DEFAULT_BASE_URL)
         self.model_name = model_name
 
-    def prompt(self, prompt: str) -> str:
+    async def prompt(self, prompt: str, system: Optional[str] = None, max_tokens: Optional[int] = None) -> str:
+        result = ''.join([delta async for delta in self.stream(prompt, system, max_tokens)])
+        log_completion(logger, result)
+        return result
+
+    async def stream(self, prompt: str, system: Optional[str] = None,
+                     max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        response = None
+        labels = llm_labels()
+        started = time.perf_counter()
+        first_token_at = None
+        usage = None
+        finish_reason = None
+        max_tokens = max_tokens or settings.llm.token_budget.max_tokens
         try:
-            logger.info(f"prompt: {prompt},using model: {self.model_name}")
-            response = self.client.chat.completions.create(
+            log_prompt(logger, prompt, self.model_name, system)
+            response = await self.client.chat.completions.create(
                 model=self.model_name,
-                messages=[
-                    {"role": "user", "content": prompt},
-                ],
+                messages=self._messages(prompt, system),
                 response_format={"type": "json_object"},
                 stream=True,
-                max_tokens=8000
+                max_tokens=max_tokens,
+                timeout=self._request_timeout(),
+                # 最后一个 chunk 带上 usage（choices 为空）
+                stream_options={"include_usage": True},
             )
-            full_content = []
-            for chunk in response:
+            async for chunk in response:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
                 delta = getattr(chunk.choices[0].delta, 'content', None)
                 if delta:
-                    full_content.append(delta)
-            result = ''.join(full_content)
-            logger.info(result)
-            return result
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        metrics.llm_ttft_seconds.observe(first_token_at - started, **labels)
+                    yield delta
+            self._observe(labels, started, first_token_at, usage)
+            if usage is not None and usage.completion_tokens:
+                # 截断的样本也记：说明实际需要的至少有这么多
+                token_budget.observe(current_prompt(), current_language(), usage.completion_tokens)
+            if finish_reason == "length":
+                metrics.llm_truncations_total.inc(**labels)
+                raise LLMTruncatedError(max_tokens)
 
         except Exception as e:
             logger.error(f"Translation failed: {e}")
             logger.exception("Translation failed details")
             raise e
+        finally:
+            # 请求被取消（客户端断开 / 超时）时主动关闭上游连接，停止继续生成
+            if response is not None:
+                await response.close()
+
+    @staticmethod
+    def _messages(prompt: str, system: Optional[str]) -> list[dict]:
+        """system 放最前面：跨调用逐字节不变，DeepSeek 的上下文硬盘缓存按前缀命中"""
+        if system is None:
+            return [{"role": "user", "content": prompt}]
+        return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+    @staticmethod
+    def _observe(labels: dict, started: float, first_token_at, usage) -> None:
+        """一次完整生成结束后记录耗时、token 用量和生成速度"""
+        now = time.perf_counter()
+        metrics.llm_duration_seconds.observe(now - started, **labels)
+        if usage is None:
+            return
+        metrics.llm_prompt_tokens_total.inc(usage.prompt_tokens or 0, **labels)
+        metrics.llm_completion_tokens_total.inc(usage.completion_tokens or 0, **labels)
+        cached = _cache_hit_tokens(usage)
+        if cached is not None:
+            metrics.llm_prompt_cache_hit_tokens_total.inc(cached, **labels)
+        if first_token_at is not None and now > first_token_at and usage.completion_tokens:
+            metrics.llm_tokens_per_second.observe(usage.completion_tokens / (now - first_token_at), **labels)
 
+    def _request_timeout(self) -> httpx.Timeout:
+        """连接池超时与请求剩余时间取较小值"""
+        cfg = openai_client_pool.config
+        left = deadline.remaining()
+        cap = (lambda t: t) if left is None else (lambda t: max(0.001, min(t, left)))
+        return httpx.Timeout(
+            connect=cap(cfg.connect_timeout),
+            read=cap(cfg.read_timeout),
+            write=cap(cfg.write_timeout),
+            pool=cap(cfg.pool_timeout),
+        )
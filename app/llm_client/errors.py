@@ -0,0 +1,27 @@
+# app/llm_client/errors.py
+
+
+class LLMUnavailableError(RuntimeError):
+    """LLM 服务当前不可用（熔断中 / 重试预算耗尽），调用方应快速失败"""
+    pass
+
+
+class LLMOverloadedError(RuntimeError):
+    """LLM 调用排队已满，新调用被拒绝（接口返回 429）"""
+    retryable = False
+
+
+class LLMTruncatedError(RuntimeError):
+    """输出达到 max_tokens 被截断（finish_reason=length），应加大预算后立即重试"""
+    retryable = True
+    # 预算给小了，不是 provider 的问题，不计入熔断
+    provider_failure = False
+
+    def __init__(self, max_tokens: int):
+        super().__init__(f"LLM 输出达到 max_tokens={max_tokens} 被截断")
+        self.max_tokens = max_tokens
+
+
+class CassetteMissError(LookupError):
+    """回放模式下录制文件中没有可用的响应"""
+    retryable = False
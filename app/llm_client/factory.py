@@ -1,7 +1,12 @@
-from app.llm_client.openai_client import OpenAIClient
-from app.llm_client.deepseek_client import DeepSeekClient
+from app.llm_client.cassette_client import Cassette, RecordingLLMClient, ReplayLLMClient
+from app.llm_client.routing_client import RoutingLLMClient
+from app.config import settings
+from app.core.paths import runtime_dir
+from pathlib import Path
 import logging
+import threading
 # 未来可以引入 ClaudeClient, DeepseekClient 等
+# 各 provider 的 client 在创建时才 import（openai SDK 很重，不拖慢启动）
 
 logger = logging.getLogger(__name__)
 from app.core.user_config import (
@@ -10,20 +15,91 @@ from app.core.user_config import (
     save_user_config,
 )
 
+# 已创建的 client，key 为 (provider, model_name, api_key, base_url)，各 service 共用
+_clients: dict[tuple, object] = {}
+# 录制 / 回放文件，key 为绝对路径
+_cassettes: dict[Path, Cassette] = {}
+_clients_lock = threading.Lock()
+
+
 def get_llm_client(provider: str, model_name:str):
     if not provider or not provider.strip():
         raise ValueError(f"Unsupported LLM provider: {provider}")
     if not model_name or not model_name.strip():
         raise ValueError(f"Unsupported LLM model_name: {model_name}")
-    cfg = load_user_config()
-    if not cfg:
-        raise ValueError(f"API秘钥未配置")
-
     provider = provider.lower()
+    cassette_cfg = settings.llm.cassette
+    if cassette_cfg.mode == "replay":
+        # 回放不访问网络，不需要 API 秘钥
+        key = ("replay", cassette_cfg.path)
+        cfg = None
+    else:
+        cfg = load_user_config()
+        if not cfg:
+            raise ValueError(f"API秘钥未配置")
+        endpoints = tuple((e.api_key, e.base_url or None, e.model, e.name) for e in cfg.endpoints)
+        key = (provider, model_name, cfg.openai_api_key, cfg.base_url or None, endpoints)
+
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            if cfg is None:
+                client = ReplayLLMClient(_get_cassette(cassette_cfg.path), cassette_cfg.time_scale)
+            else:
+                client = _create_llm_client(provider, model_name, cfg.openai_api_key, cfg.base_url)
+                if cfg.endpoints:
+                    client = _create_routing_client(provider, model_name, cfg, client)
+                if cassette_cfg.mode == "record":
+                    client = RecordingLLMClient(client, _get_cassette(cassette_cfg.path), model_name)
+                elif cassette_cfg.mode != "off":
+                    raise ValueError(f"Unsupported llm.cassette.mode: {cassette_cfg.mode}")
+            _clients[key] = client
+        return client
+
+
+def _create_llm_client(provider: str, model_name: str, api_key: str, base_url: str = None):
     logger.info(f"{provider} provider is used,model_name:{model_name}")
     if provider == "openai":
-        return OpenAIClient(model_name,cfg.openai_api_key)
+        from app.llm_client.openai_client import OpenAIClient
+        return OpenAIClient(model_name,api_key)
     if provider == "deepseek":
-        return DeepSeekClient(model_name,cfg.openai_api_key)
+        from app.llm_client.deepseek_client import DeepSeekClient
+        return DeepSeekClient(model_name,api_key,base_url)
     else:
         raise ValueError(f"Unsupported LLM provider and model: {provider}_{model_name}")
+
+
+def _create_routing_client(provider: str, model_name: str, cfg: UserConfig, primary) -> RoutingLLMClient:
+    """主 key + user_config.json 里的 endpoints，按延迟 / 错误率路由"""
+    endpoints = [("primary", primary)]
+    for i, endpoint in enumerate(cfg.endpoints, start=1):
+        name = endpoint.name or f"endpoint{i}"
+        client = _create_llm_client(provider, endpoint.model or model_name, endpoint.api_key, endpoint.base_url)
+        endpoints.append((name, client))
+    if len(endpoints) > settings.llm.http.max_clients:
+        logger.warning(f"llm.http.max_clients={settings.llm.http.max_clients} 小于 endpoint 数 {len(endpoints)}，"
+                       f"连接池会被反复淘汰，请调大")
+    logger.info(f"LLM routing over {len(endpoints)} endpoints: {[name for name, _ in endpoints]}")
+    return RoutingLLMClient(endpoints, settings.llm.routing)
+
+
+def _get_cassette(path: str) -> Cassette:
+    """同一录制文件共用一个 Cassette（调用方已持有 _clients_lock）"""
+    resolved = Path(path)
+    if not resolved.is_absolute():
+        resolved = runtime_dir() / resolved
+    cassette = _cassettes.get(resolved)
+    if cassette is None:
+        cassette = _cassettes[resolved] = Cassette(resolved)
+        logger.info(f"llm cassette: {settings.llm.cassette.mode} {resolved}")
+    return cassette
+
+
+def clear_llm_clients() -> None:
+    """丢弃已缓存的 client（API 秘钥变更后调用）"""
+    with _clients_lock:
+        _clients.clear()
@@ -0,0 +1,272 @@
+# app/llm_client/retry_policy.py
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from app.config import settings, RetryPolicyConfig
+from app.core.metrics import metrics
+from app.llm_client.errors import LLMUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# 可重试的 HTTP 状态码：超时 / 冲突 / 限流 / 服务端错误
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    错误分类：
+    - 可重试：429、5xx、超时、连接错误、流中断，以及声明了 retryable=True 的异常
+    - 不可重试：鉴权失败、请求参数错误等其余 4xx，以及未知异常
+    """
+    if getattr(error, "retryable", None) is not None:
+        return bool(error.retryable)
+    # openai / httpx 延迟到第一次 LLM 调用才 import；还没加载说明不可能是它们的异常
+    openai = sys.modules.get("openai")
+    if openai is not None:
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+        if isinstance(error, openai.APIError):
+            # 连接错误、超时、流式过程中服务端返回的 error 事件
+            return True
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(error, (httpx.TimeoutException, httpx.TransportError)):
+        return True
+    return isinstance(error, asyncio.TimeoutError)
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """429/503 响应里的 Retry-After（秒）"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败 failure_threshold 次后打开，reset_timeout 秒内直接拒绝
+    超时后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开
+    探测请求没有结果就结束（取消、被调度器拒绝、截断后重试）时由调用方 release_probe 放开名额；
+    探测超过 reset_timeout 仍没有结果时兜底放行新的探测
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.open_count = 0
+        # 当前探测请求的编号，release_probe 按编号释放（过期的释放不影响新的探测）
+        self.probe_id = 0
+        self._probing = False
+        self._probe_started = 0.0
+
+    @property
+    def probing(self) -> bool:
+        return self._probing
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN and self._probing and now - self._probe_started >= self.reset_timeout:
+            logger.warning(f"熔断探测请求 {self.reset_timeout}s 内没有结果，放行新的探测")
+            self._probing = False
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            self._probe_started = now
+            self.probe_id += 1
+            return True
+        return False
+
+    def release_probe(self, probe_id: int) -> None:
+        """探测请求没有成功 / 失败结果就结束：放开名额，下一个请求重新探测"""
+        if self._probing and probe_id == self.probe_id:
+            self._probing = False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.open_count += 1
+                logger.warning(f"LLM 熔断器打开，{self.reset_timeout}s 内快速失败")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class RetryBudget:
+    """
+    全局重试预算：window 秒内重试次数不超过 max(min_retries, ratio * 请求数)
+    防止服务端故障时重试把流量放大数倍
+    """
+
+    def __init__(self, ratio: float, min_retries: int, window: float):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests: deque[float] = deque()
+        self._retries: deque[float] = deque()
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        self._prune(now)
+        self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        now = time.monotonic()
+        self._prune(now)
+        if len(self._retries) >= max(self.min_retries, self.ratio * len(self._requests)):
+            return False
+        self._retries.append(now)
+        return True
+
+    def _prune(self, now: float) -> None:
+        """丢掉窗口外的记录（请求数每次都记，必须在这里清理，不然健康流量下会无限增长）"""
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+
+class RetryPolicy:
+    """
+    LLM 调用的重试策略：指数退避 + full jitter、错误分类、全局重试预算、熔断
+    用法见 BasePromptService.retry_prompt
+    """
+
+    def __init__(self, config: RetryPolicyConfig, max_attempts: int, base_delay: float):
+        self.config = config
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.breaker = CircuitBreaker(config.breaker_failure_threshold, config.breaker_reset_timeout)
+        self.budget = RetryBudget(config.budget_ratio, config.budget_min_retries, config.budget_window)
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "successes": 0,
+            "retries": 0,
+            "retryable_errors": 0,
+            "fatal_errors": 0,
+            "budget_exhausted": 0,
+            "short_circuited": 0,
+        }
+
+    def before_attempt(self, attempt: int) -> Optional[int]:
+        """
+        每次尝试前调用；熔断打开时抛 LLMUnavailableError
+        本次尝试是半开状态的探测请求时返回探测编号：传给 on_failure，并在尝试结束时（无论结果）release_probe
+        """
+        with self._lock:
+            if attempt == 1:
+                self.stats["requests"] += 1
+                self.budget.record_request()
+            if not self.breaker.allow():
+                self.stats["short_circuited"] += 1
+                raise LLMUnavailableError("LLM 服务暂时不可用，请稍后再试")
+            return self.breaker.probe_id if self.breaker.probing else None
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.stats["successes"] += 1
+            self.breaker.record_success()
+
+    def release_probe(self, probe: Optional[int]) -> None:
+        if probe is not None:
+            with self._lock:
+                self.breaker.release_probe(probe)
+
+    def on_failure(self, error: BaseException, attempt: int, probe: Optional[int] = None) -> Optional[float]:
+        """
+        记录失败，返回本次重试前应等待的秒数；返回 None 表示不再重试
+        probe 为 before_attempt 返回的探测编号
+        """
+        retryable = is_retryable(error)
+        with self._lock:
+            if not retryable:
+                self.stats["fatal_errors"] += 1
+                if probe is not None:
+                    # 探测请求失败就重新打开，哪怕是不可重试的错误
+                    self.breaker.record_failure()
+                return None
+            self.stats["retryable_errors"] += 1
+            if getattr(error, "provider_failure", True):
+                self.breaker.record_failure()
+            elif probe is not None:
+                # 截断等不算 provider 失败：放开探测名额，本请求的立即重试可以重新探测
+                self.breaker.release_probe(probe)
+            if attempt >= self.max_attempts:
+                return None
+            if not self.budget.try_spend():
+                self.stats["budget_exhausted"] += 1
+                logger.warning("LLM 重试预算已耗尽，不再重试")
+                return None
+            self.stats["retries"] += 1
+        return self.backoff(attempt, error)
+
+    def backoff(self, attempt: int, error: BaseException = None) -> float:
+        """full jitter：uniform(0, min(max_delay, base * 2^(attempt-1)))，服务端给了 Retry-After 则以其为下限"""
+        ceiling = min(self.config.max_delay, self.base_delay * 2 ** (attempt - 1))
+        delay = random.uniform(0, ceiling)
+        hinted = retry_after_seconds(error) if error is not None else None
+        if hinted is not None:
+            delay = max(delay, min(hinted, self.config.max_delay))
+        return delay
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "breaker_state": self.breaker.state,
+                "breaker_consecutive_failures": self.breaker.failures,
+                "breaker_open_count": self.breaker.open_count,
+            }
+
+
+# 单例（全局可用）
+llm_retry_policy = RetryPolicy(
+    settings.llm.retry,
+    max_attempts=int(settings.llm.retries),
+    base_delay=float(settings.llm.retry_delay),
+)
+
+
+def _collect_retry_metrics():
+    """/metrics 渲染时导出重试策略的累计统计和熔断器状态"""
+    snapshot = llm_retry_policy.snapshot()
+    lines = ["# HELP ielts_llm_retry_policy_events_total Retry policy events",
+             "# TYPE ielts_llm_retry_policy_events_total counter"]
+    for event in llm_retry_policy.stats:
+        lines.append(f'ielts_llm_retry_policy_events_total{{event="{event}"}} {snapshot[event]}')
+    lines += ["# HELP ielts_llm_breaker_open Circuit breaker state (1 = open / half open)",
+              "# TYPE ielts_llm_breaker_open gauge",
+              f"ielts_llm_breaker_open {int(snapshot['breaker_state'] != CircuitBreaker.CLOSED)}",
+              "# HELP ielts_llm_breaker_open_total Times the circuit breaker opened",
+              "# TYPE ielts_llm_breaker_open_total counter",
+              f"ielts_llm_breaker_open_total {snapshot['breaker_open_count']}"]
+    return lines
+
+
+metrics.register_collector(_collect_retry_metrics)
@@ -0,0 +1,171 @@
+# app/llm_client/routing_client.py
+import logging
+import threading
+import time
+import weakref
+from contextlib import aclosing
+from typing import AsyncIterator, Optional
+
+from .base_client import BaseLLMClient
+from .retry_policy import is_retryable
+from app.config import RoutingConfig
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+# 这些状态码只说明当前 endpoint 的 key / 模型不可用，换一个 endpoint 可能成功
+ENDPOINT_STATUS = {401, 403, 404}
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """可以归咎于 endpoint 本身的错误：可重试错误 + 鉴权 / 模型不存在；请求参数错误、输出被截断换 endpoint 也没用"""
+    if getattr(error, "provider_failure", True) is False:
+        return False
+    return is_retryable(error) or getattr(error, "status_code", None) in ENDPOINT_STATUS
+
+
+class Endpoint:
+    """
+    一个 endpoint 的实时状态
+    - latency：首 token 延迟（非流式为整次调用耗时）的滑动平均，还没有样本时为 None
+    - error_rate：失败率的滑动平均（成功记 0，失败记 1）
+    - cooldown_until：错误率超过 max_error_rate 后暂停使用到该时间，连续进入冷却时时长翻倍
+    """
+
+    def __init__(self, name: str, client: BaseLLMClient):
+        self.name = name
+        self.client = client
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.inflight = 0
+        self.cooldown_until = 0.0
+        self.strikes = 0
+        self.calls = 0
+        self.errors = 0
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def score(self) -> float:
+        """越小越好：延迟 × (1 + 进行中的调用数)，再按错误率放大（错误率 0.5 时 ×2）"""
+        latency = self.latency or 0.0
+        return latency * (1 + self.inflight) / max(0.01, 1 - self.error_rate)
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "name": self.name,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "inflight": self.inflight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "cooldown_remaining_s": round(max(0.0, self.cooldown_until - now), 1),
+        }
+
+
+class RoutingLLMClient(BaseLLMClient):
+    """
+    多 endpoint 路由：每次调用选当前得分最低（最快、最空闲）的可用 endpoint
+    - 首个增量到达前失败：记一次失败，立即切换到下一个 endpoint（同一次调用内每个 endpoint 最多试一次）
+    - 已经输出增量后失败：无法无缝切换，抛给上层，由 retry_stream 重试（重试时会选到别的 endpoint）
+    - 所有 endpoint 都在冷却中时，按冷却结束时间先后依次尝试，不直接拒绝
+    """
+
+    def __init__(self, endpoints: list[tuple[str, BaseLLMClient]], config: RoutingConfig):
+        if not endpoints:
+            raise ValueError("RoutingLLMClient 至少需要一个 endpoint")
+        self.config = config
+        self.endpoints = [Endpoint(name, client) for name, client in endpoints]
+        self._lock = threading.Lock()
+        _routers.add(self)
+
+    async def prompt(self, prompt: str, system: Optional[str] = None, max_tokens: Optional[int] = None) -> str:
+        return "".join([delta async for delta in self.stream(prompt, system, max_tokens)])
+
+    async def stream(self, prompt: str, system: Optional[str] = None,
+                     max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        last_error: Optional[BaseException] = None
+        for endpoint in self.ranked():
+            started = time.perf_counter()
+            yielded = False
+            self._add_inflight(endpoint, 1)
+            try:
+                async with aclosing(endpoint.client.stream(prompt, system, max_tokens)) as deltas:
+                    async for delta in deltas:
+                        if not yielded:
+                            yielded = True
+                            self._observe_latency(endpoint, time.perf_counter() - started)
+                        yield delta
+            except Exception as e:
+                if not is_endpoint_failure(e):
+                    raise
+                self._record(endpoint, ok=False)
+                if yielded:
+                    raise
+                logger.warning(f"LLM endpoint {endpoint.name} 失败，切换到下一个: {e}")
+                last_error = e
+                continue
+            finally:
+                self._add_inflight(endpoint, -1)
+            if not yielded:
+                self._observe_latency(endpoint, time.perf_counter() - started)
+            self._record(endpoint, ok=True)
+            return
+        raise last_error
+
+    # ======================================================
+    #                  ⭐ 选路 / 状态更新 ⭐
+    # ======================================================
+    def ranked(self) -> list[Endpoint]:
+        """本次调用的尝试顺序：可用的按得分（同分时进行中少的优先），冷却中的按冷却结束时间"""
+        now = time.monotonic()
+        with self._lock:
+            available = [e for e in self.endpoints if e.available(now)]
+            cooling = [e for e in self.endpoints if not e.available(now)]
+            available.sort(key=lambda e: (e.score(), e.inflight))
+            cooling.sort(key=lambda e: e.cooldown_until)
+        return available + cooling
+
+    def _add_inflight(self, endpoint: Endpoint, delta: int) -> None:
+        with self._lock:
+            endpoint.inflight += delta
+            metrics.llm_endpoint_inflight.set(endpoint.inflight, endpoint=endpoint.name)
+
+    def _observe_latency(self, endpoint: Endpoint, seconds: float) -> None:
+        alpha = self.config.ewma_alpha
+        with self._lock:
+            if endpoint.latency is None:
+                endpoint.latency = seconds
+            else:
+                endpoint.latency = (1 - alpha) * endpoint.latency + alpha * seconds
+            metrics.llm_endpoint_latency_seconds.set(endpoint.latency, endpoint=endpoint.name)
+
+    def _record(self, endpoint: Endpoint, ok: bool) -> None:
+        cfg = self.config
+        with self._lock:
+            endpoint.calls += 1
+            endpoint.error_rate = (1 - cfg.ewma_alpha) * endpoint.error_rate + cfg.ewma_alpha * (0.0 if ok else 1.0)
+            if ok:
+                endpoint.strikes = 0
+            else:
+                endpoint.errors += 1
+                if endpoint.error_rate > cfg.max_error_rate:
+                    cooldown = min(cfg.max_cooldown_seconds, cfg.cooldown_seconds * 2 ** endpoint.strikes)
+                    endpoint.cooldown_until = time.monotonic() + cooldown
+                    endpoint.strikes += 1
+                    logger.warning(f"LLM endpoint {endpoint.name} 错误率 {endpoint.error_rate:.2f}，暂停 {cooldown:.0f}s")
+            metrics.llm_endpoint_error_rate.set(endpoint.error_rate, endpoint=endpoint.name)
+        metrics.llm_endpoint_calls_total.inc(endpoint=endpoint.name, outcome="ok" if ok else "error")
+
+    def snapshot(self) -> list[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [e.snapshot(now) for e in self.endpoints]
+
+
+# 所有路由 client（key 变更后旧实例被丢弃，随之从这里消失）
+_routers: "weakref.WeakSet[RoutingLLMClient]" = weakref.WeakSet()
+
+
+def routing_snapshot() -> list[list[dict]]:
+    return [router.snapshot() for router in list(_routers)]
@@ -0,0 +1,227 @@
+# app/llm_client/scheduler.py
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Optional
+
+from app.config import settings, SchedulerConfig
+from app.core import metrics
+from app.core.task_context import current_task, llm_labels
+from app.core.tracing import tracer
+from app.llm_client.errors import LLMOverloadedError
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """数值越小越先拿到调用名额"""
+    INTERACTIVE = 0  # 用户在等的批改 / 提示
+    GENERATION = 1   # 出题（含其中嵌套的子主题生成）
+    BACKGROUND = 2   # 后台刷新 / 预生成
+
+
+# 显式指定的优先级；没有指定时按当前任务的 subtype 推断
+_priority: ContextVar[Optional[Priority]] = ContextVar("llm_priority", default=None)
+
+
+@contextmanager
+def priority_scope(priority: Priority):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> Priority:
+    explicit = _priority.get()
+    if explicit is not None:
+        return explicit
+    _, subtype = current_task()
+    if subtype in ("correct", "hint"):
+        return Priority.INTERACTIVE
+    if subtype == "start":
+        return Priority.GENERATION
+    # 不属于任何请求（如子主题后台刷新，跑在空上下文里）
+    return Priority.BACKGROUND
+
+
+class TokenBucket:
+    """令牌桶：rate 为每秒补充的令牌数（0 不限速），最多攒 burst 个"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def wait_time(self) -> float:
+        """还要等多少秒才有令牌；0 表示现在就有"""
+        if self.rate <= 0:
+            return max(0.0, self.paused_until - time.monotonic())
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.paused_until:
+            return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        if self.rate > 0:
+            self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class LLMScheduler:
+    """
+    一个 provider 的 LLM 调用调度，放在 BaseLLMClient 前面（每次尝试调用前 async with slot()）
+    - 并发：最多 max_concurrency 个调用同时进行
+    - 限速：令牌桶，每次发起调用消耗一个令牌；上游返回 429 时按 Retry-After 暂停发放（throttle）
+    - 排队：按 (优先级, 到达顺序) 出队；队列满时高优先级挤掉排在最后的低优先级，否则直接拒绝新调用
+    只在一个事件循环内使用（uvicorn 单进程单循环）
+    """
+
+    def __init__(self, provider: str, config: SchedulerConfig, max_concurrency: int):
+        rate = config.rate_for(provider)
+        self.provider = provider
+        self.max_queue = config.max_queue
+        self.max_concurrency = max(1, max_concurrency)
+        self.bucket = TokenBucket(rate.requests_per_second, rate.burst)
+        self.running = 0
+        # 堆元素：[priority, seq, future]；被取消 / 挤掉的 future 留在堆里，出队时跳过
+        self._waiters: list[list] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @asynccontextmanager
+    async def slot(self):
+        priority = current_priority()
+        started = time.perf_counter()
+        with tracer.span("llm.queue", priority=priority.name.lower()):
+            await self._acquire(priority)
+        metrics.llm_queue_wait_seconds.observe(time.perf_counter() - started,
+                                               priority=priority.name.lower(), **llm_labels())
+        try:
+            yield
+        finally:
+            self._release()
+
+    def throttle(self, seconds: float) -> None:
+        """上游限流（429）：seconds 秒内不再发放令牌，已在进行的调用不受影响"""
+        logger.warning(f"LLM provider {self.provider} 限流，暂停发起新调用 {seconds:.1f}s")
+        self.bucket.pause(seconds)
+
+    def snapshot(self) -> dict:
+        depth = {p.name.lower(): 0 for p in Priority}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                depth[Priority(priority).name.lower()] += 1
+        return {"provider": self.provider, "running": self.running, "queued": depth,
+                "max_concurrency": self.max_concurrency, "max_queue": self.max_queue}
+
+    # ======================================================
+    #                  ⭐ 入队 / 出队 ⭐
+    # ======================================================
+    async def _acquire(self, priority: Priority) -> None:
+        if not self._pending() and self.running < self.max_concurrency and self.bucket.wait_time() == 0:
+            self._grant()
+            return
+
+        if self._pending() >= self.max_queue:
+            self._make_room(priority)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [int(priority), next(self._seq), future])
+        self._update_depth()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # 名额已分配但调用方同时被取消：归还名额
+                self._release()
+            raise
+        finally:
+            self._update_depth()
+
+    def _make_room(self, priority: Priority) -> None:
+        """队列已满：挤掉优先级比新调用低的、排在最后的一个；没有则拒绝新调用"""
+        candidates = [w for w in self._waiters if not w[2].done() and w[0] > priority]
+        if not candidates:
+            raise self._rejection(priority)
+        victim = max(candidates, key=lambda w: (w[0], w[1]))
+        victim[2].set_exception(self._rejection(Priority(victim[0])))
+
+    def _rejection(self, priority: Priority) -> LLMOverloadedError:
+        metrics.llm_rejected_total.inc(provider=self.provider, priority=priority.name.lower())
+        return LLMOverloadedError(f"LLM 调用排队已满（{self.max_queue}），请稍后再试")
+
+    def _dispatch(self) -> None:
+        while self._waiters and self.running < self.max_concurrency:
+            future = self._waiters[0][2]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = self.bucket.wait_time()
+            if wait > 0:
+                self._schedule_dispatch(wait)
+                return
+            heapq.heappop(self._waiters)
+            self._grant()
+            future.set_result(None)
+
+    def _schedule_dispatch(self, delay: float) -> None:
+        if self._timer is not None:
+            return
+
+        def fire():
+            self._timer = None
+            self._dispatch()
+
+        self._timer = asyncio.get_running_loop().call_later(delay, fire)
+
+    def _grant(self) -> None:
+        self.bucket.take()
+        self.running += 1
+        metrics.llm_inflight.set(self.running, provider=self.provider)
+
+    def _release(self) -> None:
+        self.running -= 1
+        metrics.llm_inflight.set(self.running, provider=self.provider)
+        self._dispatch()
+
+    def _pending(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _update_depth(self) -> None:
+        for name, count in self.snapshot()["queued"].items():
+            metrics.llm_queue_depth.set(count, provider=self.provider, priority=name)
+
+
+# 按 provider 创建，各 service 共用
+_schedulers: dict[str, LLMScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(provider: str) -> LLMScheduler:
+    provider = (provider or "").lower()
+    with _schedulers_lock:
+        scheduler = _schedulers.get(provider)
+        if scheduler is None:
+            scheduler = _schedulers[provider] = LLMScheduler(
+                provider, settings.llm.scheduler, settings.llm.max_concurrency
+            )
+        return scheduler
+
+
+def scheduler_snapshot() -> list[dict]:
+    with _schedulers_lock:
+        return [scheduler.snapshot() for scheduler in _schedulers.values()]
@@ -0,0 +1,138 @@
+# app/llm_client/token_budget.py
+import json
+import logging
+import math
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings, TokenBudgetConfig
+from app.core.paths import cache_dir
+
+logger = logging.getLogger(__name__)
+
+# 每记录多少次输出长度落一次盘
+SAVE_EVERY = 20
+
+
+class TokenBudget:
+    """
+    max_tokens 预算，key 为 (语言, prompt 名)
+    - 记录最近 window 次生成的 completion_tokens（来自 usage；被截断的也记，相当于一个下限）
+    - limit：样本足够时取 percentile 分位数 × (1 + margin)，夹在 [min_tokens, max_tokens] 之间；否则用 max_tokens
+    - grow：被截断后的下一次尝试把预算翻倍（不超过 max_tokens；没有更多重试机会时直接给 max_tokens）
+    - 样本持久化到 cache/token_budget.json，重启后不用重新学习
+    """
+
+    def __init__(self, config: TokenBudgetConfig, path: Optional[Path] = None):
+        self.config = config
+        self.path = path
+        self._samples: dict[str, deque[int]] = {}
+        self._limits: dict[str, int] = {}
+        self._loaded = False
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt_key: Optional[str], language: str) -> str:
+        return f"{language}:{prompt_key or 'default'}"
+
+    # ======================================================
+    #                    ⭐ public API ⭐
+    # ======================================================
+    def limit(self, prompt_key: Optional[str], language: str) -> int:
+        cfg = self.config
+        if not cfg.enabled:
+            return cfg.max_tokens
+        key = self.make_key(prompt_key, language)
+        with self._lock:
+            self._load()
+            limit = self._limits.get(key)
+            if limit is None:
+                limit = self._limits[key] = self._compute(self._samples.get(key))
+            return limit
+
+    def grow(self, current: int, to_max: bool = False) -> int:
+        if to_max:
+            return self.config.max_tokens
+        return min(self.config.max_tokens, max(current * 2, self.config.min_tokens))
+
+    def observe(self, prompt_key: Optional[str], language: str, completion_tokens: int) -> None:
+        key = self.make_key(prompt_key, language)
+        with self._lock:
+            self._load()
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.config.window)
+            samples.append(int(completion_tokens))
+            self._limits.pop(key, None)
+            self._unsaved += 1
+            if self._unsaved >= SAVE_EVERY:
+                self._save()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._load()
+            keys = sorted(self._samples)
+            return {
+                key: {
+                    "samples": len(self._samples[key]),
+                    "p50": _percentile(sorted(self._samples[key]), 0.5),
+                    "max": max(self._samples[key], default=0),
+                    "limit": self._compute(self._samples[key]),
+                }
+                for key in keys
+            }
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    # ======================================================
+    #                  ⭐ 计算 / 持久化 ⭐
+    # ======================================================
+    def _compute(self, samples: Optional[deque]) -> int:
+        cfg = self.config
+        if not samples or len(samples) < cfg.min_samples:
+            return cfg.max_tokens
+        high = _percentile(sorted(samples), cfg.percentile)
+        return max(cfg.min_tokens, min(cfg.max_tokens, math.ceil(high * (1 + cfg.margin))))
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            for key, values in data.items():
+                self._samples[key] = deque((int(v) for v in values), maxlen=self.config.window)
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"token 预算文件损坏，已忽略: {self.path} {e}")
+
+    def _save(self) -> None:
+        self._unsaved = 0
+        if not self.path:
+            return
+        tmp_path = self.path.with_suffix(".tmp")
+        try:
+            data = {key: list(values) for key, values in self._samples.items()}
+            tmp_path.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"token 预算写入失败: {e}")
+
+
+def _percentile(sorted_values: list[int], q: float) -> int:
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# 单例（全局可用）
+token_budget = TokenBudget(settings.llm.token_budget, cache_dir() / "token_budget.json")
@@ -1,5 +1,5 @@
+from app.core.startup import startup_timer
 from fastapi import FastAPI
-from app.api.v1.task_api import router as task_router
 import logging
 import os
 import sys
@@ -7,13 +7,30 @@ import socket
 import uvicorn
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-from starlette.responses import FileResponse
-from app.api.v1.user_config_api import router as config_router
+from starlette.responses import FileResponse, JSONResponse
 from contextlib import asynccontextmanager
 import webbrowser
 from fastapi.middleware.cors import CORSMiddleware
+startup_timer.mark("import.framework")
+
+from app.api.v1.task_api import router as task_router
+from app.api.v1.user_config_api import router as config_router
+from app.api.v1.debug_api import router as debug_router
+from app.api.v1.metrics_api import router as metrics_router
+from app.llm_client.errors import LLMOverloadedError, LLMUnavailableError
+from app.core.deadline import DeadlineExceededError
+from app.llm_client.token_budget import token_budget
+from app.services.exercise_bank import exercise_bank
+from app.services.exercise_pool import exercise_pool
+from app.services.near_duplicates import near_duplicates
+from app.schemas.api_response import APIResponse
+from app.utils.logger import setup_logging
+startup_timer.mark("import.app")
 
 logger = logging.getLogger(__name__)
+# 日志经队列由后台线程写出（只配置一次）
+setup_logging()
+
 def base_path() -> Path:
     """
     项目根路径：
@@ -31,31 +48,65 @@ STATIC_DIR = BASE_DIR / "app" / "static"
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    startup_timer.mark("server.start")
+    logger.info(startup_timer.format_report())
     port = getattr(app.state, "port", None)  # 获取 port，如果没设置返回 None
     if port is not None:
         print("\nEnglish Learning Tool Started Successfully!")
         print(f"Open in browser: http://127.0.0.1:{port}\n")
         webbrowser.open(f"http://127.0.0.1:{port}")
 
+    # 出题预生成池（settings.yml exercise_pool.enabled 开启时才有后台任务）
+    exercise_pool.start()
+
     yield
 
+    await exercise_pool.stop()
+    token_budget.flush()
+    exercise_bank.close()
+    near_duplicates.flush()
     print("English Learning Tool Is Shutting Down...")
 
 
 
 app = FastAPI(lifespan=lifespan,docs_url=None,redoc_url=None)
 
-# 1. 挂载静态资源
-app.mount(
-    "/_next",
-    StaticFiles(directory=FRONTEND_DIR / "_next"),
-    name="nextjs-static"
-)
+# 1. 挂载静态资源（前端未构建时跳过，只提供 API）
+if (FRONTEND_DIR / "_next").is_dir():
+    app.mount(
+        "/_next",
+        StaticFiles(directory=FRONTEND_DIR / "_next"),
+        name="nextjs-static"
+    )
+else:
+    logger.warning(f"frontend build not found: {FRONTEND_DIR}, serving API only")
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
 #路由设置
 app.include_router(task_router, prefix="/api/v1", tags=["task"])
 app.include_router(config_router, prefix="/api/v1",tags=["config"])
+app.include_router(debug_router, prefix="/api/v1", tags=["debug"])
+# Prometheus 抓取地址：/metrics（需在前端兜底路由之前注册）
+app.include_router(metrics_router)
+
+
+@app.exception_handler(LLMUnavailableError)
+async def llm_unavailable_handler(request, exc: LLMUnavailableError):
+    # 熔断中：直接返回 503，不占用 LLM 调用
+    return JSONResponse(status_code=503, content=APIResponse.error("503", str(exc)).model_dump())
+
+
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request, exc: LLMOverloadedError):
+    # LLM 调用排队已满：快速拒绝，客户端稍后重试
+    return JSONResponse(status_code=429, content=APIResponse.error("429", str(exc)).model_dump(),
+                        headers={"Retry-After": "1"})
+
+
+@app.exception_handler(DeadlineExceededError)
+async def deadline_exceeded_handler(request, exc: DeadlineExceededError):
+    # 超过任务类型的超时时间：上游生成已取消
+    return JSONResponse(status_code=504, content=APIResponse.error("504", str(exc)).model_dump())
 
 # 跨域配置
 origins = [
@@ -72,6 +123,8 @@ app.add_middleware(
     allow_headers=["*"],    # 允许所有请求头
 )
 
+startup_timer.mark("app.init")
+
 # 2. 处理前端路由（非常重要）
 @app.get("/{full_path:path}")
 async def serve_frontend(full_path: str):
@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field
 from typing import Any, Optional, Generic, TypeVar
 
+from app.utils import json_codec
+
 # 定义泛型类型变量
 T = TypeVar('T')
 
@@ -23,6 +25,16 @@ class APIResponse(BaseModel, Generic[T]):
         """成功响应"""
         return cls(code="0", msg=msg, data=data)
 
+    @classmethod
+    def success_json(cls, data: Any = None, msg: str = "success") -> str:
+        """
+        成功响应直接编码成 JSON 文本，不经过模型校验：
+        data 为 JSONText（已校验的 LLM 输出）时原样拼进 data 字段，否则用 json_codec 编码
+        """
+        if isinstance(data, json_codec.JSONText):
+            return f'{{"code":"0","msg":{json_codec.dumps(msg)},"data":{data}}}'
+        return json_codec.dumps({"code": "0", "msg": msg, "data": data})
+
     @classmethod
     def error(cls, code: str, msg: str, data: Optional[T] = None) -> 'APIResponse[T]':
         """错误响应"""
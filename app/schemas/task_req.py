@@ -11,6 +11,7 @@ class TaskReq(BaseModel):
     question_type: Optional[str] = Field(None, description="大作文题目类型")
     original_article: Optional[str] = Field(None, description="原始文章")
     answers:  Optional[Dict] = Field(default=None,description="答案")
+    client_id: Optional[str] = Field(None, description="客户端标识，近重复检测按它区分用户；不传为 local")
     class Config:
         from_attributes = True
 
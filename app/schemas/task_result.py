@@ -0,0 +1,65 @@
+# app/schemas/task_result.py
+from typing import Any, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class TaskResult(BaseModel):
+    """各任务 LLM 输出的结构；只声明 prompt 中明确要求的字段，其余字段原样保留"""
+    model_config = ConfigDict(extra="allow")
+
+
+class SubtopicsResult(TaskResult):
+    topic: Optional[str] = None
+    subtopics: list[str]
+
+
+class SynonymStartResult(TaskResult):
+    passage_title: Optional[str] = None
+    article: str = Field(..., description="用 [A] [B] ... 标出待替换词的文章")
+    markers: dict[str, str]
+
+
+class CorrectionResult(TaskResult):
+    """批改结果：details 按标记（A / B ...）或序号给出逐项点评"""
+    details: Union[dict[str, Any], list[Any]]
+
+
+class SentenceStartResult(TaskResult):
+    sentence: str
+    examples: list[str]
+
+
+class ReadingStartResult(TaskResult):
+    """reading1 的 passage 为全文；reading2 按段落字母给出"""
+    passage_title: Optional[str] = None
+    passage: Union[str, dict[str, str]]
+    questions: dict[str, Any]
+
+
+class Reading3StartResult(TaskResult):
+    title: Optional[str] = None
+    passage: str
+
+
+class Writing1StartResult(TaskResult):
+    type: str = Field(..., description="bar / line / pie / table / process")
+    title: Optional[str] = None
+    content: dict[str, Any]
+
+
+# key 为 "{type}_{subtype}"（与 settings.yml 的 prompt 名一致）
+TASK_RESULTS: dict[str, type[TaskResult]] = {
+    "subtopics_start": SubtopicsResult,
+    "synonym_start": SynonymStartResult,
+    "synonym_correct": CorrectionResult,
+    "sentence_start": SentenceStartResult,
+    "sentence_correct": CorrectionResult,
+    "reading1_start": ReadingStartResult,
+    "reading2_start": ReadingStartResult,
+    "reading3_start": Reading3StartResult,
+    "writing1_start": Writing1StartResult,
+}
+
+# 接口文档用：data 为以上任一结构（未登记的任务也是一个 JSON 对象）
+AnyTaskResult = Union[tuple(dict.fromkeys([*TASK_RESULTS.values(), TaskResult]))]
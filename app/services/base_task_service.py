@@ -1,11 +1,33 @@
+import json
 import logging
 import asyncio
+import random
 from abc import ABC, abstractmethod
-from typing import Optional
+from contextlib import aclosing
+from typing import Optional, AsyncIterator, Any
 from app.llm_client.factory import get_llm_client
+from app.llm_client.errors import LLMOverloadedError, LLMTruncatedError
+from app.llm_client.retry_policy import llm_retry_policy, retry_after_seconds
+from app.llm_client.scheduler import get_scheduler
+from app.llm_client.token_budget import token_budget
 from app.config import settings
+from app.core import deadline
+from app.core import metrics
+from app.core.task_context import task_scope, prompt_scope, llm_labels, current_language
+from app.core.tracing import tracer
 from app.schemas.task_req import TaskReq
+from app.services.exercise_bank import exercise_bank, exercise_scope, record_attributes
+from app.services.exercise_pool import exercise_pool
+from app.services.near_duplicates import near_duplicates
 from app.services.random_dimensions import RandomizerEngine
+from app.services.subtopic_cache import subtopic_cache
+from app.services.output_schema import required_keys
+from app.services.output_validators import has_validator, validate, repair_fields, Violation
+from app.services.prompt_layout import split_prompt
+from app.utils import json_codec
+from app.utils.json_codec import JSONText
+from app.utils.json_stream import IncrementalJSONParser, JSONStreamError
+from app.utils.logger import log_completion
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +44,8 @@ class BasePromptService(ABC):
             self.settings.llm.provider,
             self.settings.llm.model
         )
+        # 并发上限 / 限速 / 优先级排队，同一 provider 的所有 service 共用
+        self.scheduler = get_scheduler(self.settings.llm.provider)
 
     def random_dimensions(self, dim_list=None, k=None):
         """
@@ -32,53 +56,278 @@ class BasePromptService(ABC):
 
         # 默认使用全部维度
         dim_list = dim_list or list(READING_DIMENSIONS.keys())
-        return RandomizerEngine.pick_reading(dim_list, k=k)
+        dimensions = RandomizerEngine.pick_reading(dim_list, k=k)
+        # 随结果一起入题库
+        record_attributes(dimensions=dimensions)
+        return dimensions
+
+    async def pick_subtopic(self, data: TaskReq) -> str:
+        """
+        从 data.domain 的子主题列表中随机挑一个，子主题列表走缓存
+        """
+        with tracer.span("pick_subtopic", domain=data.domain):
+            subtopics = await subtopic_cache.get(
+                data.language,
+                data.domain,
+                lambda: self.generate_subtopics(data),
+            )
+            subtopic = random.choice(subtopics)
+            record_attributes(subtopic=subtopic)
+            return subtopic
+
+    async def generate_subtopics(self, data: TaskReq) -> list[str]:
+        """
+        调用 subtopics_start 生成子主题列表（不修改 data，后台刷新任务也会调用）
+        """
+        with tracer.span("generate_subtopics", domain=data.domain):
+            subtopics_req = data.model_copy(update={"type": "subtopics", "subtype": "start"})
+            template = self.choose_prompt(subtopics_req)
+            system, prompt = split_prompt(template, template.replace("[1]", data.domain))
+            return json_codec.loads(await self.retry_prompt(prompt, "subtopics_start", system))["subtopics"]
 
     # ======================================================
     #                    ⭐ public API ⭐
     # ======================================================
-    def start(self, data: TaskReq):
-        prompt = self.choose_prompt(data)
-        prompt = self.start_pre_process(data, prompt)
-        llm_result = self.retry_prompt(prompt)
-        return self.start_post_process(data, llm_result)
-
-    def correct(self, data: TaskReq):
-        prompt = self.choose_prompt(data)
-        prompt = self.correct_pre_process(data, prompt)
-        llm_result = self.retry_prompt(prompt)
-        return self.correct_post_process(data, llm_result)
-
-    def hint(self, data: TaskReq):
-        prompt = self.choose_prompt(data)
-        llm_result = self.retry_prompt(prompt)
-        return self.hint_post_process(data, llm_result)
+    # task_scope：给本次任务内的所有 LLM 调用打上任务类型标签（指标按任务拆分）
+    # 各阶段用 tracer.span 计时，pre_process 里嵌套的子主题调用会挂在 pre_process 之下
+    # 出题（start）先从预生成池取；池里没有时生成，结果入本地题库；
+    # provider 不可用 / 太慢时按 exercise_bank.reuse 从题库取题
+    # 返回前做近重复检测：与该客户端做过的文章太像时换一道（见 avoid_repeat）
+    async def start(self, data: TaskReq):
+        with task_scope(data.type, data.subtype, data.language), tracer.span("service.start") as span, \
+                exercise_scope() as attributes:
+            result = exercise_pool.take(data)
+            if result is not None:
+                span.set(source="pool")
+            else:
+                result = await exercise_bank.generate_or_reuse(data, attributes, lambda: self._generate_start(data))
+            result, _ = await self.avoid_repeat(data, attributes, result)
+            return result
+
+    async def pregenerate(self, data: TaskReq):
+        """预生成池的后台出题：总是重新生成（不取池 / 题库），结果同样入题库"""
+        with task_scope(data.type, data.subtype, data.language), tracer.span("service.pregenerate"), \
+                exercise_scope() as attributes:
+            result = await self._generate_start(data)
+            exercise_bank.store(data, attributes, result)
+            return result
+
+    async def _generate_start(self, data: TaskReq):
+        with tracer.span("choose_prompt"):
+            template = self.choose_prompt(data)
+        with tracer.span("pre_process"):
+            prompt = await self.start_pre_process(data, template)
+            system, prompt = split_prompt(template, prompt)
+        llm_result = await self.retry_prompt(prompt, self.prompt_key(data), system)
+        with tracer.span("post_process"):
+            result = await self.start_post_process(data, llm_result)
+        return await self.validate_start(data, result)
+
+    async def avoid_repeat(self, data: TaskReq, attributes: dict, result: Any) -> tuple[Any, bool]:
+        """
+        近重复检测：文章与该客户端（data.client_id）之前拿到的某篇估计 Jaccard ≥ threshold 时，
+        先从题库换一道不重复的，没有再按配置重新生成一次；最终返回的题记入该客户端的索引
+        返回 (题目, 是否换过)
+        """
+        config = near_duplicates.config
+        if not config.enabled:
+            return result, False
+        with tracer.span("near_duplicates") as span:
+            sig = near_duplicates.signature_of(result)
+            if not near_duplicates.is_repeat(data.client_id, sig):
+                near_duplicates.add(data.client_id, sig)
+                return result, False
+
+            replacement, action = None, "kept"
+            if config.swap_from_bank:
+                replacement = exercise_bank.take(
+                    data, attributes, "duplicate", attempts=config.swap_attempts,
+                    accept=lambda content: not near_duplicates.is_repeat(
+                        data.client_id, near_duplicates.signature_of(content)))
+                action = "swapped" if replacement is not None else action
+            if replacement is None and config.regenerate:
+                try:
+                    replacement = await self._generate_start(data)
+                except Exception as e:
+                    logger.warning(f"近重复题目重新生成失败，返回原题: {e}")
+                else:
+                    exercise_bank.store(data, attributes, replacement)
+                    action = "regenerated"
+            span.set(action=action)
+            metrics.near_duplicates_total.inc(task_type=data.type, action=action)
+            logger.info(f"{data.type} 题目与客户端 {data.client_id or 'local'} 做过的题近重复：{action}")
+            if replacement is None:
+                near_duplicates.add(data.client_id, sig)
+                return result, False
+            near_duplicates.add(data.client_id, near_duplicates.signature_of(replacement))
+            return replacement, True
+
+    async def validate_start(self, data: TaskReq, result: Any) -> Any:
+        """
+        出题结果的本地校验，在 start_post_process 之后调用（登记了规则的任务才校验）：按 output_validators 检查字数、
+        标记 / 字段一致性、题目数量和选项结构；不合格时只让 LLM 重新生成不合格的字段（见 repair），
+        合并后再校验，问题变少才采用，最多 validation.max_repairs 轮；仍不合格时返回最后一版并记录
+        合格或没有登记规则时原样返回 result（JSONText 可以直接拼进响应）
+        """
+        config = settings.validation
+        key = self.prompt_key(data)
+        if not config.enabled or not has_validator(key):
+            return result
+        with tracer.span("validate") as span:
+            parsed = json_codec.loads(result) if isinstance(result, str) else result
+            violations = validate(key, parsed, config.word_count_tolerance)
+            repairs = 0
+            changed = False
+            while violations and config.repair and repairs < config.max_repairs:
+                repairs += 1
+                fields = repair_fields(violations)
+                try:
+                    patch = await self.repair(data, parsed, violations, fields)
+                except Exception as e:
+                    logger.warning(f"{key} 定向修复失败: {e}")
+                    break
+                candidate = {**parsed, **{field: patch[field] for field in fields if field in patch}}
+                remaining = validate(key, candidate, config.word_count_tolerance)
+                if len(remaining) >= len(violations):
+                    break
+                parsed, violations, changed = candidate, remaining, True
+
+            outcome = "invalid" if violations else ("repaired" if changed else "ok")
+            span.set(outcome=outcome, repairs=repairs)
+            metrics.output_validation_total.inc(task_type=data.type, outcome=outcome)
+            if violations:
+                logger.warning(f"{key} 结果未通过校验（已修复 {repairs} 轮）: {[v.message for v in violations]}")
+            return JSONText(json_codec.dumps(parsed)) if changed else result
+
+    async def repair(self, data: TaskReq, result: dict, violations: list[Violation], fields: tuple[str, ...]) -> dict:
+        """定向修复：把问题和当前结果交给 LLM，只输出需要重新生成的字段（输出 token 远少于整题重新生成）"""
+        lang_prompt = getattr(self.settings.prompt, data.language, None) or self.settings.prompt.zh
+        template = lang_prompt.repair_start
+        problems = "\n".join(f"- {v.message}" for v in violations)
+        # 结果 JSON 最后替换：文章里可能出现 [1] 之类的文字
+        prompt = template.replace("[3]", ", ".join(fields)).replace("[1]", problems) \
+            .replace("[2]", json.dumps(result, ensure_ascii=False, indent=2))
+        system, prompt = split_prompt(template, prompt)
+        with tracer.span("repair", fields=",".join(fields)):
+            patch = json_codec.loads(await self.retry_prompt(prompt, "repair_start", system))
+        if not isinstance(patch, dict):
+            raise ValueError("修复结果不是 JSON 对象")
+        return patch
+
+    async def correct(self, data: TaskReq):
+        with task_scope(data.type, data.subtype, data.language), tracer.span("service.correct"):
+            with tracer.span("choose_prompt"):
+                template = self.choose_prompt(data)
+            with tracer.span("pre_process"):
+                prompt = await self.correct_pre_process(data, template)
+                system, prompt = split_prompt(template, prompt)
+            llm_result = await self.retry_prompt(prompt, self.prompt_key(data), system)
+            with tracer.span("post_process"):
+                return await self.correct_post_process(data, llm_result)
+
+    async def hint(self, data: TaskReq):
+        with task_scope(data.type, data.subtype, data.language), tracer.span("service.hint"):
+            with tracer.span("choose_prompt"):
+                prompt = self.choose_prompt(data)
+            llm_result = await self.retry_prompt(prompt, self.prompt_key(data))
+            with tracer.span("post_process"):
+                return await self.hint_post_process(data, llm_result)
+
+    # ======================================================
+    #                  ⭐ 流式 public API ⭐
+    # ======================================================
+    # 流式版本产出 (event, payload)：
+    #   ("delta", str)  LLM 增量文本
+    #   ("field", dict) 某个顶层字段已完整生成：{"key": ..., "value": ...}
+    #   ("reset", dict) 本次尝试失败、即将重试，前端应丢弃已收到的增量和字段
+    #   ("done", Any)   经过 post_process 的最终结果
+    #   provider 失败时改用题库里的题：已经推送过增量则先产出 ("reset", {"source": "bank"})，再产出 ("done", 题目)
+    #   近重复检测换了题时同样先产出 ("reset", {"source": "duplicate"})；post_process 修复 / 改写了结果时为 {"source": "repair"}
+    async def start_stream(self, data: TaskReq) -> AsyncIterator[tuple[str, Any]]:
+        with task_scope(data.type, data.subtype, data.language), tracer.span("service.start_stream") as span, \
+                exercise_scope() as attributes:
+            pooled = exercise_pool.take(data)
+            if pooled is not None:
+                span.set(source="pool")
+                result, _ = await self.avoid_repeat(data, attributes, pooled)
+                yield "done", result
+                return
+            streamed = False
+            try:
+                with tracer.span("choose_prompt"):
+                    template = self.choose_prompt(data)
+                with tracer.span("pre_process"):
+                    prompt = await self.start_pre_process(data, template)
+                    system, prompt = split_prompt(template, prompt)
+                async with aclosing(self.retry_stream(prompt, self.prompt_key(data), system)) as events:
+                    async for event, payload in events:
+                        if event == "result":
+                            with tracer.span("post_process"):
+                                result = await self.start_post_process(data, payload)
+                            result = await self.validate_start(data, result)
+                            if result is not payload:
+                                # 校验修复等改写了结果：已推送的字段作废
+                                yield "reset", {"source": "repair"}
+                            exercise_bank.store(data, attributes, result)
+                            result, swapped = await self.avoid_repeat(data, attributes, result)
+                            if swapped:
+                                yield "reset", {"source": "duplicate"}
+                            yield "done", result
+                        else:
+                            streamed = True
+                            yield event, payload
+            except Exception as e:
+                served = exercise_bank.fallback(data, attributes, e)
+                if served is None:
+                    raise
+                served, _ = await self.avoid_repeat(data, attributes, served)
+                if streamed:
+                    yield "reset", {"source": "bank"}
+                yield "done", served
+
+    async def correct_stream(self, data: TaskReq) -> AsyncIterator[tuple[str, Any]]:
+        with task_scope(data.type, data.subtype, data.language), tracer.span("service.correct_stream"):
+            with tracer.span("choose_prompt"):
+                template = self.choose_prompt(data)
+            with tracer.span("pre_process"):
+                prompt = await self.correct_pre_process(data, template)
+                system, prompt = split_prompt(template, prompt)
+            # aclosing：客户端断开时在本协程里关闭 retry_stream（同一个 Context 里还原 span / scope，上游连接立即关闭）
+            async with aclosing(self.retry_stream(prompt, self.prompt_key(data), system)) as events:
+                async for event, payload in events:
+                    if event == "result":
+                        with tracer.span("post_process"):
+                            result = await self.correct_post_process(data, payload)
+                        yield "done", result
+                    else:
+                        yield event, payload
 
     # ======================================================
     #                     ⭐ 抽象方法 ⭐
     # ======================================================
+    # 钩子均为协程：pre_process 里可能还要调用 LLM（如 randomize）
     @abstractmethod
-    def start_post_process(self, data: TaskReq, result: str) -> str:
+    async def start_post_process(self, data: TaskReq, result: str) -> str:
         pass
 
     @abstractmethod
-    def correct_post_process(self, data: TaskReq, result: str) -> str:
+    async def correct_post_process(self, data: TaskReq, result: str) -> str:
         pass
 
     @abstractmethod
-    def hint_post_process(self, data: TaskReq, result: str) -> str:
+    async def hint_post_process(self, data: TaskReq, result: str) -> str:
         pass
 
     @abstractmethod
-    def start_pre_process(self, data: TaskReq, prompt: str) -> str:
+    async def start_pre_process(self, data: TaskReq, prompt: str) -> str:
         pass
 
     @abstractmethod
-    def correct_pre_process(self, data: TaskReq, prompt: str) -> str:
+    async def correct_pre_process(self, data: TaskReq, prompt: str) -> str:
         pass
 
     @abstractmethod
-    def hint_pre_process(self, data: TaskReq, prompt: str) -> str:
+    async def hint_pre_process(self, data: TaskReq, prompt: str) -> str:
         pass
 
     # ======================================================
@@ -106,27 +355,100 @@ class BasePromptService(ABC):
 
         return prompt
 
+    @staticmethod
+    def prompt_key(data: TaskReq) -> str:
+        """settings.yml 中的 prompt 名，也用作输出结构校验的 key"""
+        return f"{data.type}_{data.subtype}"
+
     # ======================================================
     #                  ⭐ 重试逻辑 ⭐
     # ======================================================
-    def retry_prompt(self, prompt):
-        retries = int(self.settings.llm.retries)
-        retry_delay = int(self.settings.llm.retry_delay)
+    async def retry_prompt(self, prompt, schema: Optional[str] = None, system: Optional[str] = None):
+        """
+        非流式调用：消费 retry_stream，只返回最终结果
+        """
+        result = None
+        async for event, payload in self.retry_stream(prompt, schema, system):
+            if event == "result":
+                result = payload
+        return result
 
-        for attempt in range(1, retries + 1):
-            try:
-                return self.client.prompt(prompt)
-            except Exception as e:
-                logger.error(f"【LLM 调用失败 第 {attempt}/{retries} 次】 {e}")
-                logger.exception("任务失败详情：")
+    async def retry_stream(self, prompt, schema: Optional[str] = None, system: Optional[str] = None):
+        """
+        流式调用 + 重试：逐个产出 ("delta", 文本)、("field", 顶层字段)，最后产出 ("result", 完整结果 JSONText)
+        system 为 split_prompt 拆出的固定前缀（模板原文），prompt 为占位符取值
 
-                if attempt < retries:
-                    asyncio.sleep(retry_delay)
-                    continue
-                else:
-                    raise e
+        - 输出边生成边用 IncrementalJSONParser 校验，偏离 JSON 结构（开头有多余文本、
+          字段非法、缺少 schema 要求的字段）立即中断上游并重试，不等生成结束
+        - 按 llm_retry_policy 重试：指数退避 + jitter，只重试可恢复错误，受重试预算和熔断约束
+        - 已经产出过增量后失败，会先产出 ("reset", ...) 再重试
+        - max_tokens 取 token_budget 按 (prompt 名, 语言) 学到的预算；输出被截断时预算翻倍
+          （最后一次尝试直接用上限）、不退避立即重试
+        """
+        policy = llm_retry_policy
+        attempt = 0
+        max_tokens = token_budget.limit(schema, current_language())
+        with prompt_scope(schema), tracer.span("llm", prompt=schema or "default") as span:
+            labels = llm_labels()
+            while True:
+                attempt += 1
+                span.set(attempts=attempt)
+                probe = policy.before_attempt(attempt)
+                chunks = []
+                parser = IncrementalJSONParser(required_keys(schema) if schema else ())
+                try:
+                    with tracer.span("llm.attempt", attempt=attempt, max_tokens=max_tokens):
+                        async with self.scheduler.slot():
+                            async with aclosing(self.client.stream(prompt, system, max_tokens)) as deltas:
+                                async for delta in deltas:
+                                    chunks.append(delta)
+                                    yield "delta", delta
+                                    for key, value in parser.feed(delta):
+                                        yield "field", {"key": key, "value": value}
+                        parser.close()
+                    policy.on_success()
+                    metrics.llm_calls_total.inc(outcome="ok", **labels)
+                    break
+                except LLMOverloadedError:
+                    # 排队已满被拒绝：不重试、不计入熔断，接口直接返回 429
+                    metrics.llm_calls_total.inc(outcome="rejected", **labels)
+                    raise
+                except Exception as e:
+                    metrics.llm_calls_total.inc(outcome="error", **labels)
+                    if isinstance(e, JSONStreamError):
+                        metrics.llm_json_failures_total.inc(**labels)
+                    delay = policy.on_failure(e, attempt, probe)
+                    if getattr(e, "status_code", None) == 429:
+                        # 上游限流：同一 provider 的其他调用也先停一停
+                        self.scheduler.throttle(retry_after_seconds(e) or delay or policy.base_delay)
+                    logger.error(f"【LLM 调用失败 第 {attempt}/{policy.max_attempts} 次】 {e}")
+                    logger.exception("任务失败详情：")
+                    if isinstance(e, LLMTruncatedError) and delay is not None:
+                        if e.max_tokens >= token_budget.config.max_tokens:
+                            raise e  # 已经是上限，再试也一样
+                        last_attempt = attempt + 1 >= policy.max_attempts
+                        max_tokens, delay = token_budget.grow(e.max_tokens, last_attempt), 0
+                    if delay is None or not self._can_wait(delay):
+                        raise e
+                    metrics.llm_retries_total.inc(**labels)
+                    if chunks:
+                        yield "reset", {"attempt": attempt}
+                    await asyncio.sleep(delay)
+                finally:
+                    # 熔断探测没有成功 / 失败结果就结束（取消、客户端断开、被调度器拒绝）时放开名额，
+                    # 不然熔断器一直停在半开；on_success / on_failure 已处理过的这里什么都不做
+                    policy.release_probe(probe)
+        # 在 span / prompt_scope 之外产出结果：调用方拿到结果后的处理（post_process）不算在 llm 阶段里
+        # 已通过 parser.close() 校验，接口层可以原样拼进响应
+        result = JSONText("".join(chunks))
+        log_completion(logger, result)
+        yield "result", result
 
-        return None
+    @staticmethod
+    def _can_wait(delay: float) -> bool:
+        """退避后是否还在请求截止时间之内"""
+        left = deadline.remaining()
+        return left is None or delay < left
 
     def __del__(self):
         pass
@@ -0,0 +1,424 @@
+# app/services/exercise_bank.py
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from app.config import settings, ExerciseBankConfig
+from app.core import deadline, metrics
+from app.core.paths import cache_dir
+from app.core.tracing import tracer
+from app.llm_client.errors import LLMOverloadedError, LLMUnavailableError
+from app.llm_client.routing_client import is_endpoint_failure
+from app.schemas.task_req import TaskReq
+from app.utils import json_codec
+from app.utils.json_codec import JSONText
+
+logger = logging.getLogger(__name__)
+
+# 匹配范围从窄到宽
+MATCH_LEVELS = ("subtopic", "domain", "type")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS exercises (
+    id INTEGER PRIMARY KEY,
+    task_type TEXT NOT NULL,
+    language TEXT NOT NULL,
+    question_type TEXT NOT NULL DEFAULT '',
+    domain TEXT NOT NULL DEFAULT '',
+    subtopic TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL,
+    content_sha1 TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    served INTEGER NOT NULL DEFAULT 0,
+    last_served_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_exercises_match
+    ON exercises (task_type, language, question_type, domain, subtopic, served);
+CREATE TABLE IF NOT EXISTS exercise_dimensions (
+    exercise_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (exercise_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_exercise_dimensions ON exercise_dimensions (name, value);
+CREATE TRIGGER IF NOT EXISTS exercises_delete_dimensions AFTER DELETE ON exercises BEGIN
+    DELETE FROM exercise_dimensions WHERE exercise_id = old.id;
+END;
+"""
+
+# 全文索引：rowid 与 exercises.id 一致；SQLite 没编译 FTS5 时退回 LIKE
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS exercises_fts USING fts5(text);
+CREATE TRIGGER IF NOT EXISTS exercises_delete_fts AFTER DELETE ON exercises BEGIN
+    DELETE FROM exercises_fts WHERE rowid = old.id;
+END;
+"""
+
+
+# ======================================================
+#          ⭐ 出题属性：pre_process 里选中的子主题 / 随机维度 ⭐
+# ======================================================
+_attributes: ContextVar[Optional[dict]] = ContextVar("exercise_attributes", default=None)
+
+
+@contextmanager
+def exercise_scope():
+    """一次出题的属性收集范围；生成成功后随结果一起入库，取题时按子主题匹配"""
+    attributes: dict[str, Any] = {}
+    token = _attributes.set(attributes)
+    try:
+        yield attributes
+    finally:
+        _attributes.reset(token)
+
+
+def record_attributes(**values) -> None:
+    attributes = _attributes.get()
+    if attributes is not None:
+        attributes.update({key: value for key, value in values.items() if value})
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """provider 慢 / 限流 / 不可用导致的失败：熔断、排队已满、连接失败、5xx、429；输出不合格不算"""
+    return isinstance(error, (LLMUnavailableError, LLMOverloadedError)) or is_endpoint_failure(error)
+
+
+class ExerciseBank:
+    """
+    本地题库（SQLite，cache/exercise_bank.db）
+    - 入库：每次成功生成的 *_start 结果，按 (任务类型, 语言, 题型, 主题, 子主题) 建索引，
+      随机维度单独一张表按 (名称, 取值) 索引，题目文字进 FTS5 全文索引；内容相同的只存一份
+    - 取题：provider 失败 / 生成太慢 / 快要超时时，按 subtopic → domain → type 由窄到宽匹配，
+      同一道题最多复用 max_serves 次，优先用复用次数少的
+    - 同步 sqlite3（WAL，单连接 + 锁）：单次读写在毫秒以内，不值得切线程
+    """
+
+    def __init__(self, config: ExerciseBankConfig, path: Optional[Path] = None):
+        self.config = config
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._fts = False
+        self._lock = threading.Lock()
+        # 已经用题库应答、仍在后台完成的生成任务（持有引用，防止被 GC 回收）
+        self._background: set[asyncio.Task] = set()
+
+    # ======================================================
+    #                    ⭐ 出题入口 ⭐
+    # ======================================================
+    async def generate_or_reuse(self, data: TaskReq, attributes: dict,
+                                generate: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        非流式出题：generate 成功则入库并返回；provider 失败、超过 slow_seconds 或接近截止时间时
+        改用题库里的题。因太慢而改用题库时生成不取消，在后台完成后照样入库
+        """
+        if not self.config.enabled:
+            return await generate()
+
+        async def generate_and_store():
+            result = await generate()
+            self.store(data, attributes, result)
+            return result
+
+        hedge_after = self._hedge_after()
+        if hedge_after is None:
+            try:
+                return await generate_and_store()
+            except Exception as e:
+                return self._fallback_or_raise(data, attributes, e)
+
+        # 生成跑在独立 task 里（继承当前上下文：任务标签、截止时间、trace）
+        task = asyncio.ensure_future(generate_and_store())
+        try:
+            done, _ = await asyncio.wait({task}, timeout=hedge_after)
+            if task not in done:
+                served = self.take(data, attributes, "slow")
+                if served is not None:
+                    self._finish_in_background(task)
+                    return served
+            return await task
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        except Exception as e:
+            return self._fallback_or_raise(data, attributes, e)
+
+    def fallback(self, data: TaskReq, attributes: dict, error: BaseException) -> Optional[JSONText]:
+        """生成失败时可复用的题；不满足复用策略或没有合适的题时返回 None"""
+        if not (self.config.enabled and self.config.reuse.on_failure and is_provider_failure(error)):
+            return None
+        logger.warning(f"出题失败，尝试从题库取题 {data.type}: {error}")
+        return self.take(data, attributes, "failure")
+
+    def _fallback_or_raise(self, data: TaskReq, attributes: dict, error: Exception):
+        served = self.fallback(data, attributes, error)
+        if served is None:
+            raise error
+        return served
+
+    def _hedge_after(self) -> Optional[float]:
+        """等生成多久后改用题库；None 表示一直等"""
+        reuse = self.config.reuse
+        waits = []
+        if reuse.slow_seconds > 0:
+            waits.append(reuse.slow_seconds)
+        left = deadline.remaining()
+        if left is not None and reuse.deadline_margin_seconds > 0:
+            waits.append(max(0.0, left - reuse.deadline_margin_seconds))
+        return min(waits) if waits else None
+
+    def _finish_in_background(self, task: asyncio.Task) -> None:
+        self._background.add(task)
+
+        def done(t: asyncio.Task):
+            self._background.discard(t)
+            if not t.cancelled() and t.exception() is not None:
+                logger.info(f"后台出题失败（请求已用题库应答）: {t.exception()}")
+
+        task.add_done_callback(done)
+
+    # ======================================================
+    #                    ⭐ 入库 / 取题 ⭐
+    # ======================================================
+    def store(self, data: TaskReq, attributes: dict, result: Any) -> Optional[int]:
+        """入库一道成功生成的题，返回 id；重复内容 / 不是 JSON 对象时返回 None"""
+        if not self.config.enabled:
+            return None
+        try:
+            content = self._content(result)
+            parsed = json_codec.loads(content)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"题目不是合法 JSON，未入库 {data.type}: {e}")
+            return None
+        if not isinstance(parsed, dict):
+            return None
+
+        sha1 = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        dimensions = attributes.get("dimensions") or {}
+        with self._lock, tracer.span("exercise_bank.store"):
+            conn = self._connect()
+            if conn is None:
+                return None
+            try:
+                with conn:
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO exercises (task_type, language, question_type, domain, subtopic,"
+                        " content, content_sha1, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (data.type, data.language, _norm(data.question_type), _norm(data.domain),
+                         _norm(attributes.get("subtopic") or data.subdomain), content, sha1, time.time()),
+                    )
+                    if not cursor.rowcount:
+                        return None
+                    exercise_id = cursor.lastrowid
+                    conn.executemany(
+                        "INSERT INTO exercise_dimensions (exercise_id, name, value) VALUES (?, ?, ?)",
+                        [(exercise_id, name, str(value)) for name, value in dimensions.items()],
+                    )
+                    if self._fts:
+                        text = " ".join(_strings(parsed))
+                        conn.execute("INSERT INTO exercises_fts (rowid, text) VALUES (?, ?)", (exercise_id, text))
+                    # 只保留最新的 max_entries 道题（触发器同时清理维度表和全文索引）
+                    conn.execute(
+                        "DELETE FROM exercises WHERE id IN"
+                        " (SELECT id FROM exercises ORDER BY id DESC LIMIT -1 OFFSET ?)",
+                        (self.config.max_entries,),
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"题库写入失败: {e}")
+                return None
+        metrics.exercise_bank_stored_total.inc(task_type=data.type)
+        return exercise_id
+
+    def take(self, data: TaskReq, attributes: dict, reason: str,
+             accept: Optional[Callable[[str], bool]] = None, attempts: int = 1) -> Optional[JSONText]:
+        """
+        按复用策略取一道题并记一次复用；没有合适的题返回 None
+        accept 为额外的筛选（如近重复检测），每个匹配范围最多看 attempts 道候选
+        """
+        reuse = self.config.reuse
+        subtopic = _norm(attributes.get("subtopic") or data.subdomain)
+        widest = MATCH_LEVELS.index(reuse.match) if reuse.match in MATCH_LEVELS else 1
+        with self._lock, tracer.span("exercise_bank.take", reason=reason) as span:
+            conn = self._connect()
+            row = None
+            try:
+                for level in MATCH_LEVELS[:widest + 1]:
+                    if level == "subtopic" and not subtopic:
+                        continue
+                    rows = self._match(conn, data, level, subtopic, attempts) if conn is not None else []
+                    row = next((r for r in rows if accept is None or accept(r[1])), None)
+                    if row is not None:
+                        span.set(match=level)
+                        conn.execute("UPDATE exercises SET served = served + 1, last_served_at = ? WHERE id = ?",
+                                     (time.time(), row[0]))
+                        conn.commit()
+                        break
+            except sqlite3.Error as e:
+                logger.warning(f"题库读取失败: {e}")
+                row = None
+        if row is None:
+            metrics.exercise_bank_misses_total.inc(task_type=data.type, reason=reason)
+            return None
+        metrics.exercise_bank_served_total.inc(task_type=data.type, reason=reason)
+        logger.info(f"从题库取题 {data.type} #{row[0]}（{reason}）")
+        return JSONText(row[1])
+
+    def _match(self, conn: sqlite3.Connection, data: TaskReq, level: str, subtopic: str, limit: int) -> list:
+        sql = ("SELECT id, content FROM exercises WHERE task_type = ? AND language = ? AND question_type = ?"
+               " AND served < ?")
+        params: list = [data.type, data.language, _norm(data.question_type), self.config.reuse.max_serves]
+        if level in ("subtopic", "domain"):
+            sql += " AND domain = ?"
+            params.append(_norm(data.domain))
+        if level == "subtopic":
+            sql += " AND subtopic = ?"
+            params.append(subtopic)
+        return conn.execute(sql + " ORDER BY served, random() LIMIT ?", params + [limit]).fetchall()
+
+    # ======================================================
+    #                  ⭐ 检索 / 统计 ⭐
+    # ======================================================
+    def search(self, query: Optional[str] = None, task_type: Optional[str] = None,
+               language: Optional[str] = None, domain: Optional[str] = None,
+               dimensions: Optional[dict[str, str]] = None, limit: int = 20) -> list[dict]:
+        """按全文 + 索引字段检索题目；有 query 时按相关度排序，否则新的在前"""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return []
+            sql, params = self._search_sql(query, task_type, language, domain, dimensions)
+            rows = conn.execute(sql, params + [limit]).fetchall()
+            dims = self._dimensions(conn, [row[0] for row in rows])
+        columns = ("id", "type", "language", "question_type", "domain", "subtopic", "served", "created_at", "snippet")
+        return [{**dict(zip(columns, row)), "dimensions": dims.get(row[0], {})} for row in rows]
+
+    def _search_sql(self, query, task_type, language, domain, dimensions) -> tuple[str, list]:
+        where, params = [], []
+        for column, value in (("task_type", task_type), ("language", language), ("domain", _norm(domain))):
+            if value:
+                where.append(f"e.{column} = ?")
+                params.append(value)
+        for name, value in (dimensions or {}).items():
+            where.append("EXISTS (SELECT 1 FROM exercise_dimensions d"
+                         " WHERE d.exercise_id = e.id AND d.name = ? AND d.value = ?)")
+            params += [name, value]
+
+        # 只有空白的检索词当作没有（MATCH '' 是 FTS5 语法错误）
+        query = (query or "").strip()
+        join, order, snippet = "", "e.id DESC", "substr(e.content, 1, 120)"
+        terms = _fts_query(query)
+        if terms and self._fts:
+            join = "JOIN exercises_fts f ON f.rowid = e.id"
+            where.append("exercises_fts MATCH ?")
+            params.append(terms)
+            order, snippet = "bm25(exercises_fts)", "snippet(exercises_fts, 0, '[', ']', '...', 12)"
+        elif query:
+            where.append("e.content LIKE ?")
+            params.append(f"%{query}%")
+
+        sql = (f"SELECT e.id, e.task_type, e.language, e.question_type, e.domain, e.subtopic, e.served,"
+               f" e.created_at, {snippet} FROM exercises e {join}"
+               f" {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY {order} LIMIT ?")
+        return sql, params
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return {"enabled": self.config.enabled, "entries": 0, "by_type": []}
+            rows = conn.execute(
+                "SELECT task_type, language, count(*), sum(served), sum(served >= ?) FROM exercises"
+                " GROUP BY task_type, language ORDER BY task_type, language",
+                (self.config.reuse.max_serves,),
+            ).fetchall()
+        return {
+            "enabled": self.config.enabled,
+            "fts": self._fts,
+            "entries": sum(row[2] for row in rows),
+            "background_generations": len(self._background),
+            "by_type": [{"type": t, "language": lang, "entries": n, "served": served, "exhausted": exhausted}
+                        for t, lang, n, served, exhausted in rows],
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ======================================================
+    #                    ⭐ 连接 ⭐
+    # ======================================================
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """第一次用到时才打开数据库；打不开返回 None（题库不可用不影响出题）"""
+        if self._conn is not None or not self.path:
+            return self._conn
+        try:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            logger.warning(f"题库打开失败，本次运行不使用题库: {self.path} {e}")
+            self.path = None
+            return None
+        try:
+            conn.executescript(_FTS_SCHEMA)
+            self._fts = True
+        except sqlite3.OperationalError as e:
+            logger.info(f"SQLite 不支持 FTS5，题库检索退回 LIKE: {e}")
+        self._conn = conn
+        return conn
+
+    @staticmethod
+    def _dimensions(conn: sqlite3.Connection, ids: list[int]) -> dict[int, dict]:
+        if not ids:
+            return {}
+        rows = conn.execute(
+            f"SELECT exercise_id, name, value FROM exercise_dimensions"
+            f" WHERE exercise_id IN ({','.join('?' * len(ids))})", ids,
+        ).fetchall()
+        result: dict[int, dict] = {}
+        for exercise_id, name, value in rows:
+            result.setdefault(exercise_id, {})[name] = value
+        return result
+
+    @staticmethod
+    def _content(result: Any) -> str:
+        if isinstance(result, JSONText):
+            return str(result)
+        if isinstance(result, str):
+            json_codec.loads(result)  # post_process 改写过的文本先确认仍是 JSON
+            return result
+        return json_codec.dumps(result)
+
+
+def _norm(value: Optional[str]) -> str:
+    return (value or "").strip().lower()
+
+
+def _strings(value: Any):
+    """JSON 中所有字符串（全文索引的内容，不含 key）"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def _fts_query(query: str) -> str:
+    """用户输入按空白切成短语逐个加引号，避免 FTS5 语法错误（AND / 引号 / 括号）"""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+# 单例（全局可用）
+exercise_bank = ExerciseBank(settings.exercise_bank, cache_dir() / "exercise_bank.db")
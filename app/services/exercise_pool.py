@@ -0,0 +1,193 @@
+# app/services/exercise_pool.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Optional
+
+from app.config import settings, ExercisePoolConfig
+from app.core import metrics
+from app.core.deadline import deadline_scope
+from app.llm_client.scheduler import Priority, priority_scope
+from app.schemas.task_req import TaskReq
+from app.services.task_service_factory import get_prompt_service
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSlot:
+    """一个 key 的预生成队列"""
+
+    def __init__(self, data: TaskReq):
+        # 补充时用的请求（只保留出题相关字段）
+        self.data = data
+        # (生成完成时间, 结果)
+        self.ready: deque[tuple[float, Any]] = deque()
+        # 空位出现的时间，补上一道题时取最早的一个算 refill lag
+        self.opened: deque[float] = deque()
+        self.refilling = 0
+        self.last_used = time.time()
+        self.last_lag: Optional[float] = None
+
+    def need(self, watermark: int) -> int:
+        return watermark - len(self.ready) - self.refilling
+
+
+class ExercisePool:
+    """
+    出题预生成池，key 为 (任务类型, 语言, 主题, 题型)
+    - 登记：某个 key 第一次出题时登记（本次照常生成），之后后台把它补到 watermark 道
+    - 取题：start / start_stream 先从池里取，取到直接返回，同时唤醒后台补充
+    - 补充：concurrency 个后台 worker，以 BACKGROUND 优先级调用各任务 service 的 pregenerate，
+      优先补缺得多、最近有人取题的 key；超过 idle_seconds 没人取题的 key 不再补充
+    - 指标：池深度（按任务类型 + 语言）、refill lag（空位出现到补上的时间，包含失败重试）
+    只在一个事件循环内使用（uvicorn 单进程单循环）
+    """
+
+    def __init__(self, config: ExercisePoolConfig):
+        self.config = config
+        self._slots: dict[str, PoolSlot] = {}
+        self._workers: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._reported: set[tuple[str, str]] = set()
+
+    @staticmethod
+    def make_key(data: TaskReq) -> str:
+        domain = (data.domain or "").strip().lower()
+        question_type = (data.question_type or "").strip().lower()
+        return f"{data.type}:{data.language}:{domain}:{question_type}"
+
+    # ======================================================
+    #                    ⭐ public API ⭐
+    # ======================================================
+    def start(self) -> None:
+        """lifespan 启动时调用；未启用时什么都不做"""
+        if not self.config.enabled or self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._worker(), name=f"exercise-pool-{i}")
+                         for i in range(max(1, self.config.concurrency))]
+        logger.info(f"出题预生成池已启动：watermark={self.config.watermark} concurrency={len(self._workers)}")
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def take(self, data: TaskReq) -> Optional[Any]:
+        """取一道预生成的题；池未运行 / 不是出题请求 / 池里没有时返回 None（第一次遇到的 key 在这里登记）"""
+        if not self._workers or data.subtype != "start":
+            return None
+        key = self.make_key(data)
+        now = time.time()
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._register(key, data, now)
+        slot.last_used = now
+
+        result = None
+        while slot.ready and result is None:
+            created_at, candidate = slot.ready.popleft()
+            slot.opened.append(now)
+            if now - created_at <= self.config.max_age_seconds:
+                result = candidate
+        metrics.exercise_pool_requests_total.inc(task_type=data.type, outcome="miss" if result is None else "hit")
+        self._update_depth()
+        # 下一轮事件循环再唤醒：让本次请求先发起自己的调用（如同 domain 的子主题生成，会被补充任务合并复用），
+        # 不然补充任务先发起，请求就要等一个后台优先级的调用
+        asyncio.get_running_loop().call_soon(self._wakeup.set)
+        return result
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        return {
+            "enabled": self.config.enabled,
+            "running": bool(self._workers),
+            "watermark": self.config.watermark,
+            "keys": [
+                {
+                    "key": key,
+                    "depth": len(slot.ready),
+                    "refilling": slot.refilling,
+                    "oldest_open_s": round(now - slot.opened[0], 1) if slot.opened else None,
+                    "last_lag_s": round(slot.last_lag, 1) if slot.last_lag is not None else None,
+                    "idle_s": round(now - slot.last_used, 1),
+                }
+                for key, slot in self._slots.items()
+            ],
+        }
+
+    # ======================================================
+    #                  ⭐ 登记 / 后台补充 ⭐
+    # ======================================================
+    def _register(self, key: str, data: TaskReq, now: float) -> PoolSlot:
+        if len(self._slots) >= self.config.max_keys:
+            oldest = min(self._slots, key=lambda k: self._slots[k].last_used)
+            del self._slots[oldest]
+        slot = PoolSlot(TaskReq(type=data.type, subtype="start", language=data.language,
+                                domain=data.domain, question_type=data.question_type))
+        slot.opened.extend([now] * self.config.watermark)
+        self._slots[key] = slot
+        return slot
+
+    def _next_slot(self) -> Optional[PoolSlot]:
+        """缺得最多的 key，同样多时最近有人取题的优先；没有要补的返回 None"""
+        now = time.time()
+        candidates = [slot for slot in self._slots.values()
+                      if slot.need(self.config.watermark) > 0 and now - slot.last_used <= self.config.idle_seconds]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda s: (s.need(self.config.watermark), s.last_used))
+
+    async def _worker(self) -> None:
+        while True:
+            slot = self._next_slot()
+            if slot is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            task_type = slot.data.type
+            slot.refilling += 1
+            try:
+                result = await self._generate(slot.data)
+            except Exception as e:
+                metrics.exercise_pool_refill_failures_total.inc(task_type=task_type)
+                logger.warning(f"预生成失败 {task_type}，{self.config.failure_backoff_seconds}s 后继续: {e}")
+                await asyncio.sleep(self.config.failure_backoff_seconds)
+                continue
+            else:
+                now = time.time()
+                slot.ready.append((now, result))
+                if slot.opened:
+                    slot.last_lag = now - slot.opened.popleft()
+                    metrics.exercise_pool_refill_lag_seconds.observe(slot.last_lag, task_type=task_type)
+                self._update_depth()
+            finally:
+                slot.refilling -= 1
+
+    @staticmethod
+    async def _generate(data: TaskReq) -> Any:
+        """后台优先级 + 任务类型的超时时间；生成逻辑走各任务 service 的 pregenerate"""
+        timeout = settings.llm.timeouts.for_task(data.type)
+        with priority_scope(Priority.BACKGROUND), deadline_scope(timeout):
+            async with asyncio.timeout(timeout):
+                return await get_prompt_service(data.type).pregenerate(data)
+
+    def _update_depth(self) -> None:
+        depth: dict[tuple[str, str], int] = {}
+        for slot in self._slots.values():
+            labels = (slot.data.type, slot.data.language)
+            depth[labels] = depth.get(labels, 0) + len(slot.ready)
+        # 被淘汰的 key 对应的 label 归零
+        for labels in self._reported - depth.keys():
+            depth[labels] = 0
+        self._reported = set(depth)
+        for (task_type, language), count in depth.items():
+            metrics.exercise_pool_depth.set(count, task_type=task_type, language=language)
+
+
+# 单例（全局可用）
+exercise_pool = ExercisePool(settings.exercise_pool)
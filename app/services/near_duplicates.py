@@ -0,0 +1,273 @@
+# app/services/near_duplicates.py
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from app.config import settings, NearDuplicateConfig
+from app.core.paths import cache_dir
+
+logger = logging.getLogger(__name__)
+
+# MinHash 签名：128 个桶（one permutation hashing，每个 shingle 只算一次 hash），
+# LSH 分 32 段 × 4 行：Jaccard 0.6 时被召回的概率约 99%，0.3 时约 23%，召回后再按签名精确估计
+NUM_BINS = 128
+ROWS = 4
+BANDS = NUM_BINS // ROWS
+SHINGLE = 3
+# 每多少次新增落一次盘
+SAVE_EVERY = 20
+DEFAULT_CLIENT = "local"
+
+_WORD = re.compile(r"[a-z0-9']+")
+_MASK = (1 << 64) - 1
+_EMPTY = _MASK
+
+
+def _mix(h: int) -> int:
+    """splitmix64 finalizer：组合后的 hash 重新打散，低位也均匀（分桶用低 7 位）"""
+    h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & _MASK
+    return h ^ (h >> 31)
+
+
+def _word_hash(word: str) -> int:
+    # 不用内置 hash()：每个进程的字符串 hash 种子不同，持久化的签名重启后就对不上了
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def signature(text: str, min_words: int = 0) -> Optional[array]:
+    """
+    文本的 MinHash 签名：小写单词的 3-gram 集合，one permutation hashing + 旋转补齐空桶
+    单词数不足 min_words（或不足一个 3-gram）时返回 None
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < max(min_words, SHINGLE):
+        return None
+    cache: dict[str, int] = {}
+    hashes = [cache[w] if w in cache else cache.setdefault(w, _word_hash(w)) for w in words]
+
+    bins = [_EMPTY] * NUM_BINS
+    for i in range(len(hashes) - SHINGLE + 1):
+        h = _mix((hashes[i] * 0x9E3779B97F4A7C15 + hashes[i + 1] * 0xC2B2AE3D27D4EB4F + hashes[i + 2]) & _MASK)
+        b = h & (NUM_BINS - 1)
+        value = h >> 7
+        if value < bins[b]:
+            bins[b] = value
+
+    # 空桶取右边第一个非空桶的值 + 距离偏移（Shrivastava & Li 2014）；两段文本同一位置补齐的值
+    # 只有在来源桶相同、距离相同时才相等，不会凭空抬高相似度
+    if _EMPTY in bins:
+        filled = [i for i, v in enumerate(bins) if v != _EMPTY]
+        for i in range(NUM_BINS):
+            if bins[i] == _EMPTY:
+                distance = next(((j - i) % NUM_BINS for j in filled if j > i), None)
+                if distance is None:
+                    distance = filled[0] + NUM_BINS - i
+                bins[i] = (bins[(i + distance) % NUM_BINS] + distance * 0x9E3779B97F4A7C15) & _MASK
+    return array("Q", bins)
+
+
+def similarity(a: array, b: array) -> float:
+    """两个签名估计的 Jaccard 相似度"""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_BINS
+
+
+def _band_keys(sig: array) -> Iterable[tuple]:
+    for band in range(BANDS):
+        start = band * ROWS
+        yield band, tuple(sig[start:start + ROWS])
+
+
+class _ClientIndex:
+    """一个客户端看过的题目：签名按加入顺序保存（超出上限淘汰最早的），LSH 桶 → 签名 id"""
+
+    def __init__(self):
+        self.signatures: "OrderedDict[int, tuple[float, array]]" = OrderedDict()
+        self.buckets: dict[tuple, set[int]] = {}
+        self.next_id = 0
+
+    def add(self, sig: array, created_at: float, max_entries: int) -> None:
+        entry_id = self.next_id
+        self.next_id += 1
+        self.signatures[entry_id] = (created_at, sig)
+        for key in _band_keys(sig):
+            self.buckets.setdefault(key, set()).add(entry_id)
+        while len(self.signatures) > max_entries:
+            old_id, (_, old_sig) = self.signatures.popitem(last=False)
+            for key in _band_keys(old_sig):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del self.buckets[key]
+
+    def best_match(self, sig: array) -> float:
+        candidates = set()
+        for key in _band_keys(sig):
+            candidates |= self.buckets.get(key, set())
+        return max((similarity(sig, self.signatures[i][1]) for i in candidates), default=0.0)
+
+
+class NearDuplicateIndex:
+    """
+    近重复检测：按客户端记录已经返回过的文章 / 篇章的 MinHash 签名，
+    新题目与其中任意一篇的估计 Jaccard ≥ threshold 即视为重复
+    - 内存：每个客户端一个 LSH 索引，查询只比对同桶的候选，微秒级
+    - 客户端：最多 max_clients 个，按最近一次出题 LRU 淘汰（client_id 来自请求，不能无限增长）
+    - 磁盘：cache/near_duplicates.json，每新增 SAVE_EVERY 条在后台线程落一次盘（不阻塞事件循环），退出时 flush
+    - 文本取自结果的 fields 字段（字符串、字符串列表、按段落字母的 dict 都可以）
+    """
+
+    def __init__(self, config: NearDuplicateConfig, path: Optional[Path] = None):
+        self.config = config
+        self.path = path
+        # 按最近使用排序，最久没用的在前
+        self._clients: "OrderedDict[str, _ClientIndex]" = OrderedDict()
+        self._loaded = False
+        self._unsaved = 0
+        self._saving = False
+        self._save_task: Optional[asyncio.Future] = None
+        self._lock = threading.Lock()
+        # 后台落盘和退出时的 flush 不同时写文件
+        self._write_lock = threading.Lock()
+
+    # ======================================================
+    #                    ⭐ public API ⭐
+    # ======================================================
+    def signature_of(self, result: Any) -> Optional[array]:
+        """从任务结果（JSON 文本或 dict）里取出文章文字并计算签名；没有可比较的文字时返回 None"""
+        if isinstance(result, str):
+            try:
+                result = json.loads(result)
+            except ValueError:
+                return None
+        if not isinstance(result, dict):
+            return None
+        text = " ".join(_texts(result.get(field) for field in self.config.fields))
+        return signature(text, self.config.min_words)
+
+    def is_repeat(self, client_id: Optional[str], sig: Optional[array]) -> bool:
+        if sig is None:
+            return False
+        return self.best_match(client_id, sig) >= self.config.threshold
+
+    def best_match(self, client_id: Optional[str], sig: array) -> float:
+        with self._lock:
+            self._load()
+            client = client_id or DEFAULT_CLIENT
+            index = self._clients.get(client)
+            if index is None:
+                return 0.0
+            self._clients.move_to_end(client)
+            return index.best_match(sig)
+
+    def add(self, client_id: Optional[str], sig: Optional[array]) -> None:
+        if sig is None:
+            return
+        with self._lock:
+            self._load()
+            self._client(client_id or DEFAULT_CLIENT).add(sig, time.time(), self.config.max_entries_per_client)
+            self._unsaved += 1
+            due = self._unsaved >= SAVE_EVERY and not self._saving
+            if due:
+                self._saving = True
+        if due:
+            self._schedule_save()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._load()
+            return {client: len(index.signatures) for client, index in self._clients.items()}
+
+    def flush(self) -> None:
+        with self._lock:
+            dirty = self._unsaved > 0
+        if dirty:
+            self._save()
+
+    def _client(self, client: str) -> _ClientIndex:
+        """取（没有则新建）客户端的索引并标记为最近使用；超过 max_clients 时淘汰最久没用的"""
+        index = self._clients.get(client)
+        if index is None:
+            index = self._clients[client] = _ClientIndex()
+            while len(self._clients) > max(1, self.config.max_clients):
+                self._clients.popitem(last=False)
+        self._clients.move_to_end(client)
+        return index
+
+    # ======================================================
+    #                    ⭐ 持久化 ⭐
+    # ======================================================
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            for client, entries in data.items():
+                index = self._client(client)
+                for created_at, encoded in entries:
+                    sig = array("Q")
+                    sig.frombytes(base64.b64decode(encoded))
+                    if len(sig) == NUM_BINS:
+                        index.add(sig, created_at, self.config.max_entries_per_client)
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"近重复索引文件损坏，已忽略: {self.path} {e}")
+
+    def _schedule_save(self) -> None:
+        """在事件循环里时交给线程池落盘；不在（脚本等）直接写"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._save()
+            return
+        self._save_task = loop.run_in_executor(None, self._save)
+
+    def _save(self) -> None:
+        # 加锁只复制引用（签名加入后不再修改），编码和写文件在锁外
+        with self._lock:
+            self._unsaved = 0
+            entries = {client: list(index.signatures.values()) for client, index in self._clients.items()}
+        try:
+            if not self.path:
+                return
+            data = {
+                client: [[created_at, base64.b64encode(sig.tobytes()).decode("ascii")] for created_at, sig in items]
+                for client, items in entries.items()
+            }
+            text = json.dumps(data)
+            tmp_path = self.path.with_suffix(".tmp")
+            with self._write_lock:
+                tmp_path.write_text(text, encoding="utf-8")
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"近重复索引写入失败: {e}")
+        finally:
+            with self._lock:
+                self._saving = False
+
+
+def _texts(values: Iterable[Any]) -> Iterable[str]:
+    for value in values:
+        if isinstance(value, str):
+            yield value
+        elif isinstance(value, dict):
+            yield from _texts(value.values())
+        elif isinstance(value, list):
+            yield from _texts(value)
+
+
+# 单例（全局可用）
+near_duplicates = NearDuplicateIndex(settings.near_duplicates, cache_dir() / "near_duplicates.json")
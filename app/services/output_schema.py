@@ -0,0 +1,13 @@
+# app/services/output_schema.py
+from app.schemas.task_result import TASK_RESULTS
+
+# 各 prompt 输出 JSON 的必需顶层字段，key 为 "{type}_{subtype}"（与 settings.yml 的 prompt 名一致）
+# 由 app/schemas/task_result.py 中的类型化结构导出；未登记的只校验输出是一个完整的 JSON 对象
+REQUIRED_TOP_LEVEL_KEYS: dict[str, tuple[str, ...]] = {
+    key: tuple(name for name, field in model.model_fields.items() if field.is_required())
+    for key, model in TASK_RESULTS.items()
+}
+
+
+def required_keys(prompt_key: str) -> tuple[str, ...]:
+    return REQUIRED_TOP_LEVEL_KEYS.get(prompt_key, ())
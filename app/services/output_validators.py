@@ -0,0 +1,255 @@
+# app/services/output_validators.py
+import math
+import re
+from typing import Any, Callable, NamedTuple
+
+# 各出题 prompt 的结构规则（字数、标记 / 字段一致性、题目数量、选项结构）的本地校验，纯计算、微秒级
+# 字数范围取自 settings.yml 的 prompt；中英文 prompt 不一致时取较宽的范围
+
+_WORD = re.compile(r"[A-Za-z0-9]+(?:['’-][A-Za-z0-9]+)*")
+_MARKER = re.compile(r"\[([A-Z])\]")
+_PLACEHOLDER = re.compile(r"\[\s*\]|_{3,}")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_LOWER_WORD = re.compile(r"[a-z]+(?:-[a-z]+)*")
+TFNG_ANSWERS = {"TRUE", "FALSE", "NOT GIVEN"}
+CHART_TYPES = {"bar", "line", "pie", "table", "process"}
+
+
+class Violation(NamedTuple):
+    # 修复时需要重新生成的顶层字段（互相依赖的字段一起，如文章 + 标记）
+    fields: tuple[str, ...]
+    # 给 LLM 看的问题描述（英文，和文章语言一致）
+    message: str
+
+
+def count_words(text: str) -> int:
+    return len(_WORD.findall(text))
+
+
+class _Checks:
+    """收集一次校验的所有问题；字数范围上下各放宽 tolerance"""
+
+    def __init__(self, tolerance: float):
+        self.tolerance = tolerance
+        self.violations: list[Violation] = []
+
+    def fail(self, fields: tuple[str, ...], message: str) -> None:
+        self.violations.append(Violation(fields, message))
+
+    def require(self, condition: bool, fields: tuple[str, ...], message: str) -> bool:
+        if not condition:
+            self.fail(fields, message)
+        return condition
+
+    def word_count(self, text: Any, low: int, high: int, fields: tuple[str, ...], name: str) -> None:
+        if not self.require(isinstance(text, str) and text.strip() != "", fields, f"{name} is missing or empty"):
+            return
+        n = count_words(text)
+        if not math.floor(low * (1 - self.tolerance)) <= n <= math.ceil(high * (1 + self.tolerance)):
+            self.fail(fields, f"{name} has {n} words; it must have {low}-{high} words")
+
+    def items(self, value: Any, low: int, high: int, fields: tuple[str, ...], name: str) -> list:
+        """列表字段：不是列表或数量不对都记一条，返回其中的 dict 项（继续逐项检查）"""
+        if not self.require(isinstance(value, list), fields, f"{name} must be a list"):
+            return []
+        self.require(low <= len(value) <= high, fields,
+                     f"{name} has {len(value)} items; it must have {low}-{high}" if low != high
+                     else f"{name} has {len(value)} items; it must have exactly {low}")
+        items = [item for item in value if isinstance(item, dict)]
+        self.require(len(items) == len(value), fields, f"every item of {name} must be an object")
+        return items
+
+
+# ======================================================
+#                  ⭐ 各任务的规则 ⭐
+# ======================================================
+def _synonym_start(result: dict, checks: _Checks) -> None:
+    both = ("article", "markers")
+    article = result.get("article")
+    checks.word_count(article, 150, 300, both, "article")
+    markers = result.get("markers")
+    if not isinstance(article, str) or not checks.require(isinstance(markers, dict), both, "markers must be an object"):
+        return
+
+    found = _MARKER.findall(article)
+    checks.require(5 <= len(found) <= 8, both, f"article contains {len(found)} markers; it must contain 5-8")
+    checks.require(len(found) == len(set(found)), both, "each marker must appear exactly once in article")
+    expected = [chr(ord("A") + i) for i in range(len(set(found)))]
+    checks.require(sorted(set(found)) == expected, both, f"markers must be consecutive letters from [A], got {found}")
+    checks.require(set(found) == set(markers), both,
+                   f"markers keys {sorted(markers)} must match the markers in article {sorted(set(found))}")
+    bad = [key for key, word in markers.items() if not isinstance(word, str) or not _LOWER_WORD.fullmatch(word)]
+    checks.require(not bad, ("markers",), f"markers {bad} must be a single lowercase English word without punctuation")
+
+
+def _sentence_start(result: dict, checks: _Checks) -> None:
+    sentence = result.get("sentence")
+    if checks.require(isinstance(sentence, str) and sentence.strip() != "", ("sentence", "examples"),
+                      "sentence is missing or empty"):
+        n = count_words(sentence)
+        checks.require(n < 50, ("sentence", "examples"), f"sentence has {n} words; it must be under 50 words")
+    examples = result.get("examples")
+    if checks.require(isinstance(examples, list), ("examples",), "examples must be a list"):
+        checks.require(len(examples) == 3, ("examples",), f"examples has {len(examples)} items; it must have exactly 3")
+        checks.require(all(isinstance(e, str) and e.strip() for e in examples), ("examples",),
+                       "every example must be a non-empty sentence")
+
+
+def _tfng(items: list, answer_key: str, fields: tuple[str, ...], checks: _Checks, name: str) -> list[str]:
+    answers = [str(item.get(answer_key, "")).strip().upper() for item in items]
+    checks.require(all(a in TFNG_ANSWERS for a in answers), fields,
+                   f"every {name}.{answer_key} must be TRUE, FALSE or NOT GIVEN")
+    checks.require(all(isinstance(item.get("statement"), str) and item["statement"].strip() for item in items), fields,
+                   f"every {name} item needs a non-empty statement")
+    return answers
+
+
+def _reading1_start(result: dict, checks: _Checks) -> None:
+    passage = result.get("passage")
+    checks.word_count(passage, 450, 550, ("passage",), "passage")
+    if isinstance(passage, str):
+        checks.require(not _PLACEHOLDER.search(passage), ("passage",), "passage must not contain [] or ____ blanks")
+
+    questions = result.get("questions")
+    if not checks.require(isinstance(questions, dict), ("questions",), "questions must be an object"):
+        return
+    blanks = checks.items(questions.get("fill_in_the_blanks"), 4, 6, ("questions",), "fill_in_the_blanks")
+    text = passage.lower() if isinstance(passage, str) else ""
+    # 答案按题号依次出现：每个答案从上一个答案的位置往后找（同一个词在前文出现过也不算乱序）
+    position = 0
+    for item in blanks:
+        qid, stem, answer = item.get("id"), str(item.get("question", "")), str(item.get("answer", "")).strip()
+        checks.require("[]" in stem, ("questions",), f"fill_in_the_blanks {qid}: question must mark the blank with []")
+        if not checks.require(len(_WORD.findall(answer)) == 1, ("questions",),
+                              f"fill_in_the_blanks {qid}: answer must be exactly one word, got {answer!r}"):
+            continue
+        pattern = re.compile(rf"(?<![A-Za-z0-9]){re.escape(answer.lower())}(?![A-Za-z0-9])")
+        checks.require(not pattern.search(stem.lower()), ("questions",),
+                       f"fill_in_the_blanks {qid}: the answer must not appear in the question")
+        if not text or not checks.require(pattern.search(text) is not None, ("questions",),
+                                          f"fill_in_the_blanks {qid}: answer {answer!r} does not appear in passage"):
+            continue
+        match = pattern.search(text, position)
+        if checks.require(match is not None, ("questions",),
+                          f"fill_in_the_blanks {qid}: answer {answer!r} must appear in passage after the previous "
+                          f"answer (answers follow question order)"):
+            position = match.end()
+
+    tfng = checks.items(questions.get("true_false_not_given"), 3, 3, ("questions",), "true_false_not_given")
+    answers = _tfng(tfng, "answer", ("questions",), checks, "true_false_not_given")
+    checks.require(len(tfng) != 3 or set(answers) == TFNG_ANSWERS, ("questions",),
+                   "true_false_not_given must have one TRUE, one FALSE and one NOT GIVEN")
+
+
+def _reading2_start(result: dict, checks: _Checks) -> None:
+    passage = result.get("passage")
+    if not checks.require(isinstance(passage, dict) and passage, ("passage", "questions"),
+                          "passage must be an object of paragraphs keyed A, B, C ..."):
+        return
+    letters = list(passage)
+    checks.require(6 <= len(letters) <= 7 and letters == [chr(ord("A") + i) for i in range(len(letters))],
+                   ("passage", "questions"), f"passage must have 6-7 paragraphs labelled A-F or A-G, got {letters}")
+    for letter, paragraph in passage.items():
+        checks.word_count(paragraph, 80, 150, ("passage",), f"paragraph {letter}")
+    checks.word_count(" ".join(p for p in passage.values() if isinstance(p, str)), 500, 800, ("passage",), "passage")
+
+    questions = result.get("questions")
+    if not checks.require(isinstance(questions, dict), ("questions",), "questions must be an object"):
+        return
+    items = checks.items(questions.get("matching_information"), 1, 10, ("questions",), "matching_information")
+    answers = [str(item.get("answer", "")).strip().upper() for item in items]
+    checks.require(all(a in passage for a in answers), ("questions",),
+                   f"every matching_information answer must be one of the paragraph letters {letters}")
+    crowded = sorted({a for a in answers if answers.count(a) > 3})
+    checks.require(not crowded, ("questions",), f"no more than 3 questions may match the same paragraph: {crowded}")
+
+
+def _reading3_start(result: dict, checks: _Checks) -> None:
+    passage = result.get("passage")
+    checks.word_count(passage, 600, 900, ("passage",), "passage")
+    if isinstance(passage, str):
+        paragraphs = [p for p in _PARAGRAPH_BREAK.split(passage.strip()) if p.strip()]
+        checks.require(6 <= len(paragraphs) <= 8, ("passage",),
+                       f"passage has {len(paragraphs)} paragraphs; it must have 6-8 separated by blank lines")
+        checks.require(not _PLACEHOLDER.search(passage), ("passage",), "passage must not contain [] or ____ blanks")
+
+    mcq = result.get("mcq")
+    if checks.require(isinstance(mcq, dict), ("mcq",), "mcq must be an object with a questions list"):
+        for item in checks.items(mcq.get("questions"), 3, 5, ("mcq",), "mcq.questions"):
+            qid, options = item.get("id"), item.get("options")
+            if not checks.require(isinstance(options, dict) and sorted(options) == list("ABCD")
+                                  and all(isinstance(o, str) and o.strip() for o in options.values()),
+                                  ("mcq",), f"mcq {qid}: options must be non-empty A, B, C and D"):
+                continue
+            checks.require(str(item.get("correct_answer", "")).strip().upper() in options, ("mcq",),
+                           f"mcq {qid}: correct_answer must be one of A/B/C/D")
+
+    tfng = checks.items(result.get("true_false_not_given"), 4, 6, ("true_false_not_given",), "true_false_not_given")
+    _tfng(tfng, "correct_answer", ("true_false_not_given",), checks, "true_false_not_given")
+
+
+def _number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _writing1_start(result: dict, checks: _Checks) -> None:
+    chart_type = result.get("type")
+    content = result.get("content")
+    if not checks.require(chart_type in CHART_TYPES, ("type", "content"),
+                          f"type must be one of {sorted(CHART_TYPES)}, got {chart_type!r}"):
+        return
+    if not checks.require(isinstance(content, dict), ("content",), "content must be an object"):
+        return
+
+    if chart_type in ("bar", "line", "table"):
+        labels, series = content.get("labels"), content.get("series")
+        checks.require(isinstance(labels, list) and len(labels) >= 3, ("content",),
+                       "content.labels must list at least 3 time points or categories")
+        if checks.require(isinstance(series, dict) and len(series) >= 3, ("content",),
+                          "content.series must have at least 3 items"):
+            size = len(labels) if isinstance(labels, list) else None
+            bad = [name for name, values in series.items()
+                   if not isinstance(values, list) or len(values) != size or not all(_number(v) for v in values)]
+            checks.require(not bad, ("content",), f"content.series {bad} must be lists of numbers, one per label")
+    elif chart_type == "pie":
+        slices = content.get("slices")
+        checks.require(isinstance(slices, dict) and len(slices) >= 3 and all(_number(v) for v in slices.values()),
+                       ("content",), "content.slices must map at least 3 items to numbers")
+    else:
+        steps = content.get("steps")
+        checks.require(isinstance(steps, list) and len(steps) >= 3 and all(isinstance(s, str) for s in steps),
+                       ("content",), "content.steps must list at least 3 steps")
+
+    # prompt 只给了目标词数 170，按 ±25% 校验
+    checks.word_count(result.get("band8plus_example"), 130, 210, ("band8plus_example",), "band8plus_example")
+
+
+# key 为 "{type}_{subtype}"（与 settings.yml 的 prompt 名一致）
+VALIDATORS: dict[str, Callable[[dict, _Checks], None]] = {
+    "synonym_start": _synonym_start,
+    "sentence_start": _sentence_start,
+    "reading1_start": _reading1_start,
+    "reading2_start": _reading2_start,
+    "reading3_start": _reading3_start,
+    "writing1_start": _writing1_start,
+}
+
+
+def has_validator(prompt_key: str) -> bool:
+    return prompt_key in VALIDATORS
+
+
+def validate(prompt_key: str, result: Any, tolerance: float = 0.0) -> list[Violation]:
+    """校验一个任务结果（已解析的 dict）；没有登记规则的任务返回空列表"""
+    validator = VALIDATORS.get(prompt_key)
+    if validator is None:
+        return []
+    checks = _Checks(tolerance)
+    if checks.require(isinstance(result, dict), (), "the output must be a JSON object"):
+        validator(result, checks)
+    return checks.violations
+
+
+def repair_fields(violations: list[Violation]) -> tuple[str, ...]:
+    """所有问题涉及的顶层字段（保持出现顺序）"""
+    return tuple(dict.fromkeys(field for v in violations for field in v.fields))
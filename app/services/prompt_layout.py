@@ -0,0 +1,50 @@
+# app/services/prompt_layout.py
+import re
+from functools import lru_cache
+from typing import Optional
+
+from app.config import settings
+
+# settings.yml 模板里的占位符：[1] / [topic] / [example_types] ...
+_PLACEHOLDER = re.compile(r"\[[A-Za-z0-9_]+\]")
+
+VALUES_HEADER = "Values for the placeholders in the system prompt:"
+
+
+@lru_cache(maxsize=256)
+def _template_pattern(template: str) -> tuple[Optional[re.Pattern], tuple[str, ...]]:
+    """模板 → (整段匹配渲染结果的正则, 各占位符)；相邻占位符之间没有文字时无法拆分，返回 None"""
+    tokens = tuple(_PLACEHOLDER.findall(template))
+    fragments = _PLACEHOLDER.split(template)
+    if not tokens or any(not f for f in fragments[1:-1]):
+        return None, tokens
+    pattern = "(.*?)".join(re.escape(f) for f in fragments)
+    return re.compile(pattern, re.DOTALL), tokens
+
+
+def split_prompt(template: str, rendered: str) -> tuple[Optional[str], str]:
+    """
+    把渲染后的 prompt 拆成 (system, user)，system 为原模板（占位符保留），user 只含占位符的取值：
+    同一模板每次调用的 system 完全相同，可以命中 provider 的前缀缓存（DeepSeek 上下文硬盘缓存）
+
+    service 仍然用 replace 渲染 prompt，这里按模板的固定文字反推各占位符的值；
+    任意一种匹配方式把值代回模板都得到原 prompt，只需检查同一占位符多次出现时取值一致
+    拆不出来（模板被改写、没有占位符被替换）或 llm.prompt_layout 为 inline 时返回 (None, rendered)
+    """
+    if settings.llm.prompt_layout != "split":
+        return None, rendered
+    pattern, tokens = _template_pattern(template)
+    match = pattern.fullmatch(rendered) if pattern is not None else None
+    if match is None:
+        return None, rendered
+
+    values: dict[str, str] = {}
+    for token, value in zip(tokens, match.groups()):
+        if values.setdefault(token, value) != value:
+            return None, rendered
+    # 没被替换的（如示例里的 [A] / [B]）原样留在 system 里
+    bindings = {token: value for token, value in values.items() if value != token}
+    if not bindings:
+        return None, rendered
+    lines = [VALUES_HEADER] + [f"{token}: {value}" for token, value in bindings.items()]
+    return template, "\n".join(lines)
@@ -3,30 +3,22 @@ from abc import ABC
 from app.services.base_task_service import BasePromptService
 from app.schemas.task_req import TaskReq
 import json
-import random
 
 class Reading2PromptService(BasePromptService, ABC):
 
-    def start_pre_process(self, data: TaskReq, prompt: str) -> str:
+    async def start_pre_process(self, data: TaskReq, prompt: str) -> str:
         # 👉 这里写你“synonym start”的前置增强逻辑
-        processed = self.randomize(data,prompt)
+        processed = await self.randomize(data,prompt)
         return processed
 
-    def randomize(self, data, prompt):
-        original_type = data.type
-        data.type = "subtopics"
-
-        # 生成 subtopics
-        subtopic_prompt = self.choose_prompt(data).replace("[1]", data.domain)
-        subtopics_json = json.loads(self.retry_prompt(subtopic_prompt))
-
+    async def randomize(self, data, prompt):
         # 🎯 随机 topic + 随机 dimension（统一机制）
         random_dims = self.random_dimensions()
         # 例如返回：
         # {"text_styles": "historical", "tones": "critical", ...}
         task_config = {
             "topic": data.domain,
-            "subtopics": random.choice(subtopics_json["subtopics"]),
+            "subtopics": await self.pick_subtopic(data),
             **random_dims
         }
 
@@ -39,10 +31,9 @@ class Reading2PromptService(BasePromptService, ABC):
         for key, value in random_dims.items():
             result = result.replace(f"[{key}]", value)
 
-        data.type = original_type
         return result
 
-    def correct_pre_process(self, data: TaskReq, prompt: str) -> str:
+    async def correct_pre_process(self, data: TaskReq, prompt: str) -> str:
         """
         在 prompt 中替换占位符：
         [1] -> 原始文章 original_article
@@ -62,19 +53,19 @@ class Reading2PromptService(BasePromptService, ABC):
 
         return processed
 
-    def hint_pre_process(self, data: TaskReq, prompt: str) -> str:
+    async def hint_pre_process(self, data: TaskReq, prompt: str) -> str:
         # 👉 这里写“synonym hint”的前置增强逻辑
         return prompt
 
 
-    def start_post_process(self, data: TaskReq, result: str) -> str:
+    async def start_post_process(self, data: TaskReq, result: str) -> str:
         # 👉 这里写你“synonym start”的后处理逻辑
         return result
 
-    def correct_post_process(self, data: TaskReq, result: str) -> str:
+    async def correct_post_process(self, data: TaskReq, result: str) -> str:
         # 👉 这里写“synonym correct”的后处理
         return result
 
-    def hint_post_process(self, data: TaskReq, result: str) -> str:
+    async def hint_post_process(self, data: TaskReq, result: str) -> str:
         # 👉 这里写“synonym hint”的后处理
         return result
@@ -0,0 +1,176 @@
+# app/services/subtopic_cache.py
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from app.config import settings, SubtopicCacheConfig
+from app.core.paths import cache_dir
+
+logger = logging.getLogger(__name__)
+
+
+class SubtopicCache:
+    """
+    子主题缓存，key 为 (language, domain)
+
+    - 内存：LRU，容量 memory_entries
+    - 磁盘：cache/subtopics.json，容量 disk_entries，按生成时间淘汰最旧的
+    - 过期：超过 ttl_seconds 视为未命中，同步调用 loader 重新生成
+    - 刷新：超过 refresh_after_seconds 先返回旧值，同时起后台任务刷新
+    - 合并：同一 key 并发未命中时只调用一次 loader，其余请求等待同一个结果（如批量接口里同 domain 的多个任务）
+    """
+
+    def __init__(self, config: SubtopicCacheConfig, path: Optional[Path] = None):
+        self.config = config
+        self.path = path
+        self._memory: "OrderedDict[str, dict]" = OrderedDict()
+        self._disk: Optional[dict] = None
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(language: str, domain: str) -> str:
+        return f"{language or 'zh'}:{(domain or '').strip().lower()}"
+
+    # ======================================================
+    #                    ⭐ public API ⭐
+    # ======================================================
+    async def get(self, language: str, domain: str,
+                  loader: Callable[[], Awaitable[list[str]]]) -> list[str]:
+        if not self.config.enabled:
+            return await loader()
+
+        key = self.make_key(language, domain)
+        entry = self._lookup(key)
+        now = time.time()
+
+        if entry is None or now - entry["created_at"] > self.config.ttl_seconds:
+            return await self._load_once(key, loader)
+
+        if now - entry["created_at"] > self.config.refresh_after_seconds:
+            self._refresh_in_background(key, loader)
+        return entry["subtopics"]
+
+    def invalidate(self, language: str = None, domain: str = None) -> None:
+        with self._lock:
+            if language is None and domain is None:
+                self._memory.clear()
+                self._disk = {}
+            else:
+                key = self.make_key(language, domain)
+                self._memory.pop(key, None)
+                self._load_disk().pop(key, None)
+            self._save_disk()
+
+    # ======================================================
+    #                  ⭐ 内存 / 磁盘读写 ⭐
+    # ======================================================
+    def _lookup(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+
+            entry = self._load_disk().get(key)
+            if entry is not None:
+                self._remember(key, entry)
+            return entry
+
+    def _store(self, key: str, subtopics: list[str]) -> None:
+        if not subtopics:
+            return
+        entry = {"subtopics": list(subtopics), "created_at": time.time()}
+        with self._lock:
+            self._remember(key, entry)
+            disk = self._load_disk()
+            disk[key] = entry
+            overflow = len(disk) - self.config.disk_entries
+            if overflow > 0:
+                for old_key in sorted(disk, key=lambda k: disk[k]["created_at"])[:overflow]:
+                    del disk[old_key]
+            self._save_disk()
+
+    def _remember(self, key: str, entry: dict) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.config.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _load_disk(self) -> dict:
+        if self._disk is not None:
+            return self._disk
+        self._disk = {}
+        if self.path and self.path.exists():
+            try:
+                self._disk = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                logger.warning(f"子主题缓存文件损坏，已忽略: {self.path} {e}")
+        return self._disk
+
+    def _save_disk(self) -> None:
+        if not self.path:
+            return
+        tmp_path = self.path.with_suffix(".tmp")
+        try:
+            tmp_path.write_text(json.dumps(self._disk, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"子主题缓存写入失败: {e}")
+
+    # ======================================================
+    #                  ⭐ 未命中合并（single-flight）⭐
+    # ======================================================
+    async def _load_once(self, key: str, loader: Callable[[], Awaitable[list[str]]]) -> list[str]:
+        task = self._inflight.get(key)
+        if task is None:
+            async def run():
+                subtopics = await loader()
+                self._store(key, subtopics)
+                return subtopics
+
+            # loader 跑在独立 task 里（继承发起者的上下文：截止时间、trace）；
+            # 某个等待者被取消（超时 / 客户端断开）不影响其他等待者，生成完的结果照样写入缓存
+            task = asyncio.ensure_future(run())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish_inflight(key, t))
+        return await asyncio.shield(task)
+
+    def _finish_inflight(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            # 已取出异常，所有等待者都取消时不会报 "exception was never retrieved"
+            logger.debug(f"子主题生成失败 {key}: {task.exception()}")
+
+    # ======================================================
+    #                  ⭐ 后台刷新 ⭐
+    # ======================================================
+    def _refresh_in_background(self, key: str, loader: Callable[[], Awaitable[list[str]]]) -> None:
+        if key in self._refreshing:
+            return
+
+        async def run():
+            try:
+                self._store(key, await loader())
+            except Exception as e:
+                logger.warning(f"子主题后台刷新失败 {key}: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        # 持有 task 引用，防止被 GC 提前回收；用空上下文，不继承当前请求的截止时间
+        self._refreshing[key] = asyncio.get_running_loop().create_task(
+            run(), context=contextvars.Context()
+        )
+
+
+# 单例（全局可用）
+subtopic_cache = SubtopicCache(settings.cache.subtopics, cache_dir() / "subtopics.json")
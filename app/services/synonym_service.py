@@ -1,54 +1,26 @@
 from abc import ABC
 import json
-import random
 from app.services.base_task_service import BasePromptService
 from app.schemas.task_req import TaskReq
 
 class SynonymPromptService(BasePromptService, ABC):
 
-    def start_pre_process(self, data: TaskReq, prompt: str) -> str:
+    async def start_pre_process(self, data: TaskReq, prompt: str) -> str:
         # 👉 这里写你“synonym start”的前置增强逻辑
-        processed = self.randomize(data, prompt)
+        processed = await self.randomize(data, prompt)
         return processed
 
-    def randomize(self, data: TaskReq, prompt: str) -> str:
-        original_type = data.type
-        data.type = "subtopics"
-        subtopics_start_prompt = self.choose_prompt(data)
-        subtopics_start_prompt = subtopics_start_prompt.replace("[1]", data.domain)
-        random_subtopics = self.retry_prompt(subtopics_start_prompt)
-        random_subtopics_json = json.loads(random_subtopics)
-
+    async def randomize(self, data: TaskReq, prompt: str) -> str:
         task_config = {
             "topic": data.domain,
-            "subtopic": random.choice(random_subtopics_json["subtopics"]),
+            "subtopic": await self.pick_subtopic(data),
         }
         processed = prompt.replace("[1]", task_config["topic"])
         processed = processed.replace("[2]", task_config["subtopic"])
 
-        # 还原
-        data.type = original_type
-        return processed
-
-    def randomize(self,data: TaskReq,prompt: str)-> str:
-        original_type = data.type
-        data.type = "subtopics"
-        subtopics_start_prompt = self.choose_prompt(data)
-        subtopics_start_prompt = subtopics_start_prompt.replace("[1]",data.domain)
-        random_subtopics = self.retry_prompt(subtopics_start_prompt)
-        random_subtopics_json = json.loads(random_subtopics)
-
-        task_config = {
-            "topic": data.domain,
-            "subtopic": random.choice(random_subtopics_json["subtopics"]),
-        }
-        processed = prompt.replace("[1]",task_config["topic"].replace("[2]", task_config["subtopic"]))
-
-        #还原
-        data.type = original_type
         return processed
 
-    def correct_pre_process(self, data: TaskReq, prompt: str) -> str:
+    async def correct_pre_process(self, data: TaskReq, prompt: str) -> str:
         """
         在 prompt 中替换占位符：
         [1] -> 原始文章 original_article
@@ -68,19 +40,19 @@ class SynonymPromptService(BasePromptService, ABC):
 
         return processed
 
-    def hint_pre_process(self, data: TaskReq, prompt: str) -> str:
+    async def hint_pre_process(self, data: TaskReq, prompt: str) -> str:
         # 👉 这里写“synonym hint”的前置增强逻辑
         return prompt
 
 
-    def start_post_process(self, data: TaskReq, result: str) -> str:
+    async def start_post_process(self, data: TaskReq, result: str) -> str:
         # 👉 这里写你“synonym start”的后处理逻辑
         return result
 
-    def correct_post_process(self, data: TaskReq, result: str) -> str:
+    async def correct_post_process(self, data: TaskReq, result: str) -> str:
         # 👉 这里写“synonym correct”的后处理
         return result
 
-    def hint_post_process(self, data: TaskReq, result: str) -> str:
+    async def hint_post_process(self, data: TaskReq, result: str) -> str:
         # 👉 这里写“synonym hint”的后处理
         return result
@@ -1,41 +1,77 @@
-from app.services.synonym_service import SynonymPromptService
-from app.services.sentence_service import SentencePromptService
-from app.services.paragraph_service import ParagraphPromptService
-from app.services.summary_service import SummaryPromptService
-from app.services.reading1_service import Reading1PromptService
-from app.services.reading2_service import Reading2PromptService
-from app.services.reading3_service import Reading3PromptService
-from app.services.writing1_service import Writing1PromptService
-from app.services.writing2_service import Writing2PromptService
-from app.services.sentence_upgrade_service import SentenceUpgradePromptService
-from app.services.sentence_translation_serivce import SentenceTranslationPromptService
-from app.services.speaking_service import SpeakingPromptService
+import importlib
+import logging
+import threading
+from typing import TYPE_CHECKING
 
-def get_prompt_service(task_type):
-    if task_type == "synonym":
-        return SynonymPromptService()
-    if task_type == "sentence":
-        return SentencePromptService()
-    if task_type == "paragraph":
-        return ParagraphPromptService()
-    if task_type == "summary":
-        return SummaryPromptService()
-    if task_type == "reading1":
-        return Reading1PromptService()
-    if task_type == "reading2":
-        return Reading2PromptService()
-    if task_type == "reading3":
-        return Reading3PromptService()
-    if task_type == "writing1":
-        return Writing1PromptService()
-    if task_type == "writing2":
-        return Writing2PromptService()
-    if task_type == "sentence_upgrade":
-        return SentenceUpgradePromptService()
-    if task_type == "sentence_translation":
-        return SentenceTranslationPromptService()
-    if task_type == "speaking":
-        return SpeakingPromptService()
-    # ……按需继续扩展
-    else:
+from app.llm_client.factory import clear_llm_clients
+
+if TYPE_CHECKING:
+    from app.services.base_task_service import BasePromptService
+
+logger = logging.getLogger(__name__)
+
+# 任务类型 -> "模块:类名"（按需继续扩展）
+# 只登记路径，第一次用到时才 import：启动时不加载 12 个 service 及其依赖（LLM SDK 等）
+TASK_SERVICES: dict[str, str] = {
+    "synonym": "app.services.synonym_service:SynonymPromptService",
+    "sentence": "app.services.sentence_service:SentencePromptService",
+    "paragraph": "app.services.paragraph_service:ParagraphPromptService",
+    "summary": "app.services.summary_service:SummaryPromptService",
+    "reading1": "app.services.reading1_service:Reading1PromptService",
+    "reading2": "app.services.reading2_service:Reading2PromptService",
+    "reading3": "app.services.reading3_service:Reading3PromptService",
+    "writing1": "app.services.writing1_service:Writing1PromptService",
+    "writing2": "app.services.writing2_service:Writing2PromptService",
+    "sentence_upgrade": "app.services.sentence_upgrade_service:SentenceUpgradePromptService",
+    "sentence_translation": "app.services.sentence_translation_serivce:SentenceTranslationPromptService",
+    "speaking": "app.services.speaking_service:SpeakingPromptService",
+}
+
+
+def load_service_class(task_type: str) -> "type[BasePromptService]":
+    spec = TASK_SERVICES.get(task_type)
+    if spec is None:
         raise ValueError(f"未知任务类型: {task_type}")
+    module_name, class_name = spec.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class PromptServiceRegistry:
+    """
+    每种任务类型的 Service 只创建一次，之后复用
+    reload() 整体替换实例表：进行中的请求继续用旧实例，新请求拿到新实例
+    """
+
+    def __init__(self):
+        self._services: dict[str, "BasePromptService"] = {}
+        self._lock = threading.Lock()
+
+    def get(self, task_type: str) -> "BasePromptService":
+        service = self._services.get(task_type)
+        if service is not None:
+            return service
+
+        service_cls = load_service_class(task_type)
+
+        with self._lock:
+            service = self._services.get(task_type)
+            if service is None:
+                service = service_cls()
+                # 复制后整体替换，读路径无需加锁
+                self._services = {**self._services, task_type: service}
+            return service
+
+    def reload(self) -> None:
+        """用户设置（API 秘钥等）变更后调用，下次请求时重建 client 和 service"""
+        with self._lock:
+            clear_llm_clients()
+            self._services = {}
+        logger.info("prompt services reloaded")
+
+
+# 单例（全局可用）
+prompt_service_registry = PromptServiceRegistry()
+
+
+def get_prompt_service(task_type):
+    return prompt_service_registry.get(task_type)
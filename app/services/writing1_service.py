@@ -13,23 +13,16 @@ class Writing1PromptService(BasePromptService, ABC):
     dimensions = ["age groups", "countries", "genders", "industries", "regions"]
     complexity = ["low", "medium", "high"]
 
-    def start_pre_process(self, data: TaskReq, prompt: str) -> str:
+    async def start_pre_process(self, data: TaskReq, prompt: str) -> str:
         # 👉 这里写你“synonym start”的前置增强逻辑
         # 随机度选择
-        processed = self.randomize(data,prompt)
+        processed = await self.randomize(data,prompt)
         return processed
 
-    def randomize(self,data: TaskReq,prompt: str)-> str:
-        original_type = data.type
-        data.type = "subtopics"
-        subtopics_start_prompt = self.choose_prompt(data)
-        subtopics_start_prompt = subtopics_start_prompt.replace("[1]",data.domain)
-        random_subtopics = self.retry_prompt(subtopics_start_prompt)
-        random_subtopics_json = json.loads(random_subtopics)
-
+    async def randomize(self,data: TaskReq,prompt: str)-> str:
         task_config = {
             "topic": data.domain,
-            "subtopic": random.choice(random_subtopics_json["subtopics"]),
+            "subtopic": await self.pick_subtopic(data),
             "chart": data.question_type,
             "time": random.choice(self.time_patterns),
             "dimension": random.choice(self.dimensions),
@@ -42,11 +35,9 @@ class Writing1PromptService(BasePromptService, ABC):
                      .replace("[5]", task_config["dimension"]))
                      .replace("[6]", task_config["complexity"]))
 
-        #还原
-        data.type = original_type
         return processed
 
-    def correct_pre_process(self, data: TaskReq, prompt: str) -> str:
+    async def correct_pre_process(self, data: TaskReq, prompt: str) -> str:
         """
         在 prompt 中替换占位符：
         [1] -> 原始文章 original_article
@@ -66,19 +57,19 @@ class Writing1PromptService(BasePromptService, ABC):
 
         return processed
 
-    def hint_pre_process(self, data: TaskReq, prompt: str) -> str:
+    async def hint_pre_process(self, data: TaskReq, prompt: str) -> str:
         # 👉 这里写“synonym hint”的前置增强逻辑
         return prompt
 
 
-    def start_post_process(self, data: TaskReq, result: str) -> str:
+    async def start_post_process(self, data: TaskReq, result: str) -> str:
         # 👉 这里写你“synonym start”的后处理逻辑
         return result
 
-    def correct_post_process(self, data: TaskReq, result: str) -> str:
+    async def correct_post_process(self, data: TaskReq, result: str) -> str:
         # 👉 这里写“synonym correct”的后处理
         return result
 
-    def hint_post_process(self, data: TaskReq, result: str) -> str:
+    async def hint_post_process(self, data: TaskReq, result: str) -> str:
         # 👉 这里写“synonym hint”的后处理
         return result
@@ -0,0 +1,38 @@
+# app/utils/json_codec.py
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # 可选依赖：没装时退回标准库
+    orjson = None
+
+
+class JSONText(str):
+    """
+    已经由 IncrementalJSONParser 完整校验过的 JSON 对象文本（retry_stream 的最终结果）
+    接口层可以把它原样拼进响应，不必解码再编码；对它做 replace / 拼接等操作会得到普通 str，自动失去这个标记
+    """
+    __slots__ = ()
+
+
+def loads(text: str | bytes) -> Any:
+    if orjson is not None:
+        if isinstance(text, str) and type(text) is not str:
+            text = str(text)  # orjson 只接受精确的 str 类型（JSONText 等子类先转回普通 str）
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def dumps(obj: Any) -> str:
+    """紧凑、不转义非 ASCII；有 orjson 时用 orjson（比标准库快数倍）"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except orjson.JSONEncodeError:
+            pass  # 超过 64 位的整数等 orjson 不支持的值，交给标准库
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def backend() -> str:
+    return "orjson" if orjson is not None else "json"
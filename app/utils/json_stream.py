@@ -0,0 +1,151 @@
+# app/utils/json_stream.py
+import json
+import re
+from typing import Any, Iterable
+
+# 结构字符：字符串外只有这些会改变状态，其余字符直接跳过
+_SPECIAL = re.compile(r'[{}\[\]",:\\]')
+
+
+class JSONStreamError(ValueError):
+    """流式输出偏离 JSON 结构（开头有多余文本 / 字段非法 / 缺少必需字段）"""
+    # 供 retry_policy 识别：换一次生成通常就能恢复；属于输出问题，不计入熔断
+    retryable = True
+    provider_failure = False
+
+
+class IncrementalJSONParser:
+    """
+    边接收 token 边校验 LLM 输出的 JSON 对象
+
+    - 第一个非空白字符必须是 '{'，否则立即报错
+    - 每个顶层字段的值一结束就解析，返回 (key, value)，可以作为部分结果提前下发
+    - close() 时检查对象是否完整闭合、required_keys 是否都出现过
+    - 顶层 key / 冒号 / 逗号之间只允许空白，字段值按严格 JSON 解析（不接受 NaN / Infinity）：
+      close() 通过的文本本身就是合法 JSON，可以不经解码直接拼进响应
+    """
+
+    def __init__(self, required_keys: Iterable[str] = ()):
+        self.required_keys = tuple(required_keys)
+        self.fields: dict[str, Any] = {}
+        self._buf = ""
+        self._pos = 0
+        self._started = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._string_start = 0
+        self._expect = "key"  # 顶层状态：key / colon / value
+        self._key = None
+        self._value_start = 0
+        self._after_comma = False
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        if not chunk:
+            return []
+        self._buf += chunk
+        if not self._started:
+            text = self._buf.lstrip()
+            if not text:
+                return []
+            if text[0] != "{":
+                raise JSONStreamError(f"输出不是 JSON 对象，开头为: {text[:30]!r}")
+            self._started = True
+            self._pos = len(self._buf) - len(text)
+        return self._scan()
+
+    def close(self) -> dict[str, Any]:
+        if not self._done:
+            raise JSONStreamError("JSON 输出不完整")
+        missing = [key for key in self.required_keys if key not in self.fields]
+        if missing:
+            raise JSONStreamError(f"JSON 输出缺少字段: {missing}")
+        return self.fields
+
+    # ======================================================
+    #                  ⭐ 扫描逻辑 ⭐
+    # ======================================================
+    def _scan(self) -> list[tuple[str, Any]]:
+        completed = []
+        buf = self._buf
+        pos = self._pos
+        while pos < len(buf):
+            if self._done:
+                if buf[pos:].strip():
+                    raise JSONStreamError(f"JSON 对象之后还有多余内容: {buf[pos:pos + 30]!r}")
+                pos = len(buf)
+                break
+
+            match = _SPECIAL.search(buf, pos)
+            end = match.start() if match else len(buf)
+            if self._depth == 1 and not self._in_string and self._expect != "value" and buf[pos:end].strip():
+                raise JSONStreamError(f"JSON 顶层出现多余内容: {buf[pos:end][:30]!r}")
+            if match is None:
+                pos = len(buf)
+                break
+            pos = end
+            ch = buf[pos]
+
+            if self._in_string:
+                if ch == "\\":
+                    if pos + 1 >= len(buf):
+                        break  # 转义符在 chunk 末尾，等下一块
+                    pos += 2
+                    continue
+                if ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect == "key":
+                        self._key = json.loads(buf[self._string_start:pos + 1])
+                        self._expect = "colon"
+                        self._after_comma = False
+                pos += 1
+                continue
+
+            if self._depth == 1:
+                self._check_top_level(ch)
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 1 and ch == "}" and self._expect == "value":
+                    completed.append(self._finish_value(pos))
+                self._depth -= 1
+                if self._depth == 0:
+                    self._done = True
+            elif ch == ":" and self._depth == 1 and self._expect == "colon":
+                self._expect = "value"
+                self._value_start = pos + 1
+            elif ch == "," and self._depth == 1 and self._expect == "value":
+                completed.append(self._finish_value(pos))
+                self._expect = "key"
+                self._after_comma = True
+            pos += 1
+
+        self._pos = pos
+        return completed
+
+    def _check_top_level(self, ch: str) -> None:
+        """顶层等待 key / 冒号时只接受对应的结构字符；拒绝多余的逗号、尾逗号、缺冒号"""
+        if self._expect == "key":
+            ok = ch == '"' or (ch == "}" and not self._after_comma)
+        elif self._expect == "colon":
+            ok = ch == ":"
+        else:
+            return
+        if not ok:
+            raise JSONStreamError(f"JSON 顶层结构非法: 等待 {self._expect} 时遇到 {ch!r}")
+
+    def _finish_value(self, end: int) -> tuple[str, Any]:
+        raw = self._buf[self._value_start:end]
+        try:
+            value = json.loads(raw, parse_constant=_reject_constant)
+        except ValueError as e:
+            raise JSONStreamError(f"字段 {self._key!r} 不是合法 JSON: {e}") from e
+        self.fields[self._key] = value
+        return self._key, value
+
+
+def _reject_constant(name: str):
+    raise ValueError(f"非法的 JSON 常量 {name}")
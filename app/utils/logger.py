@@ -1,9 +1,131 @@
-# app/core/logger.py
+# app/utils/logger.py
+import atexit
+import copy
+import hashlib
 import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from typing import Optional
+
+from app.config import settings, LoggingConfig
+from app.core.metrics import metrics
+from app.core.paths import runtime_dir
+from app.core.task_context import current_task
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(funcName)s - %(message)s"
+
+log_records_dropped_total = metrics.counter(
+    "ielts_log_records_dropped_total", "Log records dropped because the log queue was full")
+
+_setup_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    请求线程只做截断 + 入队，格式化和 I/O 在后台 QueueListener 线程完成
+    队列满时直接丢弃并计数，不阻塞调用方
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_chars: int):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只截断消息本身；异常堆栈由父类追加，保持完整
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            record = copy.copy(record)
+            record.msg = truncate(message, self.max_chars)
+            record.args = None
+        return super().prepare(record)
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped_total.inc()
+
+
+def truncate(text: str, max_chars: int) -> str:
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}...(truncated {len(text) - max_chars} chars)"
+
+
+def setup_logging(config: LoggingConfig = None) -> None:
+    """配置根 logger（只生效一次）：QueueHandler → 后台线程 → stderr / 轮转文件"""
+    global _listener
+    config = config or settings.logging
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers: list[logging.Handler] = [logging.StreamHandler(sys.stderr)]
+        if config.file:
+            log_dir = runtime_dir() / "logs"
+            log_dir.mkdir(parents=True, exist_ok=True)
+            handlers.append(logging.handlers.RotatingFileHandler(
+                log_dir / "app.log", maxBytes=config.file_max_bytes,
+                backupCount=config.file_backups, encoding="utf-8",
+            ))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue: queue.Queue = queue.Queue(maxsize=config.queue_size)
+        root = logging.getLogger()
+        root.setLevel(config.level.upper())
+        root.addHandler(BoundedQueueHandler(log_queue, config.max_message_chars))
+
+        # httpx / openai 每个请求都会打 INFO，默认只保留告警
+        for noisy in ("httpx", "httpcore", "openai"):
+            logging.getLogger(noisy).setLevel(logging.WARNING)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
 def get_logger(name):
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(funcName)s - %(message)s",
-    )
-    logger = logging.getLogger(name)
-    return logger
\ No newline at end of file
+    setup_logging()
+    return logging.getLogger(name)
+
+
+# ======================================================
+#              ⭐ prompt / completion 日志 ⭐
+# ======================================================
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def _sampled(config: LoggingConfig) -> bool:
+    rate = config.sample_rates.get(current_task()[0], config.sample_rate)
+    return rate >= 1 or random.random() < rate
+
+
+def log_prompt(logger: logging.Logger, prompt: str, model: str, system: Optional[str] = None) -> None:
+    """只记录 hash 和长度；原文仅在 log_llm_text 打开且为 DEBUG 级别时输出（stacklevel=2：文件名 / 行号记为调用方）"""
+    config = settings.logging
+    if not logger.isEnabledFor(logging.INFO) or not _sampled(config):
+        return
+    task_type, subtype = current_task()
+    prefix = f" system_sha1={text_hash(system)} system_chars={len(system)}" if system is not None else ""
+    logger.info(f"prompt task={task_type}_{subtype} model={model}{prefix} sha1={text_hash(prompt)} chars={len(prompt)}",
+                stacklevel=2)
+    if config.log_llm_text and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"prompt text: {truncate(prompt, config.max_message_chars)}", stacklevel=2)
+
+
+def log_completion(logger: logging.Logger, completion: str, preview_chars: int = 120) -> None:
+    config = settings.logging
+    if not logger.isEnabledFor(logging.INFO) or not _sampled(config):
+        return
+    task_type, subtype = current_task()
+    logger.info(f"completion task={task_type}_{subtype} sha1={text_hash(completion)} chars={len(completion)} "
+                f"preview={completion[:preview_chars]!r}", stacklevel=2)
+    if config.log_llm_text and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"completion text: {truncate(completion, config.max_message_chars)}", stacklevel=2)
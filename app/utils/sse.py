@@ -0,0 +1,21 @@
+# app/utils/sse.py
+from typing import Any
+
+from app.utils import json_codec
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    按 Server-Sent Events 格式编码一条事件
+    data 为 str 时原样发送（多行拆成多个 data: 行），否则序列化为 JSON
+    """
+    if not isinstance(data, str):
+        data = json_codec.dumps(data)
+    lines = "".join(f"data: {line}\n" for line in data.split("\n"))
+    return f"event: {event}\n{lines}\n"
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # 关闭反向代理缓冲
+}
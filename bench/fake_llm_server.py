@@ -0,0 +1,176 @@
+# bench/fake_llm_server.py
+"""
+本地假 LLM 服务器，实现 OpenAI 兼容的 POST /chat/completions（流式 + 非流式）
+
+- 根据请求 prompt 匹配 settings.yml 中的 prompt 模板，返回 bench/payloads.py 里对应的固定 JSON
+- 可配置首 token 延迟（ttft）、生成速度（tokens/sec）、随机 5xx 比例（用于压测重试路径）
+- 请求里带 stream_options.include_usage 时，最后一个 chunk 返回 usage
+- 输出超过请求的 max_tokens 时截断，finish_reason 为 length
+- 模拟 DeepSeek 上下文缓存：见过的 system 消息再次出现时，usage 里报 prompt_cache_hit_tokens
+
+单独运行：
+    python -m bench.fake_llm_server --port 9100 --ttft 0.5 --tps 60
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from bench.payloads import PAYLOADS
+
+# 约 4 个字符算 1 个 token，只用于计时和 usage
+CHARS_PER_TOKEN = 4
+_PLACEHOLDER = re.compile(r"\[[A-Za-z0-9_]+\]")
+
+
+@dataclass
+class FakeLLMConfig:
+    ttft: float = 0.5
+    tokens_per_second: float = 60
+    error_rate: float = 0.0
+
+
+class PromptMatcher:
+    """
+    按 settings.yml 的模板识别 prompt：模板去掉 [1] / [topic] 等占位符后的各段，
+    在渲染后的 prompt 中出现得越多（按字符数计）越匹配
+    """
+
+    def __init__(self):
+        from app.config import settings
+
+        self._templates: list[tuple[str, list[str]]] = []
+        for prompts in (settings.prompt.en, settings.prompt.zh):
+            for key, template in prompts.model_dump().items():
+                fragments = [f.strip() for f in _PLACEHOLDER.split(template) if f.strip()]
+                if fragments:
+                    self._templates.append((key, fragments))
+
+    def match(self, prompt: str) -> str:
+        best_key, best_score = "subtopics_start", 0
+        for key, fragments in self._templates:
+            score = sum(len(f) for f in fragments if f in prompt)
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key
+
+
+def create_app(config: FakeLLMConfig) -> FastAPI:
+    app = FastAPI(docs_url=None, redoc_url=None)
+    matcher = PromptMatcher()
+    app.state.requests = 0
+    seen_prefixes: set[str] = set()
+
+    @app.post("/chat/completions")
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        prompt = "".join(m.get("content") or "" for m in body.get("messages", []))
+        model = body.get("model", "fake")
+
+        if config.error_rate and random.random() < config.error_rate:
+            return JSONResponse(status_code=503, content={"error": {"message": "fake overload"}})
+
+        content = json.dumps(PAYLOADS[matcher.match(prompt)], ensure_ascii=False)
+        messages = body.get("messages") or [{}]
+        system = messages[0].get("content") if messages[0].get("role") == "system" else None
+        cache_hit = len(system) // CHARS_PER_TOKEN if system in seen_prefixes else 0
+        if system is not None:
+            seen_prefixes.add(system)
+        finish_reason = "stop"
+        max_tokens = body.get("max_tokens")
+        if max_tokens and len(content) > max_tokens * CHARS_PER_TOKEN:
+            content, finish_reason = content[:max_tokens * CHARS_PER_TOKEN], "length"
+        usage = {
+            "prompt_tokens": len(prompt) // CHARS_PER_TOKEN,
+            "completion_tokens": max(1, len(content) // CHARS_PER_TOKEN),
+            "prompt_cache_hit_tokens": cache_hit,
+        }
+        usage["prompt_cache_miss_tokens"] = usage["prompt_tokens"] - cache_hit
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.ttft + usage["completion_tokens"] / config.tokens_per_second)
+            return {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": finish_reason,
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            }
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(
+            _stream(content, model, usage if include_usage else None, config, finish_reason),
+            media_type="text/event-stream",
+        )
+
+    return app
+
+
+async def _stream(content: str, model: str, usage, config: FakeLLMConfig, finish_reason: str = "stop"):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    def chunk(delta: dict, finish_reason=None, **extra) -> str:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        }
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    loop = asyncio.get_running_loop()
+    await asyncio.sleep(config.ttft)
+    yield chunk({"role": "assistant", "content": ""})
+
+    tokens = [content[i:i + CHARS_PER_TOKEN] for i in range(0, len(content), CHARS_PER_TOKEN)]
+    started = loop.time()
+    sent = 0
+    while sent < len(tokens):
+        # 按绝对时间表发送：落后时把已到期的 token 合并到一个 chunk，tps 很高时也不会被 sleep 精度拖慢
+        due = min(len(tokens), int((loop.time() - started) * config.tokens_per_second) + 1)
+        if due > sent:
+            yield chunk({"content": "".join(tokens[sent:due])})
+            sent = due
+        else:
+            await asyncio.sleep(started + sent / config.tokens_per_second - loop.time())
+
+    yield chunk({}, finish_reason=finish_reason)
+    if usage is not None:
+        data = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                "model": model, "choices": [], "usage": usage}
+        yield f"data: {json.dumps(data)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible fake LLM server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft", type=float, default=0.5, help="time to first token, seconds")
+    parser.add_argument("--tps", type=float, default=60, help="completion tokens per second")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(ttft=args.ttft, tokens_per_second=args.tps, error_rate=args.error_rate)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
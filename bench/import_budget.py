@@ -0,0 +1,77 @@
+# bench/import_budget.py
+"""
+启动 import 预算检查：在全新子进程中 import app.main，测耗时并检查重依赖没有被提前加载
+
+    python -m bench.import_budget                   # 默认预算 800ms，取 5 次中位数
+    python -m bench.import_budget --budget-ms 800 --runs 9
+
+- 不满足预算或提前加载了 LAZY_MODULES 中的模块时退出码为 1
+- 运行目录指向临时目录（配置快照在第一次运行时生成，之后各次都走快照）
+- 首次运行作为预热不计入统计
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# 这些模块应在第一次请求 / 第一次 LLM 调用时才加载
+LAZY_MODULES = (
+    "openai",
+    "app.llm_client.deepseek_client",
+    "app.llm_client.openai_client",
+    "app.services.base_task_service",
+)
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = (time.perf_counter() - started) * 1000
+loaded = [m for m in sys.modules if m in LAZY or (m.startswith("app.services.") and m.endswith("_service"))]
+print(json.dumps({"ms": elapsed, "loaded": sorted(loaded)}))
+"""
+
+
+def probe(env: dict) -> dict:
+    code = f"LAZY = {LAZY_MODULES!r}\n{_PROBE}"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    from app.core.paths import RUNTIME_DIR_ENV
+
+    parser = argparse.ArgumentParser(description="Check the import time budget of app.main")
+    parser.add_argument("--budget-ms", type=float, default=800)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = {**os.environ, RUNTIME_DIR_ENV: tempfile.mkdtemp(prefix="ielts-import-")}
+    probe(env)  # 预热：生成配置快照、填充 pyc
+    results = [probe(env) for _ in range(args.runs)]
+    median = statistics.median(r["ms"] for r in results)
+    loaded = sorted({m for r in results for m in r["loaded"]})
+
+    print(f"import app.main: median {median:.1f}ms over {args.runs} runs "
+          f"(min {min(r['ms'] for r in results):.1f}ms, budget {args.budget_ms:.0f}ms)")
+    failed = False
+    if median > args.budget_ms:
+        print(f"[over budget] {median:.1f}ms > {args.budget_ms:.0f}ms")
+        failed = True
+    if loaded:
+        print(f"[eager import] {', '.join(loaded)}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
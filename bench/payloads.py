@@ -0,0 +1,99 @@
+# bench/payloads.py
+"""
+假 LLM 服务器返回的固定 JSON，key 为 settings.yml 中的 prompt 名
+长度大致对齐真实输出（阅读文章几百词、批改几段说明），流式 token 数才接近线上；
+出题结果满足 app/services/output_validators.py 的规则，压测走的是不需要修复的常规路径
+"""
+import itertools
+
+_WORDS = (
+    "urban planners increasingly argue that public transport investment shapes how cities grow "
+    "and whether residents can reach education healthcare and employment without relying on private cars"
+).split()
+
+
+def words(n: int) -> str:
+    return " ".join(itertools.islice(itertools.cycle(_WORDS), n))
+
+
+def _tfng(n: int, answer_key: str = "answer") -> list[dict]:
+    return [{"id": i, "statement": words(14), answer_key: ("TRUE", "FALSE", "NOT GIVEN")[(i - 1) % 3],
+             "explanation": words(20)} for i in range(1, n + 1)]
+
+
+_DETAILS = [{"id": i, "score": 7, "detail": words(40), "suggestion": words(25)} for i in range(1, 6)]
+
+PAYLOADS: dict[str, dict] = {
+    "subtopics_start": {
+        "topic": "education",
+        "subtopics": [f"subtopic {i} {words(3)}" for i in range(1, 16)],
+    },
+    "synonym_start": {
+        "passage_title": words(6),
+        "article": " ".join(f"{words(30)} [{c}]" for c in "ABCDEF"),
+        "markers": {c: words(1) for c in "ABCDEF"},
+    },
+    "synonym_correct": {"details": _DETAILS},
+    "sentence_start": {"sentence": words(25), "examples": [words(25) for _ in range(3)]},
+    "sentence_correct": {"details": _DETAILS[:2]},
+    "paragraph_start": {"paragraph": words(90), "examples": [words(90) for _ in range(2)]},
+    "paragraph_correct": {"details": _DETAILS[:3]},
+    "summary_start": {"passage_title": words(6), "article": words(350), "examples": [words(80)]},
+    "summary_correct": {"details": _DETAILS[:3]},
+    "reading1_start": {
+        "passage": words(500),
+        "passage_title": words(6),
+        "questions": {
+            # 答案为文章里依次出现、题干里没有的单词
+            "fill_in_the_blanks": [{"id": i, "question": words(15) + " []", "answer": _WORDS[15 + i],
+                                    "explanation": words(20)} for i in (1, 2, 3, 5, 6, 7)],
+            "true_false_not_given": _tfng(3),
+        },
+    },
+    "reading2_start": {
+        "passage_title": words(6),
+        "passage": {c: words(110) for c in "ABCDEFG"},
+        "questions": {
+            "matching_information": [{"id": i, "statement": words(14), "answer": "ABCDEFG"[i - 1],
+                                      "explanation": words(20)} for i in range(1, 8)],
+        },
+    },
+    "reading3_start": {
+        "title": words(6),
+        "passage": "\n\n".join(words(115) for _ in range(7)),
+        "mcq": {"questions": [{"id": i, "title": words(12),
+                               "options": {c: words(6) for c in "ABCD"},
+                               "correct_answer": "B", "explanation": words(25)} for i in range(1, 6)]},
+        "true_false_not_given": _tfng(5, "correct_answer"),
+    },
+    "writing1_start": {
+        "type": "bar",
+        "title": words(8),
+        "units": "%",
+        "time_range": "2010-2020",
+        "description": words(30),
+        "content": {"labels": ["2010", "2015", "2020"],
+                    "series": {"France": [77, 84, 89], "USA": [60, 70, 79], "Japan": [55, 61, 72]}},
+        "band8plus_example": words(170),
+    },
+    "writing1_correct": {"score": 6.5, "details": _DETAILS, "band8plus_example": words(180)},
+    "writing2_start": {
+        "question_type": "opinion",
+        "question": words(40),
+        "stance_hint": {"possible_positions": {p: {c: words(12) for c in "ABC"}
+                                               for p in ("total_agree", "partial_agree", "disagree")}},
+        "outline_hint": [words(20) for _ in range(4)],
+        "band8plus_example": words(300),
+    },
+    "writing2_correct": {"score": 6.5, "details": _DETAILS, "band8plus_example": words(300)},
+    "sentence_upgrade_correct": {
+        f"band{b}": {"sentence": words(25), "improvements": words(30), "score": float(b)} for b in (6, 7, 8)
+    },
+    # 这两个 prompt 要求输出数组；JSON mode 下模型会包一层对象
+    "sentence_translation_start": {
+        "sentences": [{"en": words(8 + 3 * i), "cn": "示例中文句子", "difficulty": i} for i in range(1, 9)]
+    },
+    "speaking_start": {"sentences": [{"en": words(15), "cn": "示例中文句子"} for _ in range(5)]},
+    # 定向修复：上面的出题结果都合格，正常压测不会走到；给一篇合格的阅读文章，手动造不合格结果时可用
+    "repair_start": {"passage": words(500)},
+}
@@ -0,0 +1,120 @@
+# bench/routing_check.py
+"""
+多 endpoint 路由检查：起三个假 LLM 服务器，主 key 指向总是 503 的那个，endpoints 配一快一慢
+
+    python -m bench.routing_check
+    python -m bench.routing_check --calls 120 --concurrency 8
+
+- 第一阶段：所有调用都应成功（故障 endpoint 被切走并进入冷却），快的 endpoint 分到的调用多于慢的
+- 第二阶段：关掉快的服务器，调用仍应全部成功，流量转到慢的 endpoint
+- 不满足时退出码为 1
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from bench.run_bench import ROOT, free_port, start_fake_server
+
+
+def fake_server(ttft: float, error_rate: float = 0.0):
+    port = free_port()
+    args = argparse.Namespace(ttft=ttft, tps=2000, error_rate=error_rate)
+    return f"http://127.0.0.1:{port}", start_fake_server(port, args)
+
+
+def isolate_runtime_dir(primary: str, endpoints: list[dict]) -> None:
+    """临时运行目录 + 多 endpoint 的 user_config.json；必须在 import app 之前调用"""
+    from app.core.paths import RUNTIME_DIR_ENV
+
+    runtime = Path(tempfile.mkdtemp(prefix="ielts-routing-"))
+    (runtime / "user_config.json").write_text(json.dumps({
+        "openai_api_key": "bench", "base_url": primary, "endpoints": endpoints,
+    }), encoding="utf-8")
+    os.environ[RUNTIME_DIR_ENV] = str(runtime)
+
+
+async def drive(client, prompt: str, calls: int, concurrency: int) -> int:
+    """并发调用 calls 次，返回失败次数"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> bool:
+        async with semaphore:
+            try:
+                json.loads(await client.prompt(prompt))
+                return True
+            except Exception:
+                return False
+
+    results = await asyncio.gather(*(one() for _ in range(calls)))
+    return results.count(False)
+
+
+def print_snapshot(title: str, failures: int, snapshot: list[dict]) -> dict:
+    print(f"\n{title}: failures={failures}")
+    print(f"  {'endpoint':<12}{'calls':>7}{'errors':>8}{'latency_ms':>12}{'error_rate':>12}{'cooldown_s':>12}")
+    for e in snapshot:
+        print(f"  {e['name']:<12}{e['calls']:>7}{e['errors']:>8}{str(e['latency_ms']):>12}"
+              f"{e['error_rate']:>12}{e['cooldown_remaining_s']:>12}")
+    return {e["name"]: e for e in snapshot}
+
+
+async def run(args, fast_server) -> list[str]:
+    from app.config import settings
+    from app.llm_client.factory import get_llm_client
+
+    client = get_llm_client(settings.llm.provider, settings.llm.model)
+    prompt = settings.prompt.en.subtopics_start
+    problems = []
+
+    failures = await drive(client, prompt, args.calls, args.concurrency)
+    before = print_snapshot("all endpoints up", failures, client.snapshot())
+    if failures:
+        problems.append(f"{failures} calls failed with healthy endpoints available")
+    if before["fast"]["calls"] <= before["slow"]["calls"]:
+        problems.append("fast endpoint did not receive more calls than the slow one")
+
+    fast_server.terminate()
+    fast_server.wait()
+    failures = await drive(client, prompt, args.calls // 2, args.concurrency)
+    after = print_snapshot("fast endpoint down", failures, client.snapshot())
+    if failures:
+        problems.append(f"{failures} calls failed after the fast endpoint went down")
+    if after["slow"]["calls"] - before["slow"]["calls"] < args.calls // 4:
+        problems.append("traffic did not move to the slow endpoint")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check multi-endpoint LLM routing against local fake servers")
+    parser.add_argument("--calls", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=6)
+    parser.add_argument("--fast-ttft", type=float, default=0.05)
+    parser.add_argument("--slow-ttft", type=float, default=0.4)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    broken_url, broken = fake_server(0.01, error_rate=1.0)
+    fast_url, fast = fake_server(args.fast_ttft)
+    slow_url, slow = fake_server(args.slow_ttft)
+    try:
+        isolate_runtime_dir(broken_url, [
+            {"api_key": "bench", "base_url": fast_url, "name": "fast"},
+            {"api_key": "bench", "base_url": slow_url, "name": "slow"},
+        ])
+        problems = asyncio.run(run(args, fast))
+    finally:
+        for server in (broken, fast, slow):
+            server.terminate()
+            server.wait()
+
+    for problem in problems:
+        print(f"[routing] {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
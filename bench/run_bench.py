@@ -0,0 +1,244 @@
+# bench/run_bench.py
+"""
+/api/v1/task 请求链路压测：用假 LLM 服务器代替 DeepSeek，驱动真实的 app.main.app
+
+    python -m bench.run_bench                                    # 12 种任务 × 并发 1/8/32
+    python -m bench.run_bench --levels 1,16 --requests 96 --ttft 0.3 --tps 200
+    python -m bench.run_bench --stream                           # 走 /start/stream
+    python -m bench.run_bench --json out.json                    # 保存结果
+    python -m bench.run_bench --baseline out.json --max-regression 0.2   # 回归则退出码 1
+    python -m bench.run_bench --replay cassette.jsonl.gz --time-scale 0  # 回放录制，只测非 LLM 开销
+
+- 运行目录（user_config.json、cache/）指向临时目录，不会动到真实配置和缓存
+- 每个并发档位前先按任务类型各预热一次（子主题缓存、连接池、client 都已就绪）
+- 延迟在 ASGI 层测量（httpx.ASGITransport），不含真实网络，只反映服务端链路 + 假 LLM 的耗时
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# 每种任务一个请求体；sentence_upgrade 只有 correct prompt
+CASES: dict[str, dict] = {
+    "synonym": {"subtype": "start", "domain": "education"},
+    "sentence": {"subtype": "start", "domain": "environment"},
+    "paragraph": {"subtype": "start", "domain": "technology"},
+    "summary": {"subtype": "start", "domain": "health"},
+    "reading1": {"subtype": "start", "domain": "history"},
+    "reading2": {"subtype": "start", "domain": "science"},
+    "reading3": {"subtype": "start", "domain": "culture"},
+    "writing1": {"subtype": "start", "domain": "economy", "question_type": "bar"},
+    "writing2": {"subtype": "start", "domain": "education", "question_type": "opinion"},
+    "sentence_upgrade": {"subtype": "correct", "answers": {"sentence": "Cities is growing fast."}},
+    "sentence_translation": {"subtype": "start", "domain": "work"},
+    "speaking": {"subtype": "start", "domain": "travel"},
+}
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list[float], errors: int, wall: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "ok": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / wall, 2) if wall > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+    }
+
+
+# ======================================================
+#                  ⭐ 假 LLM 服务器 ⭐
+# ======================================================
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_server(port: int, args) -> subprocess.Popen:
+    """独立进程运行，避免和被测 app 抢同一个事件循环 / GIL"""
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "bench.fake_llm_server", "--port", str(port),
+         "--ttft", str(args.ttft), "--tps", str(args.tps), "--error-rate", str(args.error_rate)],
+        cwd=ROOT,
+    )
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("fake LLM server exited during startup")
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return proc
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("fake LLM server did not start in time")
+
+
+def isolate_runtime_dir(base_url: str) -> Path:
+    """临时运行目录 + 指向假服务器的 user_config.json；必须在 import app 之前调用"""
+    from app.core.paths import RUNTIME_DIR_ENV
+
+    runtime = Path(tempfile.mkdtemp(prefix="ielts-bench-"))
+    (runtime / "user_config.json").write_text(
+        json.dumps({"openai_api_key": "bench", "base_url": base_url}), encoding="utf-8"
+    )
+    os.environ[RUNTIME_DIR_ENV] = str(runtime)
+    return runtime
+
+
+# ======================================================
+#                  ⭐ 压测 ⭐
+# ======================================================
+async def call(client, task_type: str, stream: bool) -> bool:
+    body = {"type": task_type, "language": "en", **CASES[task_type]}
+    path = "/api/v1/task/" + ("start" if body["subtype"] == "start" else "correct")
+    if stream:
+        path += "/stream"
+        async with client.stream("POST", path, json=body) as response:
+            text = (await response.aread()).decode("utf-8")
+        return response.status_code == 200 and "event: done" in text
+
+    response = await client.post(path, json=body)
+    return response.status_code == 200 and response.json().get("code") == "0"
+
+
+async def run_level(client, types: list[str], level: int, total: int, stream: bool) -> dict:
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(types[i % len(types)])
+
+    latencies: dict[str, list[float]] = {t: [] for t in types}
+    errors: dict[str, int] = {t: 0 for t in types}
+
+    async def worker():
+        while not queue.empty():
+            task_type = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                ok = await call(client, task_type, stream)
+            except Exception:
+                ok = False
+            if ok:
+                latencies[task_type].append(time.perf_counter() - started)
+            else:
+                errors[task_type] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(level)))
+    wall = time.perf_counter() - started
+
+    result = summarize([x for v in latencies.values() for x in v], sum(errors.values()), wall)
+    result["per_type"] = {t: summarize(latencies[t], errors[t], wall) for t in types}
+    return result
+
+
+async def run(args) -> dict:
+    import httpx
+    from app.config import settings
+
+    if args.replay:
+        # 必须在 import app.main（创建 service / client）之前切换
+        settings.llm.cassette.mode = "replay"
+        settings.llm.cassette.path = str(Path(args.replay).resolve())
+        settings.llm.cassette.time_scale = args.time_scale
+    from app.main import app
+
+    types = args.types.split(",") if args.types else list(CASES)
+    levels = [int(x) for x in args.levels.split(",")]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for task_type in types:
+            if not await call(client, task_type, args.stream):
+                print(f"[warmup] {task_type} failed", file=sys.stderr)
+        for level in levels:
+            results[str(level)] = await run_level(client, types, level, args.requests, args.stream)
+            print_level(level, results[str(level)])
+    return {"config": vars(args), "levels": results}
+
+
+# ======================================================
+#                  ⭐ 输出 / 回归比较 ⭐
+# ======================================================
+def print_level(level: int, result: dict) -> None:
+    print(f"\nconcurrency={level}  ok={result['ok']}  errors={result['errors']}  rps={result['rps']}  "
+          f"p50={result['p50_ms']}ms  p95={result['p95_ms']}ms  p99={result['p99_ms']}ms")
+    print(f"  {'task':<22}{'ok':>5}{'err':>5}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for task_type, r in result["per_type"].items():
+        print(f"  {task_type:<22}{r['ok']:>5}{r['errors']:>5}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> list[str]:
+    problems = []
+    for level, base in baseline["levels"].items():
+        cur = current["levels"].get(level)
+        if cur is None:
+            continue
+        if base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            problems.append(f"concurrency={level}: p95 {base['p95_ms']}ms -> {cur['p95_ms']}ms")
+        if base["rps"] and cur["rps"] < base["rps"] * (1 - max_regression):
+            problems.append(f"concurrency={level}: rps {base['rps']} -> {cur['rps']}")
+        if cur["errors"] > base["errors"]:
+            problems.append(f"concurrency={level}: errors {base['errors']} -> {cur['errors']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /api/v1/task against a fake LLM server")
+    parser.add_argument("--levels", default="1,8,32", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=96, help="requests per concurrency level")
+    parser.add_argument("--types", default="", help="comma separated task types (default: all 12)")
+    parser.add_argument("--stream", action="store_true", help="use the SSE endpoints")
+    parser.add_argument("--ttft", type=float, default=0.2)
+    parser.add_argument("--tps", type=float, default=400)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--replay", help="replay this LLM cassette instead of starting the fake server")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="replay timing scale (0 = no waiting)")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json result")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    if args.replay:
+        isolate_runtime_dir("http://127.0.0.1:9")
+        result = asyncio.run(run(args))
+    else:
+        port = free_port()
+        server = start_fake_server(port, args)
+        try:
+            isolate_runtime_dir(f"http://127.0.0.1:{port}")
+            result = asyncio.run(run(args))
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, indent=2), encoding="utf-8")
+    if args.baseline:
+        problems = compare(result, json.loads(Path(args.baseline).read_text(encoding="utf-8")),
+                           args.max_regression)
+        for problem in problems:
+            print(f"[regression] {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# bench/serialization_bench.py
+"""
+成功响应编码耗时对比：按 bench/payloads.py 的各任务输出（阅读文章几百词），比较三种路径
+
+    python -m bench.serialization_bench
+    python -m bench.serialization_bench --types reading1_start,reading3_start --number 2000
+    python -m bench.serialization_bench --stdlib        # 不用 orjson，看退回标准库时的表现
+
+- legacy：json.loads → APIResponse.success → FastAPI 按 response_model 校验 / jsonable_encoder → JSONResponse 编码
+- codec：json_codec.loads → APIResponse.success_json(dict)（post_process 改写过结果时走这条）
+- splice：APIResponse.success_json(JSONText)，校验过的 LLM 输出直接拼进信封（默认路径）
+- 输出为每次编码的微秒数（取 --repeat 次中最快的一次）和相对 legacy 的加速比
+"""
+import argparse
+import asyncio
+import json
+import sys
+import timeit
+
+from bench.payloads import PAYLOADS
+from bench.run_bench import ROOT
+
+
+def legacy_encoder():
+    """改动前 /task/start 的路径：与 FastAPI 处理 response_model=APIResponse 的步骤一致"""
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_model_field
+
+    from app.schemas.api_response import APIResponse
+
+    field = create_model_field(name="Response_start", type_=APIResponse, mode="serialization")
+    loop = asyncio.new_event_loop()
+
+    def encode(text: str) -> bytes:
+        response = APIResponse.success(json.loads(text))
+        content = loop.run_until_complete(serialize_response(field=field, response_content=response))
+        return JSONResponse(content).body
+
+    return encode
+
+
+def measure(encode, text: str, number: int, repeat: int) -> float:
+    """最快一轮的单次耗时（微秒）"""
+    return min(timeit.repeat(lambda: encode(text), number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare response serialization paths on task-sized payloads")
+    parser.add_argument("--types", help="comma-separated prompt names from bench/payloads.py (default: all)")
+    parser.add_argument("--number", type=int, default=500, help="encodes per timing round")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stdlib", action="store_true", help="disable orjson in app.utils.json_codec")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    from app.schemas.api_response import APIResponse
+    from app.utils import json_codec
+    from app.utils.json_codec import JSONText
+
+    if args.stdlib:
+        json_codec.orjson = None
+
+    legacy = legacy_encoder()
+    paths = {
+        "legacy": legacy,
+        "codec": lambda text: APIResponse.success_json(json_codec.loads(text)).encode("utf-8"),
+        "splice": lambda text: APIResponse.success_json(JSONText(text)).encode("utf-8"),
+    }
+
+    names = args.types.split(",") if args.types else list(PAYLOADS)
+    print(f"codec backend: {json_codec.backend()}")
+    print(f"{'payload':<28}{'KB':>7}{'legacy_us':>11}{'codec_us':>10}{'splice_us':>11}{'codec_x':>9}{'splice_x':>10}")
+    totals = dict.fromkeys(paths, 0.0)
+    for name in names:
+        text = json.dumps(PAYLOADS[name], ensure_ascii=False)
+        # 三条路径的结果必须一致
+        expected = json.loads(legacy(text))
+        for path, encode in paths.items():
+            if json.loads(encode(text)) != expected:
+                raise SystemExit(f"{path} output differs from legacy for {name}")
+        us = {path: measure(encode, text, args.number, args.repeat) for path, encode in paths.items()}
+        for path in paths:
+            totals[path] += us[path]
+        print(f"{name:<28}{len(text.encode('utf-8')) / 1024:>7.1f}{us['legacy']:>11.1f}{us['codec']:>10.1f}"
+              f"{us['splice']:>11.1f}{us['legacy'] / us['codec']:>8.1f}x{us['legacy'] / us['splice']:>9.1f}x")
+    print(f"{'total':<28}{'':>7}{totals['legacy']:>11.1f}{totals['codec']:>10.1f}{totals['splice']:>11.1f}"
+          f"{totals['legacy'] / totals['codec']:>8.1f}x{totals['legacy'] / totals['splice']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()